@@ -0,0 +1,232 @@
+"""Set-based admin operations and keyset-paginated admin listings.
+
+Bulk actions change any number of auctions or users in one transaction:
+a status-guarded ``UPDATE ... RETURNING`` per source status picks the
+rows that can make the transition (an auction approved twice, or already
+closed, is skipped rather than clobbered) and the notifications for
+exactly those rows go into the outbox with one multi-row ``INSERT``.
+
+Listings page on a ``(created_at, id)`` key instead of ``OFFSET``, so
+page 1000 costs the same index range scan as page 1.
+
+The dashboard counters are exact counts on small indexed ranges (active,
+pending) plus table totals that are approximate on PostgreSQL
+(``pg_class.reltuples``), all held in process for
+``ADMIN_COUNTERS_TTL`` seconds and refreshed after a bulk action.
+"""
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import select, update, insert, func, or_, and_, desc, text
+from sqlalchemy.orm import joinedload
+
+from app import db
+from cache import cache
+from events import broker, auction_channel
+from identity import identity_cache
+from models import Auction, User, OutboxEvent
+import catalog
+import closer
+import dashboards
+
+# action: (statuses it applies to, new status, seller message, subject)
+AUCTION_ACTIONS = {
+    'approve': (('pending',), 'active',
+                'Your auction "{title}" has been approved and is now live!', 'Your auction is live'),
+    'reject': (('pending',), 'cancelled',
+               'Your auction "{title}" was not approved.', 'Your auction was not approved'),
+    'cancel': (('pending', 'active'), 'cancelled',
+               'Your auction "{title}" has been cancelled by an administrator.',
+               'Your auction was cancelled'),
+}
+
+# Upper bound on ids per bulk request, well under SQLite's parameter limit
+MAX_BULK = 500
+
+
+def keyset_page(query, model, after, limit):
+    """Newest-first page of ``query`` after the ``(created_at, id)`` key ``after``.
+
+    Returns the rows and the key to continue from, or None on the last page.
+    """
+    if after:
+        created_at, row_id = after
+        query = query.where(or_(model.created_at < created_at,
+                                and_(model.created_at == created_at, model.id < row_id)))
+    rows = db.session.execute(
+        query.order_by(desc(model.created_at), desc(model.id)).limit(limit + 1)
+    ).scalars().all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, (rows[-1].created_at, rows[-1].id) if more else None
+
+
+def list_users(role=None, status=None, search=None, after=None, limit=50):
+    """A page of users, newest first, and the key of the next page."""
+    query = select(User)
+    if role:
+        query = query.where(User.role == role)
+    if status in ('active', 'inactive'):
+        query = query.where(User.is_active == (status == 'active'))
+    if search:
+        # Prefix match as a range, so it reads the unique username and email
+        # indexes (LIKE would scan the table on SQLite)
+        end = search + '\U0010ffff'
+        query = query.where(or_(and_(User.username >= search, User.username < end),
+                                and_(User.email >= search, User.email < end)))
+    return keyset_page(query, User, after, limit)
+
+
+def list_auctions(status='pending', after=None, limit=50):
+    """A page of auctions in ``status`` (any status for ``'all'``), newest first."""
+    query = select(Auction).options(joinedload(Auction.seller))
+    if status != 'all':
+        query = query.where(Auction.status == status)
+    return keyset_page(query, Auction, after, limit)
+
+
+def update_auctions(auction_ids, action):
+    """Apply ``action`` to every auction in ``auction_ids`` that allows it.
+
+    Returns the ids that changed; the rest were already past that state.
+    """
+    statuses, new_status, message, subject = AUCTION_ACTIONS[action]
+    auction_ids = list(dict.fromkeys(auction_ids))[:MAX_BULK]
+    if not auction_ids:
+        return []
+    now = datetime.now(timezone.utc)
+    try:
+        changed = []
+        # One UPDATE per source status, so the dashboard counters know
+        # which status each auction left
+        for status in statuses:
+            rows = db.session.execute(
+                update(Auction)
+                .where(Auction.id.in_(auction_ids), Auction.status == status)
+                .values(status=new_status)
+                .returning(Auction.id, Auction.seller_id, Auction.category_id, Auction.title,
+                           Auction.highest_bidder_id)
+                .execution_options(synchronize_session=False)
+            ).all()
+            dashboards.record_status_change(rows, status, new_status)
+            catalog.record_status_change([row.category_id for row in rows], status, new_status)
+            changed += rows
+        events = [_notification(row.seller_id, message.format(title=row.title), subject, now)
+                  for row in changed]
+        if action == 'cancel':
+            events += [_notification(row.highest_bidder_id,
+                                     f'The auction "{row.title}" you were winning has been cancelled.',
+                                     'An auction you bid on was cancelled', now)
+                       for row in changed if row.highest_bidder_id]
+        if events:
+            db.session.execute(insert(OutboxEvent), events)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if changed:
+        cache.invalidate('auctions')
+        counters.refresh()
+    if new_status == 'active' and changed:
+        # The new auctions may end before whatever the closer is sleeping towards
+        closer.auction_closer.wake()
+    if new_status == 'cancelled':
+        for row in changed:
+            broker.publish(auction_channel(row.id), 'auction', {'status': 'cancelled'})
+    return [row.id for row in changed]
+
+
+def _notification(user_id, message, subject, now):
+    return {
+        'kind': 'notification',
+        'user_id': user_id,
+        'payload': {'message': message, 'subject': subject, 'summary': None},
+        'created_at': now,
+        'available_at': now,
+        'attempts': 0,
+    }
+
+
+def set_users_active(user_ids, active, acting_user_id):
+    """Activate or deactivate ``user_ids`` (never the acting admin); return the ids changed."""
+    user_ids = [i for i in dict.fromkeys(user_ids) if i != acting_user_id][:MAX_BULK]
+    if not user_ids:
+        return []
+    try:
+        changed = db.session.execute(
+            update(User)
+            .where(User.id.in_(user_ids), User.is_active != active)
+            .values(is_active=active)
+            .returning(User.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if changed:
+        # Their open sessions pick the change up on the next request
+        identity_cache.invalidate(*changed)
+        counters.refresh()
+    return changed
+
+
+class Counters:
+    """Dashboard totals, recomputed at most every ``ADMIN_COUNTERS_TTL`` seconds."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = None
+        self._expires_at = 0.0
+
+    def get(self):
+        with self._lock:
+            if self._values is not None and time.monotonic() < self._expires_at:
+                return self._values
+        values = self._compute()
+        with self._lock:
+            self._values = values
+            self._expires_at = time.monotonic() + current_app.config['ADMIN_COUNTERS_TTL']
+        return values
+
+    def refresh(self):
+        with self._lock:
+            self._values = None
+
+    def _compute(self):
+        # Both ranges are read from ix_auction_status_end_time
+        active, pending = db.session.execute(select(
+            select(func.count()).select_from(Auction).where(Auction.status == 'active')
+            .scalar_subquery(),
+            select(func.count()).select_from(Auction).where(Auction.status == 'pending')
+            .scalar_subquery(),
+        )).one()
+        if db.engine.dialect.name == 'postgresql':
+            estimates = dict(db.session.execute(text(
+                "SELECT relname, reltuples::bigint FROM pg_class "
+                "WHERE relname IN ('user', 'auction') AND relkind = 'r'"
+            )).all())
+            users, auctions = estimates.get('user', -1), estimates.get('auction', -1)
+        else:
+            users = auctions = -1
+        if users < 0 or auctions < 0:
+            # Never analysed, or not PostgreSQL: count for real
+            users, auctions = db.session.execute(select(
+                select(func.count()).select_from(User).scalar_subquery(),
+                select(func.count()).select_from(Auction).scalar_subquery(),
+            )).one()
+        roles = {}
+        active_users = 0
+        for role, is_active, count in db.session.execute(
+            select(User.role, User.is_active, func.count()).group_by(User.role, User.is_active)
+        ):
+            roles[role] = roles.get(role, 0) + count
+            active_users += count if is_active else 0
+        return {'total_users': users, 'total_auctions': auctions, 'active_auctions': active,
+                'pending_auctions': pending, 'users_by_role': roles, 'active_users': active_users}
+
+
+counters = Counters()
@@ -10,13 +10,20 @@ from flask_mail import Mail
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+from events import broker
+from cache import cache
+from instrumentation import instrumentation
+from identity import identity_cache
+from ratelimit import rate_limiter
+import database
+
 logging.basicConfig(level=logging.DEBUG)
 
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={'class_': database.RoutingSession})
 login_manager = LoginManager()
 csrf = CSRFProtect()
 mail = Mail()
@@ -28,28 +35,132 @@ app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
 # configure the database
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///auction.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+# Engine profiles (see database.py), chosen by the DATABASE_URL backend
+app.config['SQLITE_JOURNAL_MODE'] = os.environ.get('SQLITE_JOURNAL_MODE', 'wal')
+app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'normal')
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+app.config['SQLITE_WRITE_QUEUE'] = os.environ.get('SQLITE_WRITE_QUEUE', 'true').lower() == 'true'
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 10))
+app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+app.config['DB_POOL_TIMEOUT'] = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE', 300))
+app.config['DB_STATEMENT_TIMEOUT_MS'] = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 10000))
+app.config['DATABASE_REPLICA_URL'] = os.environ.get('DATABASE_REPLICA_URL')
+app.config['DATABASE_REPLICA_ENDPOINTS'] = ('index', 'auction_list', 'auction_detail')
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = database.engine_options(app.config)
+
 # File upload configuration
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# Image store configuration (see images.py)
+app.config['IMAGE_FOLDER'] = os.environ.get('IMAGE_FOLDER', 'media')
+app.config['IMAGE_WORKERS'] = int(os.environ.get('IMAGE_WORKERS', 2))
+
 # Mail configuration
-app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
+app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
+app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 587))
+app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', 'true').lower() == 'true'
 app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME')
 app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD')
+app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER', app.config['MAIL_USERNAME'])
+app.config['MAIL_ENABLED'] = os.environ.get('MAIL_ENABLED', 'false').lower() == 'true'
+
+# Notification outbox configuration (see outbox.py); without a worker nothing
+# becomes a notification, so each web process drains it unless told otherwise
+app.config['OUTBOX_WORKER_ENABLED'] = os.environ.get('OUTBOX_WORKER_ENABLED', 'true').lower() == 'true'
+app.config['OUTBOX_COALESCE_SECONDS'] = int(os.environ.get('OUTBOX_COALESCE_SECONDS', 30))
+app.config['OUTBOX_LEASE_SECONDS'] = 300
+app.config['OUTBOX_RETRY_BASE_SECONDS'] = 30
+app.config['OUTBOX_MAX_ATTEMPTS'] = 5
+
+# Notification inbox and retention (see inbox.py); the outbox worker purges
+app.config['NOTIFICATION_PAGE_SIZE'] = int(os.environ.get('NOTIFICATION_PAGE_SIZE', 20))
+app.config['NOTIFICATION_RETENTION_DAYS'] = int(os.environ.get('NOTIFICATION_RETENTION_DAYS', 90))
+app.config['NOTIFICATION_PURGE_BATCH'] = int(os.environ.get('NOTIFICATION_PURGE_BATCH', 1000))
+app.config['NOTIFICATION_PURGE_INTERVAL'] = int(os.environ.get('NOTIFICATION_PURGE_INTERVAL', 3600))
+
+# Live update configuration (see events.py)
+app.config['EVENTS_BACKEND'] = os.environ.get('EVENTS_BACKEND', 'local')
+app.config['EVENTS_REDIS_URL'] = os.environ.get('EVENTS_REDIS_URL', 'redis://localhost:6379/0')
+
+# Page cache configuration (see cache.py)
+app.config['CACHE_BACKEND'] = os.environ.get('CACHE_BACKEND', 'local')
+app.config['CACHE_REDIS_URL'] = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/1')
+app.config['CACHE_DEFAULT_TTL'] = int(os.environ.get('CACHE_DEFAULT_TTL', 30))
+app.config['CACHE_MAX_ENTRIES'] = int(os.environ.get('CACHE_MAX_ENTRIES', 1000))
+
+# Rate limits (see ratelimit.py): "N/S" allows bursts of N and N per S
+# seconds after that, per user, client address or auction; an empty value
+# turns that rule off and RATE_LIMIT_BACKEND=null turns them all off
+app.config['RATE_LIMIT_BACKEND'] = os.environ.get('RATE_LIMIT_BACKEND', 'local')
+app.config['RATE_LIMIT_REDIS_URL'] = os.environ.get('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/2')
+app.config['RATE_LIMIT_MAX_KEYS'] = int(os.environ.get('RATE_LIMIT_MAX_KEYS', 100000))
+app.config['RATE_LIMITS'] = {
+    'bid_user': os.environ.get('RATE_LIMIT_BID_USER', '20/10'),
+    'bid_ip': os.environ.get('RATE_LIMIT_BID_IP', '60/10'),
+    'bid_auction': os.environ.get('RATE_LIMIT_BID_AUCTION', '200/10'),
+    'login_ip': os.environ.get('RATE_LIMIT_LOGIN_IP', '10/60'),
+    'register_ip': os.environ.get('RATE_LIMIT_REGISTER_IP', '5/600'),
+}
+
+# Soft close (see bidding.py): a bid in the final N seconds moves end_time
+# to N seconds from now; 0 turns it off
+app.config['SOFT_CLOSE_SECONDS'] = int(os.environ.get('SOFT_CLOSE_SECONDS', 120))
+
+# Auction closer configuration (see closer.py)
+app.config['AUCTION_CLOSER_ENABLED'] = os.environ.get('AUCTION_CLOSER_ENABLED', 'false').lower() == 'true'
+app.config['AUCTION_CLOSER_BATCH_SIZE'] = int(os.environ.get('AUCTION_CLOSER_BATCH_SIZE', 100))
+
+# Bid archive (see archive.py): every BID_ARCHIVE_INTERVAL seconds (0 turns
+# it off) the closer moves bids of auctions finished BID_ARCHIVE_AFTER_HOURS
+# ago out of the hot bid table
+app.config['BID_ARCHIVE_INTERVAL'] = int(os.environ.get('BID_ARCHIVE_INTERVAL', 300))
+app.config['BID_ARCHIVE_AFTER_HOURS'] = int(os.environ.get('BID_ARCHIVE_AFTER_HOURS', 24))
+app.config['BID_ARCHIVE_BATCH_SIZE'] = int(os.environ.get('BID_ARCHIVE_BATCH_SIZE', 100))
+app.config['BID_ARCHIVE_MAX_SECONDS'] = float(os.environ.get('BID_ARCHIVE_MAX_SECONDS', 1.0))
+
+# Admin pages (see admin.py)
+app.config['ADMIN_PAGE_SIZE'] = int(os.environ.get('ADMIN_PAGE_SIZE', 50))
+app.config['ADMIN_COUNTERS_TTL'] = int(os.environ.get('ADMIN_COUNTERS_TTL', 60))
+
+# Category catalog (see catalog.py): other workers see a new category or
+# changed counts within CATEGORY_CATALOG_TTL seconds; 0 turns it off
+app.config['CATEGORY_CATALOG_TTL'] = int(os.environ.get('CATEGORY_CATALOG_TTL', 60))
+
+# Bulk auction import (see importer.py): rows per INSERT and commit, and
+# how many rejected rows the report lists
+app.config['IMPORT_BATCH_SIZE'] = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+app.config['IMPORT_MAX_ERRORS'] = int(os.environ.get('IMPORT_MAX_ERRORS', 1000))
+
+# Seller and buyer dashboards (see dashboards.py)
+app.config['DASHBOARD_PAGE_SIZE'] = int(os.environ.get('DASHBOARD_PAGE_SIZE', 20))
+
+# Instrumentation (see instrumentation.py); nothing is hooked in while disabled
+app.config['INSTRUMENTATION_ENABLED'] = os.environ.get('INSTRUMENTATION_ENABLED', 'false').lower() == 'true'
+app.config['SLOW_QUERY_MS'] = int(os.environ.get('SLOW_QUERY_MS', 100))
+app.config['PROFILE_SLOW_REQUEST_MS'] = int(os.environ.get('PROFILE_SLOW_REQUEST_MS', 0))
+app.config['PROFILE_INTERVAL_MS'] = int(os.environ.get('PROFILE_INTERVAL_MS', 5))
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR', 'profiles')
+
+# Session user cache (see identity.py): a deactivated user is locked out
+# of every worker within USER_CACHE_TTL seconds; 0 turns it off
+app.config['USER_CACHE_TTL'] = int(os.environ.get('USER_CACHE_TTL', 30))
+app.config['USER_CACHE_MAX_ENTRIES'] = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 10000))
 
 # initialize extensions
 db.init_app(app)
+database.init_app(app, db)
 login_manager.init_app(app)
 csrf.init_app(app)
 mail.init_app(app)
+broker.init_app(app)
+cache.init_app(app)
+instrumentation.init_app(app)
+identity_cache.init_app(app)
+rate_limiter.init_app(app)
 
 login_manager.login_view = 'login'
 login_manager.login_message = 'Please log in to access this page.'
@@ -57,8 +168,9 @@ login_manager.login_message_category = 'info'
 
 @login_manager.user_loader
 def load_user(user_id):
-    from models import User
-    return User.query.get(int(user_id))
+    user = identity_cache.load(int(user_id))
+    # Deactivating a user ends their existing sessions, not just new logins
+    return user if user is not None and user.is_active else None
 
 # Template filters
 @app.template_filter('datetime')
@@ -67,50 +179,37 @@ def datetime_filter(dt):
         return ''
     return dt.strftime('%B %d, %Y at %I:%M %p')
 
+@app.template_global('image_url')
+def image_url_global(name, size='card'):
+    from images import image_url
+    return image_url(name, size)
+
 @app.template_filter('currency')
 def currency_filter(amount):
     if amount is None:
         return '$0.00'
     return f'${amount:.2f}'
 
-with app.app_context():
-    # Import models and routes
-    import models
-    import routes
-    
-    # Create tables
-    db.create_all()
-    
-    # Create admin user if it doesn't exist
-    from models import User, Category
-    from werkzeug.security import generate_password_hash
-    
-    admin = User.query.filter_by(email='admin@auction.com').first()
-    if not admin:
-        admin = User(
-            username='admin',
-            email='admin@auction.com',
-            password_hash=generate_password_hash('admin123'),
-            role='admin'
-        )
-        db.session.add(admin)
-        db.session.commit()
-        print("Created admin user: admin@auction.com / admin123")
-    
-    # Create default categories if they don't exist
-    default_categories = [
-        {'name': 'Electronics', 'description': 'Computers, phones, gadgets and electronic devices'},
-        {'name': 'Collectibles', 'description': 'Rare items, antiques, and collectible memorabilia'},
-        {'name': 'Art & Crafts', 'description': 'Paintings, sculptures, handmade items and artwork'},
-        {'name': 'Home & Garden', 'description': 'Furniture, decor, tools and garden equipment'},
-        {'name': 'Fashion', 'description': 'Clothing, accessories, shoes and fashion items'},
-        {'name': 'Books & Media', 'description': 'Books, movies, music and educational materials'}
-    ]
-    
-    for cat_data in default_categories:
-        existing = Category.query.filter_by(name=cat_data['name']).first()
-        if not existing:
-            category = Category(name=cat_data['name'], description=cat_data['description'])
-            db.session.add(category)
-    
-    db.session.commit()
+# Register models, routes and CLI commands.  Nothing here touches the
+# database: tables and default data come from `flask bootstrap`
+import models
+import routes
+import commands
+
+
+def create_app():
+    """Return the app ready to serve, with its background workers started.
+
+    This is the entry point for web servers (``gunicorn 'app:create_app()'``
+    or ``main:app``).  The CLI uses the bare ``app`` instead, so maintenance
+    commands never start a closer or outbox worker of their own.
+    """
+    if app.config['AUCTION_CLOSER_ENABLED']:
+        from closer import auction_closer
+        auction_closer.batch_size = app.config['AUCTION_CLOSER_BATCH_SIZE']
+        auction_closer.start(app)
+
+    if app.config['OUTBOX_WORKER_ENABLED']:
+        from outbox import outbox_worker
+        outbox_worker.start(app)
+    return app
@@ -0,0 +1,192 @@
+"""Hot/cold split of bids: finished auctions' bids move to ``bid_archive``.
+
+``bid`` only needs to hold bids on auctions that can still change.  Once
+an auction has been completed or cancelled for ``BID_ARCHIVE_AFTER_HOURS``,
+:func:`archive_batch` moves its bids, ids and all, into ``bid_archive``
+and writes a ``BidArchiveSummary`` row for it.  The copy, the summary and
+the delete happen in one transaction, so an auction's bids are always
+wholly in one table.  An auction whose hot bids carry ids already taken
+in the archive (ids handed out again by a ``bid`` table from before
+AUTOINCREMENT) is logged and left in place rather than archived.
+``bid_archive`` carries a single index, for the auction's history;
+nothing else reads it.
+
+Batches take at most ``BID_ARCHIVE_BATCH_SIZE`` auctions, found by
+walking the distinct auction ids in ``bid``'s own index and checking them
+against ``auction`` in chunks.  :func:`archive_due` carries the walk from
+batch to batch, so a full run reads the hot table once, however much has
+been archived before, and hands back where it stopped so a run cut short
+by its time limit can be picked up there.  Every statement is idempotent, so
+two archivers racing on the same auctions cannot copy a bid twice.  The
+auction closer runs batches after each sweep for up to
+``BID_ARCHIVE_MAX_SECONDS``; ``flask archive-bids`` drains the backlog on
+demand.
+
+Readers go through :func:`bid_history`, which reads both tables in one
+statement, each through its own index.  Auction aggregates (``bid_count``,
+``highest_bid_amount``) and the dashboards' ``BidPosition`` rows never
+move, so list pages and buyer history are unaffected.
+"""
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import select, insert, delete, exists, func, literal, union_all, or_, and_, desc
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from models import Auction, ArchivedBid, Bid, BidArchiveSummary, User
+
+logger = logging.getLogger(__name__)
+
+FINISHED = ('completed', 'cancelled')
+
+_UPSERT_DIALECTS = {'sqlite': sqlite, 'postgresql': postgresql}
+
+_BID_COLUMNS = ('id', 'amount', 'timestamp', 'auction_id', 'bidder_id')
+
+# Auction ids looked at per step of the hot-table walk, under SQLite's parameter limit
+_SCAN_CHUNK = 500
+
+
+def bid_history(auction_id, limit, before=None, since=None):
+    """The newest ``limit`` bids on ``auction_id`` from both tables, with the bidder's name.
+
+    ``before`` and ``since`` are ``(timestamp, id)`` keys: only bids older
+    (or newer) than the key are returned.
+    """
+    branches = []
+    for table in (Bid.__table__, ArchivedBid.__table__):
+        query = select(table.c.id, table.c.amount, table.c.timestamp, table.c.bidder_id).where(
+            table.c.auction_id == auction_id)
+        if before:
+            timestamp, bid_id = before
+            query = query.where(or_(table.c.timestamp < timestamp,
+                                    and_(table.c.timestamp == timestamp, table.c.id < bid_id)))
+        if since:
+            timestamp, bid_id = since
+            query = query.where(or_(table.c.timestamp > timestamp,
+                                    and_(table.c.timestamp == timestamp, table.c.id > bid_id)))
+        # Each side stops after ``limit`` rows of its own index
+        branch = query.order_by(desc(table.c.timestamp), desc(table.c.id)).limit(limit).subquery()
+        branches.append(select(branch))
+    bids = union_all(*branches).subquery('bids')
+    return db.session.execute(
+        select(bids.c.id, bids.c.amount, bids.c.timestamp, User.username)
+        .join(User, User.id == bids.c.bidder_id)
+        .order_by(desc(bids.c.timestamp), desc(bids.c.id))
+        .limit(limit)
+    ).all()
+
+
+def _insert_ignoring_duplicates(model, select_stmt, columns):
+    dialect = _UPSERT_DIALECTS.get(db.engine.dialect.name)
+    if dialect is not None:
+        stmt = dialect.insert(model).from_select(columns, select_stmt).on_conflict_do_nothing()
+    else:
+        stmt = insert(model).from_select(columns, select_stmt)
+    return db.session.execute(stmt).rowcount
+
+
+def _due_auctions(batch_size, cutoff, after):
+    """Up to ``batch_size`` ids above ``after`` of hot auctions that finished before ``cutoff``.
+
+    Walks the distinct auction ids in ``bid`` in chunks, in id order, and
+    returns the ids found with the id to resume after, or None once the
+    hot table is exhausted.
+    """
+    found = []
+    while True:
+        # An index-only walk of ix_bid_auction_amount
+        chunk = db.session.execute(
+            select(Bid.auction_id).distinct()
+            .where(Bid.auction_id > after)
+            .order_by(Bid.auction_id)
+            .limit(_SCAN_CHUNK)
+        ).scalars().all()
+        if not chunk:
+            return found, None
+        found += db.session.execute(
+            select(Auction.id)
+            .where(Auction.id.in_(chunk), Auction.status.in_(FINISHED), Auction.end_time < cutoff)
+            .order_by(Auction.id)
+        ).scalars().all()
+        if len(found) >= batch_size:
+            found = found[:batch_size]
+            return found, found[-1]
+        after = chunk[-1]
+
+
+def archive_batch(batch_size=None, after_hours=None, now=None, after=0):
+    """Archive the bids of up to ``batch_size`` auctions finished ``after_hours`` ago.
+
+    Only auctions with ids above ``after`` are considered.  Returns
+    ``(auctions, bids, resume)``: how many of each moved, and the id the
+    next batch can start after, or None when nothing is left.
+    """
+    config = current_app.config
+    batch_size = batch_size or config['BID_ARCHIVE_BATCH_SIZE']
+    after_hours = config['BID_ARCHIVE_AFTER_HOURS'] if after_hours is None else after_hours
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(hours=after_hours)
+    try:
+        auction_ids, resume = _due_auctions(batch_size, cutoff, after)
+        if not auction_ids:
+            db.session.rollback()
+            return 0, 0, None
+        conflicted = set(db.session.execute(
+            select(Bid.auction_id).distinct()
+            .join(ArchivedBid, ArchivedBid.id == Bid.id)
+            .where(Bid.auction_id.in_(auction_ids), ArchivedBid.auction_id != Bid.auction_id)
+        ).scalars())
+        if conflicted:
+            logger.error('Not archiving the bids of auctions %s: their ids are already taken '
+                         'in bid_archive (run flask db-upgrade)', sorted(conflicted))
+            auction_ids = [i for i in auction_ids if i not in conflicted]
+            if not auction_ids:
+                db.session.rollback()
+                return 0, 0, resume
+        hot = Bid.auction_id.in_(auction_ids)
+        _insert_ignoring_duplicates(
+            BidArchiveSummary,
+            select(Bid.auction_id, func.count(), func.count(func.distinct(Bid.bidder_id)),
+                   func.min(Bid.timestamp), func.max(Bid.timestamp), literal(now))
+            .where(hot).group_by(Bid.auction_id),
+            ['auction_id', 'bid_count', 'bidder_count', 'first_bid_at', 'last_bid_at', 'archived_at'],
+        )
+        _insert_ignoring_duplicates(
+            ArchivedBid, select(*[getattr(Bid, c) for c in _BID_COLUMNS]).where(hot), _BID_COLUMNS,
+        )
+        # Only bids whose copy is in the archive leave the hot table
+        moved = db.session.execute(
+            delete(Bid).where(hot, exists().where(ArchivedBid.id == Bid.id,
+                                                  ArchivedBid.auction_id == Bid.auction_id))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(auction_ids), moved, resume
+
+
+def archive_due(batch_size=None, after_hours=None, max_seconds=None, now=None, after=0):
+    """Run batches over the hot table until nothing is due or ``max_seconds`` pass.
+
+    The walk starts after auction id ``after``.  Returns ``(auctions,
+    bids, resume)``; ``resume`` is the id to pass as ``after`` next time
+    when it stopped on the time limit with work left, or None once the
+    walk reached the end of the hot table.
+    """
+    started = time.perf_counter()
+    auctions = bids = 0
+    resume = after
+    while True:
+        done, moved, resume = archive_batch(batch_size, after_hours, now, resume)
+        auctions += done
+        bids += moved
+        if resume is None:
+            return auctions, bids, None
+        if max_seconds is not None and time.perf_counter() - started >= max_seconds:
+            return auctions, bids, resume
@@ -0,0 +1,105 @@
+"""Admin pages and bulk actions at scale.
+
+Seeds a large dataset, then times the admin dashboard and the first and a
+deep page of the user and auction listings, followed by approving
+``--approve`` pending auctions one request at a time (the old approve link)
+against the same number in bulk requests of ``--batch`` ids, counting SQL
+statements for both.
+
+    python -m benchmarks.admin_bulk --users 50000 --auctions 100000 --approve 500
+"""
+import argparse
+import json
+import re
+import time
+
+from benchmarks.common import load_app, seed_dataset, QueryCounter, login
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--auctions', type=int, default=100000)
+    parser.add_argument('--bids', type=int, default=100000)
+    parser.add_argument('--approve', type=int, default=500)
+    parser.add_argument('--batch', type=int, default=250)
+    parser.add_argument('--pages', type=int, default=20, help='how deep the deep page is')
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    app, db = load_app(args.database_url)
+    from models import Auction
+
+    with app.app_context():
+        seed_dataset(db, users=args.users, sellers=max(args.users // 50, 1),
+                     auctions=args.auctions, bids=args.bids)
+        if db.engine.dialect.name == 'sqlite':
+            db.session.execute(db.text('ANALYZE'))
+            db.session.commit()
+        pending = db.session.execute(
+            db.select(Auction.id).where(Auction.status == 'pending').limit(2 * args.approve)
+        ).scalars().all()
+        engine = db.engine
+    single, bulk = pending[:args.approve], pending[args.approve:2 * args.approve]
+
+    client = app.test_client()
+    login(client, 'admin@auction.com', 'admin123')
+
+    def timed(method, url, data=None):
+        counter = QueryCounter(engine)
+        t0 = time.perf_counter()
+        with counter:
+            response = client.open(url, method=method, data=data)
+        return response, 1000 * (time.perf_counter() - t0), counter.count
+
+    def deep(url):
+        """Follow ``--pages`` next-page links and time the last one."""
+        for _ in range(args.pages):
+            html = client.get(url).get_data(as_text=True)
+            match = re.search(r'href="([^"]*after=[^"]*)"', html)
+            if not match:
+                break
+            url = match.group(1).replace('&amp;', '&')
+        return timed('GET', url)
+
+    report = {'users': args.users, 'auctions': args.auctions, 'pages': {}}
+    client.get('/dashboard/admin')
+    for name, url in (('admin_dashboard', '/dashboard/admin'),
+                      ('manage_users', '/admin/users'),
+                      ('admin_auctions', '/admin/auctions?status=all')):
+        _, first_ms, first_sql = timed('GET', url)
+        _, deep_ms, deep_sql = deep(url)
+        report['pages'][name] = {'first_ms': round(first_ms, 1), 'first_sql': first_sql,
+                                 f'page_{args.pages}_ms': round(deep_ms, 1),
+                                 f'page_{args.pages}_sql': deep_sql}
+
+    t0 = time.perf_counter()
+    statements = 0
+    for auction_id in single:
+        _, _, count = timed('GET', f'/admin/approve_auction/{auction_id}')
+        statements += count
+    report['approve_one_by_one'] = {'auctions': len(single), 'requests': len(single),
+                                    'seconds': round(time.perf_counter() - t0, 2), 'sql': statements}
+
+    t0 = time.perf_counter()
+    statements = requests = 0
+    for i in range(0, len(bulk), args.batch):
+        _, _, count = timed('POST', '/admin/auctions/bulk',
+                            {'action': 'approve', 'auction_ids': bulk[i:i + args.batch]})
+        statements += count
+        requests += 1
+    report['approve_bulk'] = {'auctions': len(bulk), 'requests': requests,
+                              'seconds': round(time.perf_counter() - t0, 2), 'sql': statements}
+
+    with app.app_context():
+        approved = db.session.execute(
+            db.select(db.func.count()).select_from(Auction)
+            .where(Auction.id.in_(single + bulk), Auction.status == 'active')
+        ).scalar()
+    report['all_approved'] = approved == len(single) + len(bulk)
+    print(json.dumps(report, indent=2))
+    return 0 if report['all_approved'] else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,175 @@
+"""Bulk import throughput and memory against one-at-a-time creation.
+
+Writes a ``--rows`` listing file (CSV or JSON lines) in which
+``--bad-share`` of the rows break one of the create form's rules and
+``--image-share`` reference one of ``--images`` photos.  Then it reports:
+
+* how long one photo takes to store and render the first time;
+* ``--form-rows`` auctions created through ``/create_auction`` one by one,
+  ms per auction;
+* an import of the first tenth of the file and then of all of it
+  through :func:`importer.import_auctions`: seconds, rows per second and
+  the process's peak RSS after each, which stays flat as the file grows;
+
+and checks that every good row was imported, every bad one was reported,
+and the seller's dashboard counter moved by the number imported.
+
+    python -m benchmarks.auction_import --rows 100000 --format jsonl
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import ADJECTIVES, NOUNS, FILLER, load_app, seed_dataset, login
+from benchmarks.image_bytes import photo
+
+BREAKS = (
+    ('title', 'tiny'),
+    ('description', 'too short'),
+    ('starting_bid', '-5'),
+    ('starting_bid', '1.005'),
+    ('category', 'No Such Category'),
+    ('start_time', '2001-01-01T00:00'),
+    ('end_time', 'tomorrow'),
+)
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_listings(path, fmt, rows, bad_share, image_share, image_names, categories, seed=7):
+    """Write the listing file; returns how many rows are bad."""
+    rng = random.Random(seed)
+    start = datetime.now() + timedelta(days=1)
+    columns = ('title', 'description', 'starting_bid', 'category', 'start_time', 'end_time', 'image')
+    bad = 0
+    with open(path, 'w', newline='', encoding='utf-8') as out:
+        if fmt == 'csv':
+            import csv
+            writer = csv.writer(out)
+            writer.writerow(columns)
+        for n in range(rows):
+            begins = start + timedelta(minutes=rng.randint(0, 60 * 24 * 30))
+            row = {
+                'title': f'{rng.choice(ADJECTIVES).title()} {rng.choice(NOUNS)} #{n}',
+                'description': ' '.join(rng.choice(FILLER) for _ in range(rng.randint(8, 30))),
+                'starting_bid': f'{rng.randint(1, 50000) / 100:.2f}',
+                'category': rng.choice(categories),
+                'start_time': begins.strftime('%Y-%m-%dT%H:%M'),
+                'end_time': (begins + timedelta(days=rng.randint(1, 10))).strftime('%Y-%m-%dT%H:%M'),
+                'image': rng.choice(image_names) if image_names and rng.random() < image_share else '',
+            }
+            if rng.random() < bad_share:
+                field, value = rng.choice(BREAKS)
+                row[field] = value
+                bad += 1
+            if fmt == 'csv':
+                writer.writerow([row[c] for c in columns])
+            else:
+                out.write(json.dumps(row) + '\n')
+    return bad
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--format', choices=('csv', 'jsonl'), default='csv')
+    parser.add_argument('--bad-share', type=float, default=0.01)
+    parser.add_argument('--images', type=int, default=20)
+    parser.add_argument('--image-share', type=float, default=0.05)
+    parser.add_argument('--form-rows', type=int, default=200)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    app, db = load_app(args.database_url)
+    import images
+    import importer
+    from catalog import category_catalog
+    from models import User, UserStats
+
+    workdir = tempfile.mkdtemp(prefix='bench_import_')
+    app.config['IMAGE_FOLDER'] = os.path.join(workdir, 'media')
+    report = {'rows': args.rows, 'format': args.format}
+    try:
+        with app.app_context():
+            data = seed_dataset(db, users=50, sellers=5, auctions=1000, bids=5000)
+            seller_id = data['seller_ids'][0]
+            categories = [entry.name for entry in category_catalog.all()]
+            seller_email = db.session.get(User, seller_id).email
+        image_dir = os.path.join(workdir, 'photos')
+        os.makedirs(image_dir)
+        image_names = []
+        for n in range(args.images):
+            image_names.append(f'photo_{n}.jpg')
+            with open(os.path.join(image_dir, image_names[-1]), 'wb') as fh:
+                fh.write(photo(n, 1600, 1200))
+        # Render every photo once up front so the first import does not pay for it
+        with app.app_context():
+            t0 = time.perf_counter()
+            for name in image_names:
+                with open(os.path.join(image_dir, name), 'rb') as fh:
+                    images.render(images.store(fh))
+            report['first_render_s_per_image'] = round((time.perf_counter() - t0) / max(args.images, 1), 3)
+
+        client = app.test_client()
+        login(client, seller_email)
+        start = datetime.now() + timedelta(days=1)
+        form = {'title': 'Boxed camera from the bench', 'starting_bid': '10.00',
+                'description': 'A form-created listing used to time one-at-a-time creation.',
+                'category_id': str(category_catalog.all()[0].id),
+                'start_time': start.strftime('%Y-%m-%dT%H:%M'),
+                'end_time': (start + timedelta(days=3)).strftime('%Y-%m-%dT%H:%M')}
+        t0 = time.perf_counter()
+        for _ in range(args.form_rows):
+            response = client.post('/create_auction', data=form)
+            if response.status_code != 302:
+                raise RuntimeError(f'/create_auction returned {response.status_code}')
+        report['form_ms_per_auction'] = round(1000 * (time.perf_counter() - t0) / args.form_rows, 3)
+
+        def pending():
+            return db.session.execute(
+                db.select(UserStats.auctions_pending).where(UserStats.user_id == seller_id)
+            ).scalar() or 0
+
+        report['peak_rss_mb_before_imports'] = round(peak_rss_mb(), 1)
+        for name, rows in (('tenth', args.rows // 10), ('full', args.rows)):
+            path = os.path.join(workdir, f'listings_{name}.{args.format}')
+            bad = write_listings(path, args.format, rows, args.bad_share, args.image_share,
+                                 image_names, categories)
+            with app.app_context():
+                before = pending()
+                t0 = time.perf_counter()
+                with open(path, 'rb') as fh:
+                    result = importer.import_auctions(fh, seller_id, args.format, image_dir=image_dir)
+                seconds = time.perf_counter() - t0
+                counted = pending() - before
+            report[name] = {
+                'rows': rows,
+                'file_mb': round(os.path.getsize(path) / 2 ** 20, 1),
+                'seconds': round(seconds, 2),
+                'rows_per_s': round(rows / seconds),
+                'imported': result.imported,
+                'rejected': result.rejected,
+                'peak_rss_mb': round(peak_rss_mb(), 1),
+                'correct': (result.imported == rows - bad and result.rejected == bad
+                            and counted == result.imported),
+            }
+            os.unlink(path)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report['form_vs_import_per_row'] = round(
+        report['form_ms_per_auction'] / (1000 / report['full']['rows_per_s']), 1)
+    print(json.dumps(report, indent=2))
+    return 0 if report['tenth']['correct'] and report['full']['correct'] else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
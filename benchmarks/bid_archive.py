@@ -0,0 +1,129 @@
+"""Hot bid table size and bid latency before and after archiving finished auctions.
+
+Seeds ``--bids`` bids over ``--auctions`` auctions and then ages all but
+``--live-share`` of the bid-bearing auctions into long-completed history,
+as on a site that has been running for a while.  It then measures the
+hot ``bid`` table (rows and bytes, indexes included) and the p50/p95/p99
+latency of ``--samples`` bids through :func:`bidding.place_bid`.  Next it
+archives everything due with :func:`archive.archive_due` and measures
+again, and checks that an archived auction's page and bid history still
+load.
+
+    python -m benchmarks.bid_archive --auctions 200000 --bids 10000000
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import load_app, seed_dataset, QueryCounter
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--auctions', type=int, default=200000)
+    parser.add_argument('--bids', type=int, default=10000000)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--live-share', type=float, default=0.1,
+                        help='share of bid-bearing auctions left live')
+    parser.add_argument('--samples', type=int, default=2000)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    app, db = load_app(args.database_url)
+    import archive
+    import bidding
+    from cache import cache, NullBackend
+    from models import Auction, Bid, BidArchiveSummary
+
+    cache.use(NullBackend())
+    rng = random.Random(7)
+    with app.app_context():
+        t0 = time.perf_counter()
+        data = seed_dataset(db, users=args.users, sellers=max(args.users // 50, 1),
+                            auctions=args.auctions, bids=args.bids)
+        now = datetime.now(timezone.utc)
+        keep_every = max(round(1 / args.live_share), 1)
+        live = Auction.status == 'active'
+        kept = db.and_(live, Auction.end_time > now, Auction.id % keep_every == 0)
+        # Everything else that is live becomes history, closed a month ago
+        db.session.execute(
+            db.update(Auction).where(live, db.not_(kept)).values(
+                status='completed', end_time=now - timedelta(days=30),
+                winner_id=Auction.highest_bidder_id,
+                current_bid=db.func.coalesce(Auction.highest_bid_amount, Auction.current_bid))
+        )
+        db.session.commit()
+        live_ids = db.session.execute(db.select(Auction.id).where(kept)).scalars().all()
+        if db.engine.dialect.name == 'sqlite':
+            db.session.execute(db.text('ANALYZE'))
+            db.session.commit()
+        seed_seconds = time.perf_counter() - t0
+        engine = db.engine
+
+    bidder_ids = data['buyer_ids']
+
+    def hot_table():
+        rows = db.session.execute(db.select(db.func.count()).select_from(Bid)).scalar()
+        if engine.dialect.name == 'postgresql':
+            size = db.session.execute(db.text("SELECT pg_total_relation_size('bid')")).scalar()
+        else:
+            size = db.session.execute(db.text(
+                "SELECT SUM(pgsize) FROM dbstat WHERE name = 'bid' OR name LIKE 'ix_bid_auction_%'"
+            )).scalar()
+        db.session.rollback()
+        return {'rows': rows, 'mb': round(size / 2 ** 20, 1)}
+
+    def bid_latency():
+        latencies = []
+        for _ in range(args.samples):
+            auction = db.session.get(Auction, rng.choice(live_ids))
+            amount = auction.minimum_bid
+            db.session.rollback()
+            t0 = time.perf_counter()
+            bidding.place_bid(auction.id, rng.choice(bidder_ids), amount)
+            latencies.append(1000 * (time.perf_counter() - t0))
+        latencies.sort()
+        return {f'p{int(f * 100)}_ms': round(percentile(latencies, f), 3)
+                for f in (0.50, 0.95, 0.99)}
+
+    report = {'seed_seconds': round(seed_seconds, 1), 'live_auctions': len(live_ids)}
+    with app.app_context():
+        report['before'] = {'hot_table': hot_table(), 'bids': bid_latency()}
+        t0 = time.perf_counter()
+        auctions, moved, _ = archive.archive_due(after_hours=0)
+        seconds = time.perf_counter() - t0
+        report['archive'] = {'auctions': auctions, 'bids': moved, 'seconds': round(seconds, 1),
+                             'bids_per_s': round(moved / seconds) if seconds else None}
+        if engine.dialect.name == 'sqlite':
+            db.session.execute(db.text('ANALYZE'))
+            db.session.commit()
+        report['after'] = {'hot_table': hot_table(), 'bids': bid_latency()}
+        archived_id = db.session.execute(
+            db.select(BidArchiveSummary.auction_id)
+            .order_by(BidArchiveSummary.bid_count.desc()).limit(1)
+        ).scalar()
+
+    client = app.test_client()
+    reads = {}
+    for name, url in (('detail', f'/auction/{archived_id}'), ('bids', f'/auction/{archived_id}/bids')):
+        client.get(url)
+        counter = QueryCounter(engine)
+        t0 = time.perf_counter()
+        with counter:
+            response = client.get(url)
+        reads[name] = {'status': response.status_code, 'sql': counter.count,
+                       'ms': round(1000 * (time.perf_counter() - t0), 3)}
+    report['archived_auction'] = reads
+    print(json.dumps(report, indent=2))
+    return 0 if all(r['status'] == 200 for r in reads.values()) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
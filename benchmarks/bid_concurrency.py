@@ -0,0 +1,131 @@
+"""Hammer a single auction (or a few) with concurrent bidders.
+
+Every thread repeatedly reads the current price and bids the minimum the
+increment bands allow, so most attempts race against each other.  With
+``--auctions`` the threads are spread over that many auctions, which
+contend for the database rather than for one row.  At the end the run
+checks that no update was lost: each auction's ``current_bid`` equals its
+highest stored ``Bid``, the number of ``Bid`` rows equals the number of
+accepted bids, and bid amounts strictly increase in insertion order.
+
+    python -m benchmarks.bid_concurrency --threads 16 --seconds 10
+"""
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import load_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--auctions', type=int, default=1)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    app, db = load_app(args.database_url)
+    from models import User, Auction, Bid
+    import bidding
+    from money import minimum_bid, as_json
+
+    with app.app_context():
+        seller = User(username='bench_seller', email='seller@bench.example.com',
+                      password_hash='x', role='seller')
+        bidders = [User(username=f'bench_bidder{i}', email=f'bidder{i}@bench.example.com',
+                        password_hash='x') for i in range(args.threads)]
+        db.session.add_all([seller] + bidders)
+        db.session.flush()
+        now = datetime.now(timezone.utc)
+        auctions = [Auction(title='Benchmark lot', description='Concurrency benchmark auction',
+                            starting_bid=1.0, start_time=now - timedelta(minutes=1),
+                            end_time=now + timedelta(hours=1), status='active',
+                            seller_id=seller.id)
+                    for _ in range(args.auctions)]
+        db.session.add_all(auctions)
+        db.session.commit()
+        auction_ids = [a.id for a in auctions]
+        bidder_ids = [b.id for b in bidders]
+
+    accepted = [0] * args.threads
+    rejected = [0] * args.threads
+    errors = [0] * args.threads
+    latencies = [[] for _ in range(args.threads)]
+    deadline = time.perf_counter() + args.seconds
+    start = threading.Barrier(args.threads)
+
+    def worker(n):
+        auction_id = auction_ids[n % len(auction_ids)]
+        with app.app_context():
+            start.wait()
+            while time.perf_counter() < deadline:
+                row = db.session.execute(
+                    db.select(Auction.starting_bid, Auction.highest_bid_amount)
+                    .where(Auction.id == auction_id)
+                ).one()
+                db.session.rollback()
+                t0 = time.perf_counter()
+                try:
+                    result = bidding.place_bid(auction_id, bidder_ids[n],
+                                               minimum_bid(row.starting_bid, row.highest_bid_amount))
+                except Exception:
+                    errors[n] += 1
+                    db.session.rollback()
+                    continue
+                finally:
+                    latencies[n].append(1000 * (time.perf_counter() - t0))
+                if result.accepted:
+                    accepted[n] += 1
+                else:
+                    rejected[n] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    total_accepted = sum(accepted)
+    stored = 0
+    lost_updates = 0
+    with app.app_context():
+        for auction_id in auction_ids:
+            amounts = db.session.execute(
+                db.select(Bid.amount).where(Bid.auction_id == auction_id).order_by(Bid.id)
+            ).scalars().all()
+            current_bid = db.session.get(Auction, auction_id).current_bid
+            stored += len(amounts)
+            lost_updates += ((bool(amounts) and current_bid != max(amounts))
+                             + sum(1 for a, b in zip(amounts, amounts[1:]) if b <= a))
+    lost_updates += stored != total_accepted
+    ordered = sorted(ms for per_thread in latencies for ms in per_thread)
+
+    def percentile(fraction):
+        return round(ordered[min(int(fraction * len(ordered)), len(ordered) - 1)], 2) if ordered else None
+
+    report = {
+        'threads': args.threads,
+        'auctions': args.auctions,
+        'seconds': round(elapsed, 3),
+        'accepted': total_accepted,
+        'rejected': sum(rejected),
+        'errors': sum(errors),
+        'accepted_per_sec': round(total_accepted / elapsed, 1),
+        'attempts_per_sec': round((total_accepted + sum(rejected)) / elapsed, 1),
+        'p50_ms': percentile(0.50),
+        'p99_ms': percentile(0.99),
+        'max_ms': round(ordered[-1], 2) if ordered else None,
+        'final_current_bid': as_json(current_bid),
+        'lost_updates': int(lost_updates),
+    }
+    print(json.dumps(report, indent=2))
+    return 1 if lost_updates else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
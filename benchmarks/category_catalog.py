@@ -0,0 +1,99 @@
+"""Category pages with and without the in-process catalog, and count drift.
+
+Times the home page, the browse page and the new-auction form (SQL
+statements and milliseconds per view, page cache off) with the catalog
+off (``CATEGORY_CATALOG_TTL=0``: one category ``SELECT`` per use, as
+before) and on.  Then approves ``--approve`` pending auctions, cancels
+some live ones and closes ``--close`` due ones, and checks the
+incrementally kept ``active_auctions`` counts against a full recount.
+
+    python -m benchmarks.category_catalog --categories 50 --views 200
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import load_app, seed_dataset, QueryCounter, login
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--auctions', type=int, default=20000)
+    parser.add_argument('--categories', type=int, default=50)
+    parser.add_argument('--views', type=int, default=200)
+    parser.add_argument('--approve', type=int, default=300)
+    parser.add_argument('--close', type=int, default=300)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    app, db = load_app(args.database_url)
+    import admin
+    import catalog
+    import closer
+    from cache import cache, NullBackend
+    from catalog import category_catalog
+    from models import Auction, Category
+
+    cache.use(NullBackend())
+    with app.app_context():
+        data = seed_dataset(db, users=200, sellers=20, auctions=args.auctions,
+                            bids=args.auctions * 5, categories=args.categories)
+        engine = db.engine
+
+    client = app.test_client()
+    login(client, f'bench{data["seller_ids"][0]}@bench.example.com')
+
+    def views(url):
+        client.get(url)
+        counter = QueryCounter(engine)
+        t0 = time.perf_counter()
+        with counter:
+            for _ in range(args.views):
+                client.get(url)
+        return {'ms': round(1000 * (time.perf_counter() - t0) / args.views, 3),
+                'sql': round(counter.count / args.views, 2)}
+
+    report = {'categories': args.categories, 'pages': {}}
+    for url in ('/', '/auctions', '/create_auction'):
+        app.config['CATEGORY_CATALOG_TTL'] = 0
+        category_catalog.invalidate()
+        off = views(url)
+        app.config['CATEGORY_CATALOG_TTL'] = 60
+        on = views(url)
+        report['pages'][url] = {'catalog_off': off, 'catalog_on': on}
+
+    with app.app_context():
+        pending = db.session.execute(
+            db.select(Auction.id).where(Auction.status == 'pending').limit(args.approve)
+        ).scalars().all()
+        active = db.session.execute(
+            db.select(Auction.id).where(Auction.status == 'active').limit(args.close + 50)
+        ).scalars().all()
+        loads = category_catalog.loads
+        t0 = time.perf_counter()
+        for i in range(0, len(pending), 50):
+            admin.update_auctions(pending[i:i + 50], 'approve')
+        admin.update_auctions(active[:50], 'cancel')
+        db.session.execute(
+            db.update(Auction).where(Auction.id.in_(active[50:]))
+            .values(end_time=datetime.now(timezone.utc) - timedelta(seconds=1))
+        )
+        db.session.commit()
+        closed, _ = closer.close_all_due(100)
+        seconds = time.perf_counter() - t0
+        client.get('/')
+        counts = db.select(Category.id, Category.active_auctions)
+        incremental = dict(db.session.execute(counts).all())
+        catalog.rebuild()
+        recounted = dict(db.session.execute(counts).all())
+    report['churn'] = {'approved': len(pending), 'cancelled': len(active[:50]), 'closed': closed,
+                       'seconds': round(seconds, 3),
+                       'catalog_reloads': category_catalog.loads - loads,
+                       'drift': sum(abs(incremental[k] - recounted[k]) for k in recounted)}
+    print(json.dumps(report, indent=2))
+    return 0 if report['churn']['drift'] == 0 else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
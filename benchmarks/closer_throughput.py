@@ -0,0 +1,79 @@
+"""Close ended auctions from several workers at once.
+
+Seeds a dataset in which about a tenth of the auctions have ended but are
+still ``active``, then runs ``--workers`` threads of
+:func:`closer.close_all_due` concurrently.  Reports closed auctions per
+second and verifies every auction was closed exactly once (one winner and
+one seller notification queued in the outbox per auction with bids).
+
+    python -m benchmarks.closer_throughput --auctions 50000 --workers 4
+"""
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timezone
+
+from benchmarks.common import load_app, seed_dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--auctions', type=int, default=50000)
+    parser.add_argument('--bids', type=int, default=200000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    app, db = load_app(args.database_url)
+    from models import Auction, OutboxEvent
+    import closer
+
+    with app.app_context():
+        seed_dataset(db, users=1000, sellers=50, auctions=args.auctions, bids=args.bids)
+        now = datetime.now(timezone.utc)
+        due = Auction.query.filter(Auction.status == 'active', Auction.end_time <= now).count()
+        due_with_bids = Auction.query.filter(Auction.status == 'active', Auction.end_time <= now,
+                                             Auction.bid_count > 0).count()
+        notifications_before = OutboxEvent.query.count()
+
+    closed = [0] * args.workers
+    errors = []
+
+    def worker(n):
+        with app.app_context():
+            try:
+                closed[n] = closer.close_all_due(args.batch_size, now)[0]
+            except Exception as exc:
+                errors.append(repr(exc))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.workers)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    with app.app_context():
+        still_due = Auction.query.filter(Auction.status == 'active', Auction.end_time <= now).count()
+        notifications = OutboxEvent.query.count() - notifications_before
+
+    ok = sum(closed) == due and still_due == 0 and notifications == 2 * due_with_bids
+    print(json.dumps({
+        'due': due,
+        'closed': sum(closed),
+        'closed_per_worker': closed,
+        'seconds': round(elapsed, 3),
+        'closed_per_sec': round(sum(closed) / elapsed, 1) if elapsed else None,
+        'notifications': notifications,
+        'expected_notifications': 2 * due_with_bids,
+        'errors': errors,
+        'exactly_once': ok,
+    }, indent=2))
+    return 0 if ok and not errors else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,285 @@
+"""Shared setup for the benchmark scripts.
+
+Benchmarks run against a throwaway database so they never touch
+``auction.db``.  ``DATABASE_URL`` must be set before ``app`` is imported,
+which is why :func:`load_app` does the import itself.
+"""
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event, insert
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PASSWORD = 'benchpass'
+CHUNK = 20000
+
+ADJECTIVES = ('vintage', 'antique', 'rare', 'signed', 'handmade', 'restored', 'mint',
+              'classic', 'modern', 'limited', 'original', 'boxed', 'retro', 'custom')
+NOUNS = ('camera', 'guitar', 'watch', 'vase', 'painting', 'lamp', 'bicycle', 'typewriter',
+         'record', 'poster', 'chair', 'radio', 'jacket', 'novel', 'sculpture', 'clock',
+         'telescope', 'teapot', 'keyboard', 'amplifier', 'bracelet', 'map', 'quilt', 'lens')
+FILLER = ('condition', 'excellent', 'minor', 'wear', 'shipping', 'included', 'tested',
+          'working', 'collector', 'estate', 'found', 'original', 'packaging', 'serial',
+          'number', 'matching', 'great', 'display', 'piece', 'from', 'the', 'with', 'and',
+          'small', 'scratch', 'back', 'see', 'photos', 'details', 'era', 'maker', 'mark')
+
+
+def _maker_names(count=5000, seed=7):
+    syllables = ('ka', 'lo', 'ver', 'mi', 'tan', 'zu', 'bel', 'ro', 'shi', 'den',
+                 'qua', 'fen', 'tor', 'al', 'ni', 'gra', 'pol', 'es', 'vin', 'dre')
+    rng = random.Random(seed)
+    names = []
+    seen = set()
+    while len(names) < count:
+        name = ''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+        if name not in seen:
+            seen.add(name)
+            names.append(name)
+    return names
+
+
+# Brand-like words so search runs against a realistic long-tail vocabulary;
+# lower indexes are far more common than higher ones
+MAKERS = _maker_names()
+
+
+def load_app(database_url=None):
+    """Import the Flask app bound to ``database_url`` (a temp SQLite file by default).
+
+    The schema and default data are created the way ``flask bootstrap`` does.
+    """
+    if database_url is None:
+        fd, path = tempfile.mkstemp(prefix='bench_', suffix='.db')
+        os.close(fd)
+        os.unlink(path)
+        database_url = f'sqlite:///{path}'
+    os.environ['DATABASE_URL'] = database_url
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+    import logging
+    logging.disable(logging.INFO)
+
+    from app import app, db
+    from bootstrap import bootstrap
+    from ratelimit import rate_limiter, NullBackend
+    app.config['WTF_CSRF_ENABLED'] = False
+    # Every benchmark client comes from one address
+    rate_limiter.use(NullBackend())
+    with app.app_context():
+        bootstrap()
+    return app, db
+
+
+class QueryCounter:
+    """Record every SQL statement the engine executes while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+def _insert_chunks(db, model, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= CHUNK:
+            db.session.execute(insert(model), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(model), batch)
+    db.session.commit()
+
+
+def seed_dataset(db, users=1000, sellers=100, auctions=10000, bids=100000, categories=6, seed=42):
+    """Bulk-insert a synthetic marketplace and return a summary of what was created.
+
+    Roughly 70% of auctions are live, 20% ended and awaiting close or already
+    completed, and 10% pending approval.  Bids are spread over live and ended
+    auctions with strictly increasing amounts and streamed in chunks, then
+    the denormalised bid aggregates on ``Auction`` are rebuilt to match.
+    Categories are topped up to ``categories`` if fewer exist.
+    """
+    from werkzeug.security import generate_password_hash
+    from models import User, Category, Auction, Bid
+
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    password_hash = generate_password_hash(PASSWORD)
+
+    category_ids = [c.id for c in Category.query.all()]
+    if len(category_ids) < categories:
+        _insert_chunks(db, Category, ({'name': f'Category {i}'}
+                                      for i in range(len(category_ids), categories)))
+        category_ids = [c.id for c in Category.query.all()]
+
+    first_user = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    _insert_chunks(db, User, (
+        {
+            'username': f'bench{first_user + i}',
+            'email': f'bench{first_user + i}@bench.example.com',
+            'password_hash': password_hash,
+            'role': 'seller' if i < sellers else 'buyer',
+            'created_at': now - timedelta(days=rng.randint(0, 365)),
+            'is_active': True,
+        }
+        for i in range(users)
+    ))
+    seller_ids = list(range(first_user, first_user + sellers))
+    buyer_ids = list(range(first_user + sellers, first_user + users))
+
+    first_auction = (db.session.query(db.func.max(Auction.id)).scalar() or 0) + 1
+    per_auction = [0] * auctions
+    biddable = []
+    plan = []
+    for i in range(auctions):
+        roll = rng.random()
+        if roll < 0.7:
+            status, start = 'active', now - timedelta(hours=rng.randint(1, 72))
+            end = now + timedelta(minutes=rng.randint(1, 60 * 24 * 7))
+            biddable.append(i)
+        elif roll < 0.9:
+            status = rng.choice(['active', 'completed'])
+            start = now - timedelta(days=rng.randint(8, 30))
+            end = now - timedelta(minutes=rng.randint(1, 60 * 24 * 7))
+            biddable.append(i)
+        else:
+            status, start = 'pending', now + timedelta(hours=rng.randint(1, 72))
+            end = start + timedelta(days=rng.randint(1, 7))
+        plan.append((status, start, end))
+    for _ in range(bids if biddable else 0):
+        per_auction[rng.choice(biddable)] += 1
+
+    starting = [round(rng.uniform(1, 100), 2) for _ in range(auctions)]
+    # Separate generator so the text does not shift the bid layout
+    words = random.Random(seed + 1)
+
+    def maker():
+        return MAKERS[int(len(MAKERS) * words.random() ** 3)]
+
+    def title(n):
+        return f'{words.choice(ADJECTIVES).title()} {maker().title()} {words.choice(NOUNS)} lot {n}'
+
+    def description():
+        text = [words.choice(FILLER) for _ in range(words.randint(20, 60))]
+        for _ in range(words.randint(1, 4)):
+            text[words.randrange(len(text))] = words.choice((maker(), words.choice(NOUNS),
+                                                             words.choice(ADJECTIVES)))
+        return ' '.join(text) + '.'
+
+    _insert_chunks(db, Auction, (
+        {
+            'title': title(first_auction + i),
+            'description': description(),
+            'starting_bid': starting[i],
+            'current_bid': 0.0,
+            'start_time': start,
+            'end_time': end,
+            'created_at': start - timedelta(hours=1),
+            'status': status,
+            'seller_id': rng.choice(seller_ids),
+            'category_id': rng.choice(category_ids),
+            'bid_count': 0,
+        }
+        for i, (status, start, end) in enumerate(plan)
+    ))
+
+    def bid_rows():
+        for i, n in enumerate(per_auction):
+            amount = starting[i]
+            start, end = plan[i][1], plan[i][2]
+            span = max((min(end, now) - start).total_seconds(), n + 1)
+            for k in range(n):
+                amount = round(amount + rng.uniform(0.5, 5), 2)
+                yield {
+                    'auction_id': first_auction + i,
+                    'bidder_id': rng.choice(buyer_ids),
+                    'amount': amount,
+                    'timestamp': start + timedelta(seconds=span * (k + 1) / (n + 1)),
+                }
+
+    _insert_chunks(db, Bid, bid_rows())
+
+    # Fill in the aggregates the bid path would have maintained
+    from bidding import recompute_bid_aggregates
+    recompute_bid_aggregates()
+    db.session.execute(
+        db.update(Auction)
+        .where(Auction.id >= first_auction)
+        .values(current_bid=db.func.coalesce(Auction.highest_bid_amount, 0.0))
+    )
+    db.session.execute(
+        db.update(Auction)
+        .where(Auction.id >= first_auction, Auction.status == 'completed')
+        .values(winner_id=Auction.highest_bidder_id)
+    )
+    db.session.commit()
+    # ... and the dashboard read models and category counts, from the finished auctions and bids
+    import catalog
+    import dashboards
+    dashboards.rebuild()
+    catalog.rebuild()
+
+    return {
+        'seller_ids': seller_ids,
+        'buyer_ids': buyer_ids,
+        'category_ids': category_ids,
+        'first_auction_id': first_auction,
+        'auctions': auctions,
+        'bids': bids,
+        'live_auction_ids': [first_auction + i for i in biddable if plan[i][2] > now
+                             and plan[i][0] == 'active'],
+    }
+
+
+def seed_notifications(db, user_id, count, unread=0.5, days=365, seed=42):
+    """Bulk-insert ``count`` notifications for ``user_id`` spread over ``days``.
+
+    A share ``unread`` of them is unread, and the user's unread counter is
+    raised to match, as the outbox would have.  Returns the unread count.
+    """
+    from models import Notification
+    import dashboards
+
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    flags = [rng.random() >= unread for _ in range(count)]
+    _insert_chunks(db, Notification, (
+        {
+            'user_id': user_id,
+            'message': f'New bid of ${rng.randint(5, 500)}.00 on your auction "{rng.choice(NOUNS)} lot {i}"',
+            'is_read': is_read,
+            'created_at': now - timedelta(seconds=days * 86400 * (count - i) / count),
+        }
+        for i, is_read in enumerate(flags)
+    ))
+    unread_count = flags.count(False)
+    dashboards.add(user_id, notifications_unread=unread_count)
+    db.session.commit()
+    return unread_count
+
+
+def login(client, email, password=PASSWORD):
+    client.get('/logout')
+    response = client.post('/login', data={'email': email, 'password': password})
+    if response.status_code != 302:
+        raise RuntimeError(f'login failed for {email}')
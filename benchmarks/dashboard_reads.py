@@ -0,0 +1,174 @@
+"""Seller and buyer dashboards against history size, read models vs. live aggregates.
+
+Seeds ``--auctions`` auctions from ``--sellers`` sellers and ``--bids``
+bids, then times the busiest seller's and buyer's dashboard pages (SQL
+statements and milliseconds per view), and the queries behind them next
+to the queries the dashboards used to run: every one of the seller's
+auctions plus aggregates over all their bids, and every won auction plus
+the latest bids for the buyer.  Finally it places
+``--live-bids`` bids through the bid path and checks the incrementally
+maintained stats against a full :func:`dashboards.rebuild`.
+
+    python -m benchmarks.dashboard_reads --auctions 100000 --bids 1000000 --sellers 20
+"""
+import argparse
+import json
+import random
+import time
+
+from benchmarks.common import load_app, seed_dataset, QueryCounter, login
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--auctions', type=int, default=100000)
+    parser.add_argument('--bids', type=int, default=1000000)
+    parser.add_argument('--sellers', type=int, default=20)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--views', type=int, default=20)
+    parser.add_argument('--live-bids', type=int, default=500)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    app, db = load_app(args.database_url)
+    import bidding
+    import dashboards
+    from cache import cache, NullBackend
+    from models import Auction, Bid, BidPosition, UserStats
+    from money import cents
+
+    cache.use(NullBackend())
+    with app.app_context():
+        data = seed_dataset(db, users=args.users, sellers=args.sellers,
+                            auctions=args.auctions, bids=args.bids)
+        if db.engine.dialect.name == 'sqlite':
+            db.session.execute(db.text('ANALYZE'))
+            db.session.commit()
+        seller_id, seller_auctions = db.session.execute(
+            db.select(Auction.seller_id, db.func.count()).group_by(Auction.seller_id)
+            .order_by(db.func.count().desc()).limit(1)
+        ).one()
+        buyer_id, buyer_bids = db.session.execute(
+            db.select(Bid.bidder_id, db.func.count()).group_by(Bid.bidder_id)
+            .order_by(db.func.count().desc()).limit(1)
+        ).one()
+        engine = db.engine
+
+    def read_model_seller():
+        dashboards.stats_for(seller_id)
+        db.session.execute(
+            db.select(Auction).options(db.joinedload(Auction.winner))
+            .where(Auction.seller_id == seller_id)
+            .order_by(Auction.created_at.desc(), Auction.id.desc())
+            .limit(app.config['DASHBOARD_PAGE_SIZE'] + 1)
+        ).unique().scalars().all()
+
+    def read_model_buyer():
+        dashboards.stats_for(buyer_id)
+        db.session.execute(
+            db.select(BidPosition)
+            .options(db.joinedload(BidPosition.auction).joinedload(Auction.seller))
+            .where(BidPosition.user_id == buyer_id)
+            .order_by(BidPosition.last_bid_at.desc()).limit(10)
+        ).unique().scalars().all()
+        db.session.execute(
+            db.select(Auction).options(db.joinedload(Auction.seller))
+            .where(Auction.winner_id == buyer_id).order_by(Auction.end_time.desc()).limit(6)
+        ).unique().scalars().all()
+
+    def legacy_seller():
+        db.session.execute(
+            db.select(Auction).options(db.joinedload(Auction.winner))
+            .where(Auction.seller_id == seller_id).order_by(Auction.created_at.desc())
+        ).unique().scalars().all()
+        db.session.execute(
+            db.select(db.func.sum(cents(Auction.current_bid)))
+            .where(Auction.seller_id == seller_id, Auction.winner_id.isnot(None))
+        ).scalar()
+        db.session.execute(
+            db.select(db.func.sum(cents(Bid.amount)), db.func.count(Bid.id))
+            .join(Auction, Bid.auction_id == Auction.id)
+            .where(Auction.seller_id == seller_id)
+        ).one()
+
+    def legacy_buyer():
+        db.session.execute(
+            db.select(Bid).options(db.joinedload(Bid.auction).joinedload(Auction.seller))
+            .where(Bid.bidder_id == buyer_id).order_by(Bid.timestamp.desc()).limit(10)
+        ).unique().scalars().all()
+        db.session.execute(
+            db.select(Auction).options(db.joinedload(Auction.seller))
+            .where(Auction.winner_id == buyer_id)
+        ).unique().scalars().all()
+        db.session.execute(
+            db.select(db.func.sum(cents(Auction.current_bid))).where(Auction.winner_id == buyer_id)
+        ).scalar()
+
+    def timed(view):
+        counter = QueryCounter(engine)
+        t0 = time.perf_counter()
+        with counter:
+            for _ in range(args.views):
+                view()
+        return {'ms_per_view': round(1000 * (time.perf_counter() - t0) / args.views, 2),
+                'sql_per_view': round(counter.count / args.views, 2)}
+
+    def page(client, url):
+        return lambda: client.get(url)
+
+    def in_context(view):
+        def run():
+            with app.app_context():
+                view()
+        return run
+
+    seller = app.test_client()
+    login(seller, f'bench{seller_id}@bench.example.com')
+    buyer = app.test_client()
+    login(buyer, f'bench{buyer_id}@bench.example.com')
+    seller.get('/dashboard/seller')
+    buyer.get('/dashboard/buyer')
+
+    report = {
+        'seller': {'auctions': seller_auctions,
+                   'page': timed(page(seller, '/dashboard/seller')),
+                   'read_model_queries': timed(in_context(read_model_seller)),
+                   'legacy_queries': timed(in_context(legacy_seller))},
+        'buyer': {'bids': buyer_bids,
+                  'page': timed(page(buyer, '/dashboard/buyer')),
+                  'read_model_queries': timed(in_context(read_model_buyer)),
+                  'legacy_queries': timed(in_context(legacy_buyer))},
+    }
+
+    rng = random.Random(7)
+    placed = 0
+    with app.app_context():
+        live = data['live_auction_ids']
+        t0 = time.perf_counter()
+        for _ in range(args.live_bids):
+            auction = db.session.get(Auction, rng.choice(live))
+            bidder = rng.choice(data['buyer_ids'])
+            placed += bidding.place_bid(auction.id, bidder, auction.minimum_bid).accepted
+            db.session.expire_all()
+        bid_seconds = time.perf_counter() - t0
+
+        def snapshot():
+            rows = db.session.execute(db.select(UserStats)).scalars()
+            return {row.user_id: tuple(getattr(row, c) for c in dashboards.STAT_COLUMNS)
+                    for row in rows}
+
+        incremental = snapshot()
+        dashboards.rebuild()
+        rebuilt = snapshot()
+    zero = tuple(0 for _ in dashboards.STAT_COLUMNS)
+    drift = [user_id for user_id in set(incremental) | set(rebuilt)
+             if incremental.get(user_id, zero) != rebuilt.get(user_id, zero)]
+    report['live_bids'] = {'placed': placed,
+                           'ms_per_bid': round(1000 * bid_seconds / max(args.live_bids, 1), 2),
+                           'users_drifted': len(drift)}
+    print(json.dumps(report, indent=2))
+    return 0 if not drift else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
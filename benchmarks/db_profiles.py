@@ -0,0 +1,78 @@
+"""Bids/sec under contention for each database engine profile.
+
+Runs :mod:`benchmarks.bid_concurrency` once per profile in a fresh
+interpreter, because the engine settings are read when ``app`` is
+imported.  On SQLite it compares the old defaults (rollback journal, full
+sync, no write queue), WAL alone, and WAL with the write queue (the
+default).  Given a PostgreSQL ``--database-url`` it runs the server profile
+with the configured pool and a deliberately small pool instead.  Both a
+single hot auction and bids spread over ``--auctions`` are measured.
+
+    python -m benchmarks.db_profiles --threads 16 --seconds 10
+    python -m benchmarks.db_profiles --database-url postgresql://localhost/bench
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.common import ROOT
+
+SQLITE_PROFILES = {
+    'sqlite-legacy': {'SQLITE_JOURNAL_MODE': 'delete', 'SQLITE_SYNCHRONOUS': 'full',
+                      'SQLITE_WRITE_QUEUE': 'false'},
+    'sqlite-wal': {'SQLITE_JOURNAL_MODE': 'wal', 'SQLITE_SYNCHRONOUS': 'normal',
+                   'SQLITE_WRITE_QUEUE': 'false'},
+    'sqlite-wal-queue': {'SQLITE_JOURNAL_MODE': 'wal', 'SQLITE_SYNCHRONOUS': 'normal',
+                         'SQLITE_WRITE_QUEUE': 'true'},
+}
+
+SERVER_PROFILES = {
+    'server-pool': {},
+    'server-small-pool': {'DB_POOL_SIZE': '2', 'DB_MAX_OVERFLOW': '0'},
+}
+
+
+def run(profile_env, args, auctions):
+    env = {**os.environ, **profile_env}
+    command = [sys.executable, '-m', 'benchmarks.bid_concurrency', '--threads', str(args.threads),
+               '--seconds', str(args.seconds), '--auctions', str(auctions)]
+    if args.database_url:
+        command += ['--database-url', args.database_url]
+    result = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True)
+    output = result.stdout[result.stdout.index('{'):]
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--auctions', type=int, default=8,
+                        help='auctions to spread bids over in the second run')
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    server = args.database_url and not args.database_url.startswith('sqlite')
+    profiles = SERVER_PROFILES if server else SQLITE_PROFILES
+    report = {}
+    for name, profile_env in profiles.items():
+        for auctions in (1, args.auctions):
+            result = run(profile_env, args, auctions)
+            report[f'{name} x{auctions}'] = {
+                key: result[key] for key in ('accepted_per_sec', 'attempts_per_sec', 'p50_ms',
+                                             'p99_ms', 'errors', 'lost_updates')
+            }
+
+    print(f'{"profile":24} {"accepted/s":>10} {"attempts/s":>10} {"p50 ms":>8} {"p99 ms":>8} '
+          f'{"errors":>7} {"lost":>5}')
+    for name, entry in report.items():
+        print(f'{name:24} {entry["accepted_per_sec"]:10.1f} {entry["attempts_per_sec"]:10.1f} '
+              f'{entry["p50_ms"]:8.2f} {entry["p99_ms"]:8.2f} {entry["errors"]:7d} '
+              f'{entry["lost_updates"]:5d}')
+    return 1 if any(entry['lost_updates'] for entry in report.values()) else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,272 @@
+"""Measure live-update fan-out with thousands of idle subscribers.
+
+First, in process: opens ``--subscribers`` subscriptions spread over
+``--auctions`` channels, publishes ``--events`` bids and reports
+per-publish latency and the memory held per idle subscription.
+
+Then served: starts one gunicorn worker with ``gunicorn.conf.py``
+(``--worker-class``, gevent by default) on a seeded database and opens
+``--streams`` ``/auction/<id>/stream`` connections over ``--auctions``
+auctions, holding them all open.  It reports how long they took to
+connect, the worker's threads and resident memory per open stream, the
+latency of an auction page while they are held, and how long a bid
+posted over HTTP takes to reach every stream on its auction.  The run
+fails if a stream did not connect or did not receive its bid.
+
+    python -m benchmarks.event_fanout --subscribers 5000 --streams 5000
+    python -m benchmarks.event_fanout --streams 200 --worker-class sync
+"""
+import argparse
+import http.client
+import json
+import os
+import selectors
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import urllib.parse
+
+from benchmarks.common import ROOT, PASSWORD, load_app, seed_dataset
+
+
+def served_app():
+    """The app gunicorn serves for this benchmark: create_app() without CSRF or rate limits."""
+    from app import app, create_app
+    from ratelimit import rate_limiter, NullBackend
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    rate_limiter.use(NullBackend())
+    return create_app()
+
+
+def broker_fanout(args):
+    from events import Broker, LocalBackend, auction_channel
+
+    broker = Broker()
+    broker.use(LocalBackend())
+    broker.queue_size = args.events + 1
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    subscriptions = [broker.subscribe(auction_channel(i % args.auctions))
+                     for i in range(args.subscribers)]
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    payload = {'amount': 10.0, 'bidder_name': 'bench', 'bid_count': 1}
+    t0 = time.perf_counter()
+    for n in range(args.events):
+        broker.publish(auction_channel(n % args.auctions), 'bid', payload, id=n)
+    elapsed = time.perf_counter() - t0
+
+    delivered = sum(s.queue.qsize() for s in subscriptions)
+    for subscription in subscriptions:
+        subscription.close()
+    return {
+        'subscribers': args.subscribers,
+        'events': args.events,
+        'delivered': delivered,
+        'publish_us': round(elapsed / args.events * 1e6, 1),
+        'deliveries_per_sec': round(delivered / elapsed),
+        'bytes_per_subscriber': held // args.subscribers,
+        'remaining_subscribers': broker.subscriber_count(),
+    }
+
+
+def process_status(pid):
+    """``(threads, resident MB)`` of a process, from /proc."""
+    fields = {}
+    with open(f'/proc/{pid}/status') as fh:
+        for line in fh:
+            name, _, value = line.partition(':')
+            fields[name] = value.split()
+    return int(fields['Threads'][0]), int(fields['VmRSS'][0]) / 1024
+
+
+class Streams:
+    """Raw, non-blocking SSE connections read with one selector."""
+
+    def __init__(self, port):
+        self.port = port
+        self.selector = selectors.DefaultSelector()
+        self.buffers = {}
+
+    def open(self, path):
+        sock = socket.create_connection(('127.0.0.1', self.port))
+        sock.sendall(f'GET {path} HTTP/1.1\r\nHost: bench\r\nAccept: text/event-stream\r\n\r\n'.encode())
+        sock.setblocking(False)
+        self.buffers[sock] = bytearray()
+        self.selector.register(sock, selectors.EVENT_READ, path)
+        return sock
+
+    def wait_for(self, socks, marker, timeout):
+        """Read until every socket in ``socks`` has ``marker``; returns ``{sock: seconds}``."""
+        started = time.perf_counter()
+        waiting = set(socks)
+        arrived = {}
+        for sock in list(waiting):
+            if marker in self.buffers[sock]:
+                arrived[sock] = 0.0
+                waiting.discard(sock)
+        while waiting:
+            left = timeout - (time.perf_counter() - started)
+            if left <= 0:
+                break
+            for key, _ in self.selector.select(min(left, 0.5)):
+                sock = key.fileobj
+                try:
+                    chunk = sock.recv(65536)
+                except BlockingIOError:
+                    continue
+                if not chunk:
+                    self.selector.unregister(sock)
+                    waiting.discard(sock)
+                    continue
+                self.buffers[sock] += chunk
+                if sock in waiting and marker in self.buffers[sock]:
+                    arrived[sock] = time.perf_counter() - started
+                    waiting.discard(sock)
+        return arrived
+
+    def close(self):
+        for sock in self.buffers:
+            sock.close()
+        self.selector.close()
+
+
+def request(port, method, path, body=None, cookie=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    headers = {}
+    if body is not None:
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        body = urllib.parse.urlencode(body)
+    if cookie:
+        headers['Cookie'] = cookie
+    t0 = time.perf_counter()
+    conn.request(method, path, body=body, headers=headers)
+    response = conn.getresponse()
+    response.read()
+    seconds = time.perf_counter() - t0
+    conn.close()
+    return response, seconds
+
+
+def served_fanout(args, database_url, auction_ids, bidder_email, minimum_bids):
+    port = args.port
+    env = dict(os.environ, DATABASE_URL=database_url, WEB_CONCURRENCY='1',
+               GUNICORN_WORKER_CLASS=args.worker_class, GUNICORN_BIND=f'127.0.0.1:{port}',
+               GUNICORN_WORKER_CONNECTIONS=str(args.streams + 100),
+               AUCTION_CLOSER_ENABLED='false', OUTBOX_WORKER_ENABLED='false')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+         '--timeout', '300', '--graceful-timeout', '1', 'benchmarks.event_fanout:served_app()'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    streams = Streams(port)
+    report = {'worker_class': args.worker_class, 'streams': args.streams}
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                request(port, 'GET', '/login')
+                break
+            except OSError:
+                if time.monotonic() > deadline or server.poll() is not None:
+                    raise RuntimeError('gunicorn did not start')
+                time.sleep(0.2)
+        with open(f'/proc/{server.pid}/task/{server.pid}/children') as fh:
+            worker_pid = int(fh.read().split()[0])
+        threads_idle, rss_idle = process_status(worker_pid)
+
+        # Log the bidder in before the streams can hold the worker
+        response, _ = request(port, 'POST', '/login',
+                              {'email': bidder_email, 'password': PASSWORD})
+        cookie = response.getheader('Set-Cookie', '').split(';')[0]
+
+        t0 = time.perf_counter()
+        by_auction = {auction_id: [] for auction_id in auction_ids}
+        for n in range(args.streams):
+            auction_id = auction_ids[n % len(auction_ids)]
+            by_auction[auction_id].append(streams.open(f'/auction/{auction_id}/stream'))
+        every = [sock for socks in by_auction.values() for sock in socks]
+        connected = streams.wait_for(every, b'event: snapshot', args.timeout)
+        report['connected'] = len(connected)
+        report['connect_seconds'] = round(time.perf_counter() - t0, 2)
+        threads, rss = process_status(worker_pid)
+        report['worker_threads'] = {'idle': threads_idle, 'streams_open': threads}
+        report['worker_rss_mb'] = {'idle': round(rss_idle, 1), 'streams_open': round(rss, 1)}
+        report['kb_per_stream'] = round((rss - rss_idle) * 1024 / max(len(connected), 1), 1)
+
+        page_ms = []
+        for _ in range(20):
+            try:
+                _, seconds = request(port, 'GET', f'/auction/{auction_ids[0]}')
+                page_ms.append(seconds * 1000)
+            except OSError:
+                break
+        report['page_ms_p50_streams_open'] = round(statistics.median(page_ms), 2) if page_ms else None
+
+        delivered = expected = 0
+        latencies = []
+        for auction_id in auction_ids:
+            socks = [sock for sock in by_auction[auction_id] if sock in connected]
+            expected += len(socks)
+            t0 = time.perf_counter()
+            try:
+                request(port, 'POST', '/bid', {'auction_id': auction_id,
+                                               'amount': str(minimum_bids[auction_id])}, cookie)
+            except OSError:
+                # The worker is held by the streams (a sync worker)
+                break
+            arrived = streams.wait_for(socks, b'event: bid', args.timeout)
+            delivered += len(arrived)
+            if arrived:
+                latencies.append((time.perf_counter() - t0) * 1000 if len(arrived) == len(socks)
+                                 else None)
+        report['bid_fanout'] = {
+            'expected': expected,
+            'delivered': delivered,
+            'ms_to_last_stream_max': round(max(l for l in latencies if l is not None), 1)
+            if any(l is not None for l in latencies) else None,
+        }
+    finally:
+        streams.close()
+        server.terminate()
+        server.wait(timeout=30)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subscribers', type=int, default=5000)
+    parser.add_argument('--auctions', type=int, default=50)
+    parser.add_argument('--events', type=int, default=1000)
+    parser.add_argument('--streams', type=int, default=5000)
+    parser.add_argument('--worker-class', default='gevent')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--timeout', type=float, default=30.0,
+                        help='seconds to wait for streams to connect and for each bid to arrive')
+    args = parser.parse_args()
+
+    app, db = load_app()
+    report = {'broker': broker_fanout(args)}
+
+    from models import Auction, User
+    with app.app_context():
+        data = seed_dataset(db, users=50, sellers=5, auctions=max(args.auctions * 4, 200), bids=1000)
+        auction_ids = data['live_auction_ids'][:args.auctions]
+        minimum_bids = {auction.id: auction.minimum_bid for auction in
+                        db.session.execute(db.select(Auction).where(Auction.id.in_(auction_ids))).scalars()}
+        bidder_email = db.session.get(User, data['buyer_ids'][0]).email
+        database_url = str(db.engine.url)
+    report['served'] = served_fanout(args, database_url, auction_ids, bidder_email, minimum_bids)
+    print(json.dumps(report, indent=2))
+    served = report['served']
+    return 0 if (served['connected'] == args.streams
+                 and served['bid_fanout']['delivered'] == served['bid_fanout']['expected']) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,136 @@
+"""Bytes of images served for one auction list page, before and after the image store.
+
+Generates ``--images`` camera-sized JPEGs (with EXIF) and attaches them to
+the auctions on the first list page.  The list page is fetched twice, with
+every ``<img>`` it references:
+
+* ``legacy`` -- files saved as-is under ``static/uploads``, as create_auction
+  used to do;
+* ``store`` -- the same files put through :mod:`images`, which serves the
+  ``card`` WebP variant.
+
+Also reports variant render time and checks that re-uploading a file
+reuses the stored original.
+
+    python -m benchmarks.image_bytes --images 12
+"""
+import argparse
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks.common import load_app, seed_dataset
+
+IMG_SRC = re.compile(r'<img src="([^"]+)"')
+
+
+def photo(n, width=4000, height=3000):
+    """A camera-sized JPEG with photo-like texture and an EXIF block."""
+    from PIL import Image
+
+    # Coarse blotches plus fine grain, roughly the detail of a real photo
+    coarse = Image.effect_noise((width // 16, height // 16), 60 + n).resize((width, height), Image.BICUBIC)
+    grain = Image.effect_noise((width, height), 12)
+    gradient = Image.linear_gradient('L').resize((width, height)).rotate(n * 25)
+    detail = Image.blend(coarse, grain, 0.3)
+    image = Image.merge('RGB', (detail, Image.blend(detail, gradient, 0.6), gradient))
+    exif = Image.Exif()
+    exif[0x010F] = 'Benchmark Camera'
+    exif[0x0112] = 1
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=90, exif=exif)
+    return out.getvalue()
+
+
+def page_bytes(client):
+    page = client.get('/auctions')
+    if page.status_code != 200:
+        raise RuntimeError(f'/auctions returned {page.status_code}')
+    total = 0
+    sources = IMG_SRC.findall(page.get_data(as_text=True))
+    for src in sources:
+        response = client.get(src)
+        if response.status_code != 200:
+            raise RuntimeError(f'{src} returned {response.status_code}')
+        total += len(response.get_data())
+        response.close()
+    return {'html_bytes': len(page.get_data()), 'images': len(sources), 'image_bytes': total,
+            'cache_control': response.headers.get('Cache-Control') if sources else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', type=int, default=12)
+    args = parser.parse_args()
+
+    app, db = load_app()
+    from cache import cache, NullBackend
+    from models import Auction
+    import images
+
+    cache.use(NullBackend())
+    workdir = tempfile.mkdtemp(prefix='bench_images_')
+    app.static_folder = workdir
+    app.config['IMAGE_FOLDER'] = os.path.join(workdir, 'media')
+    os.makedirs(os.path.join(workdir, 'uploads'))
+    client = app.test_client()
+
+    try:
+        with app.app_context():
+            seed_dataset(db, users=50, sellers=5, auctions=200, bids=500)
+            now = datetime.now(timezone.utc)
+            # The first list page shows the live auctions ending soonest
+            ids = [a.id for a in Auction.query.filter(Auction.status == 'active',
+                                                      Auction.start_time <= now,
+                                                      Auction.end_time > now)
+                   .order_by(Auction.end_time).limit(args.images)]
+            photos = [photo(n) for n in range(len(ids))]
+
+            # Before: raw uploads served from static/uploads
+            for n, (auction_id, data) in enumerate(zip(ids, photos)):
+                name = f'legacy_{n}.jpg'
+                with open(os.path.join(workdir, 'uploads', name), 'wb') as fh:
+                    fh.write(data)
+                db.session.get(Auction, auction_id).image_filename = name
+            db.session.commit()
+            legacy = page_bytes(client)
+
+            # After: content-addressed store, variants rendered by the pool
+            t0 = time.perf_counter()
+            futures, names = [], []
+            for auction_id, data in zip(ids, photos):
+                name = images.store(io.BytesIO(data))
+                names.append(name)
+                db.session.get(Auction, auction_id).image_filename = name
+                futures.append(images.process_async(name))
+            db.session.commit()
+            stored = time.perf_counter() - t0
+            for future in futures:
+                future.result()
+            rendered = time.perf_counter() - t0
+            store = page_bytes(client)
+
+            again = images.store(io.BytesIO(photos[0]))
+            originals = sum(len(files) for _, _, files in
+                            os.walk(os.path.join(app.config['IMAGE_FOLDER'], 'originals')))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps({
+        'legacy': legacy,
+        'store': store,
+        'reduction': round(legacy['image_bytes'] / store['image_bytes'], 1) if store['image_bytes'] else None,
+        'upload_seconds': round(stored, 3),
+        'variants_ready_seconds': round(rendered, 3),
+        'reupload_deduplicated': again == names[0] and originals == len(photos),
+    }, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,301 @@
+"""Mixed-traffic load test over the real routes, saved as JSON for comparison.
+
+Seeds a dataset of ``--users``, ``--categories``, ``--auctions`` and
+``--bids`` with bulk inserts, logs ``--clients`` concurrent clients in
+(buyers, sellers and one admin) and has each of them replay a weighted mix
+of the hot routes for ``--seconds``: the home page, the auction list with
+search, category and status filters, auction detail, bidding, the three
+dashboards and closing ended auctions.  Per route it reports p50/p95/p99
+latency, throughput, errors and SQL statements per request.
+
+The report is written to ``--output`` (``benchmarks/results/`` by
+default) together with the commit, database backend and settings, so runs
+against SQLite and PostgreSQL, or before and after a change, can be put
+side by side with ``--compare``:
+
+    python -m benchmarks.load_test --clients 8 --seconds 30
+    python -m benchmarks.load_test --database-url postgresql://localhost/bench
+    python -m benchmarks.load_test --compare before.json after.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+
+from benchmarks.common import ROOT, ADJECTIVES, NOUNS, load_app, seed_dataset, login
+
+# name: (relative weight, who makes the request)
+MIX = {
+    'index': (10, 'buyer'),
+    'auction_list': (10, 'buyer'),
+    'auction_list_search': (8, 'buyer'),
+    'auction_list_category': (6, 'buyer'),
+    'auction_list_status': (3, 'buyer'),
+    'auction_detail': (20, 'buyer'),
+    'place_bid': (10, 'buyer'),
+    'buyer_dashboard': (4, 'buyer'),
+    'seller_dashboard': (3, 'seller'),
+    'admin_dashboard': (1, 'admin'),
+    'close_ended_auctions': (1, 'admin'),
+}
+
+
+class StatementTally:
+    """Count SQL statements per thread, so concurrent requests are told apart."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._local = threading.local()
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self._local.count = getattr(self._local, 'count', 0) + 1
+
+    def reset(self):
+        self._local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    rank = max(int(round(fraction * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarise(samples, seconds):
+    latencies = sorted(ms for ms, _, _ in samples)
+    statements = [n for _, n, _ in samples]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, _, ok in samples if not ok),
+        'req_per_sec': round(len(samples) / seconds, 1) if seconds else None,
+        'mean_ms': round(sum(latencies) / len(latencies), 2) if latencies else None,
+        'p50_ms': _round(percentile(latencies, 0.50)),
+        'p95_ms': _round(percentile(latencies, 0.95)),
+        'p99_ms': _round(percentile(latencies, 0.99)),
+        'max_ms': _round(latencies[-1] if latencies else None),
+        'sql_per_request': round(sum(statements) / len(statements), 2) if statements else None,
+        'sql_max': max(statements) if statements else None,
+    }
+
+
+def _round(value):
+    return None if value is None else round(value, 2)
+
+
+def git_revision():
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    try:
+        return {'commit': git('rev-parse', 'HEAD'),
+                'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'dirty': None}
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+
+    def change(old, new):
+        if not old or new is None:
+            return '     -'
+        return f'{100 * (new - old) / old:+6.1f}%'
+
+    print(f'{"route":24} {"p95 ms":>17} {"":>7}  {"req/s":>15} {"":>7}  {"sql/req":>11}')
+    names = list(before['routes']) + [n for n in after['routes'] if n not in before['routes']]
+    for name in names + ['total']:
+        old = before['totals'] if name == 'total' else before['routes'].get(name, {})
+        new = after['totals'] if name == 'total' else after['routes'].get(name, {})
+        print(f'{name:24} {old.get("p95_ms") or 0:8.2f} {new.get("p95_ms") or 0:8.2f} '
+              f'{change(old.get("p95_ms"), new.get("p95_ms"))}  '
+              f'{old.get("req_per_sec") or 0:7.1f} {new.get("req_per_sec") or 0:7.1f} '
+              f'{change(old.get("req_per_sec"), new.get("req_per_sec"))}  '
+              f'{old.get("sql_per_request") or 0:5.1f} {new.get("sql_per_request") or 0:5.1f}')
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--sellers', type=int, default=100)
+    parser.add_argument('--categories', type=int, default=12)
+    parser.add_argument('--auctions', type=int, default=20000)
+    parser.add_argument('--bids', type=int, default=200000)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=20.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--page-cache', action='store_true',
+                        help='keep the local page cache on (off by default to measure the database)')
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--output', default=None, help='where to write the JSON report')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='print the difference between two saved reports and exit')
+    args = parser.parse_args()
+
+    if args.compare:
+        return compare(*args.compare)
+
+    app, db = load_app(args.database_url)
+    from cache import cache, NullBackend
+    from models import Auction
+    from money import minimum_bid
+
+    if not args.page_cache:
+        cache.use(NullBackend())
+
+    with app.app_context():
+        t0 = time.perf_counter()
+        data = seed_dataset(db, users=args.users, sellers=args.sellers, auctions=args.auctions,
+                            bids=args.bids, categories=args.categories, seed=args.seed)
+        if db.engine.dialect.name == 'sqlite':
+            db.session.execute(db.text('ANALYZE'))
+            db.session.commit()
+        seed_seconds = time.perf_counter() - t0
+        engine = db.engine
+        backend = f'{engine.dialect.name} {".".join(map(str, engine.dialect.server_version_info or ()))}'
+
+    live_ids = data['live_auction_ids']
+    category_ids = data['category_ids']
+    names = list(MIX)
+    weights = [MIX[name][0] for name in names]
+
+    def request_for(name, rng):
+        """Method, URL and form data for one request to ``name``."""
+        if name == 'index':
+            return 'GET', '/', None
+        if name == 'auction_list':
+            return 'GET', f'/auctions?page={rng.randint(1, 5)}', None
+        if name == 'auction_list_search':
+            return 'GET', f'/auctions?search={rng.choice(ADJECTIVES)}+{rng.choice(NOUNS)}', None
+        if name == 'auction_list_category':
+            return 'GET', f'/auctions?category={rng.choice(category_ids)}', None
+        if name == 'auction_list_status':
+            return 'GET', f'/auctions?status={rng.choice(["active", "ended"])}', None
+        if name == 'auction_detail':
+            return 'GET', f'/auction/{rng.choice(live_ids)}', None
+        if name == 'place_bid':
+            # Looked up outside the timed request, like a bidder reading the page
+            auction_id = rng.choice(live_ids)
+            with app.app_context():
+                row = db.session.execute(
+                    db.select(Auction.starting_bid, Auction.highest_bid_amount)
+                    .where(Auction.id == auction_id)
+                ).one()
+            amount = minimum_bid(row.starting_bid, row.highest_bid_amount) + rng.randint(0, 3)
+            return 'POST', '/bid', {'auction_id': auction_id, 'amount': str(amount)}
+        if name == 'buyer_dashboard':
+            return 'GET', '/dashboard/buyer', None
+        if name == 'seller_dashboard':
+            return 'GET', '/dashboard/seller', None
+        if name == 'admin_dashboard':
+            return 'GET', '/dashboard/admin', None
+        if name == 'close_ended_auctions':
+            return 'GET', '/admin/close_ended_auctions', None
+        raise ValueError(name)
+
+    samples = {name: [] for name in names}
+    lock = threading.Lock()
+    ready = threading.Barrier(args.clients + 1)
+    go = threading.Event()
+    tally = StatementTally(engine)
+
+    def client_loop(n):
+        rng = random.Random(args.seed * 1000 + n)
+        sessions = {'buyer': app.test_client(), 'seller': app.test_client(),
+                    'admin': app.test_client()}
+        login(sessions['buyer'], f'bench{data["buyer_ids"][n % len(data["buyer_ids"])]}@bench.example.com')
+        login(sessions['seller'], f'bench{data["seller_ids"][n % len(data["seller_ids"])]}@bench.example.com')
+        login(sessions['admin'], 'admin@auction.com', 'admin123')
+        mine = {name: [] for name in names}
+        ready.wait()
+        go.wait()
+        # No app context around the loop: each request must get its own session
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            method, url, form = request_for(name, rng)
+            tally.reset()
+            t0 = time.perf_counter()
+            try:
+                response = sessions[MIX[name][1]].open(url, method=method, data=form)
+                ok = response.status_code < 500
+            except Exception:
+                ok = False
+            mine[name].append((1000 * (time.perf_counter() - t0), tally.count, ok))
+        with lock:
+            for name, entries in mine.items():
+                samples[name].extend(entries)
+
+    threads = [threading.Thread(target=client_loop, args=(i,)) for i in range(args.clients)]
+    for t in threads:
+        t.start()
+    ready.wait()
+    with tally:
+        started = time.perf_counter()
+        deadline = started + args.seconds
+        go.set()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+    report = {
+        'meta': {
+            **git_revision(),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'database': backend,
+            'python': platform.python_version(),
+            'page_cache': args.page_cache,
+            'settings': {key: value for key, value in vars(args).items()
+                         if key not in ('database_url', 'output', 'compare')},
+        },
+        'dataset': {'users': args.users, 'sellers': args.sellers, 'categories': len(category_ids),
+                    'auctions': args.auctions, 'bids': args.bids, 'live_auctions': len(live_ids),
+                    'seed_seconds': round(seed_seconds, 1)},
+        'totals': summarise([s for entries in samples.values() for s in entries], elapsed),
+        'routes': {name: summarise(entries, elapsed) for name, entries in samples.items()},
+    }
+
+    output = args.output
+    if output is None:
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        commit = (report['meta']['commit'] or 'unknown')[:10]
+        output = os.path.join(ROOT, 'benchmarks', 'results',
+                              f'load_{engine.dialect.name}_{commit}_{stamp}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f'{"route":24} {"reqs":>6} {"err":>4} {"req/s":>7} {"p50":>7} {"p95":>7} {"p99":>7} {"sql/req":>7}')
+    for name, entry in list(report['routes'].items()) + [('total', report['totals'])]:
+        if not entry['requests']:
+            continue
+        print(f'{name:24} {entry["requests"]:6d} {entry["errors"]:4d} {entry["req_per_sec"]:7.1f} '
+              f'{entry["p50_ms"]:7.2f} {entry["p95_ms"]:7.2f} {entry["p99_ms"]:7.2f} '
+              f'{entry["sql_per_request"]:7.2f}')
+    print(f'report written to {output}')
+    return 1 if report['totals']['errors'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
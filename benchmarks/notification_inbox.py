@@ -0,0 +1,130 @@
+"""Notification inbox at scale: badge cost, paging, read-marking and retention.
+
+Gives one buyer ``--notifications`` notifications spread over a year
+(``--unread`` of them unread) and reports:
+
+* the navbar badge: the ``COUNT`` it would otherwise run, against the
+  counter read on an identity-cache miss (and the statements on a hit);
+* the inbox's first page and page ``--pages``, all and unread only;
+* marking one page read, then everything read, with one request each;
+* purging read notifications older than ``--retention-days``;
+
+and checks the counter against a real count at the end.
+
+    python -m benchmarks.notification_inbox --notifications 100000
+"""
+import argparse
+import json
+import re
+import time
+
+from benchmarks.common import load_app, seed_dataset, seed_notifications, QueryCounter, login
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notifications', type=int, default=100000)
+    parser.add_argument('--unread', type=float, default=0.5)
+    parser.add_argument('--pages', type=int, default=50, help='how deep the deep page is')
+    parser.add_argument('--retention-days', type=int, default=90)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    app, db = load_app(args.database_url)
+    import inbox
+    from identity import identity_cache
+    from models import Notification
+
+    with app.app_context():
+        data = seed_dataset(db, users=50, sellers=5, auctions=500, bids=5000)
+        user_id = data['buyer_ids'][0]
+        unread = seed_notifications(db, user_id, args.notifications, args.unread)
+        if db.engine.dialect.name == 'sqlite':
+            db.session.execute(db.text('ANALYZE'))
+            db.session.commit()
+        engine = db.engine
+
+    def timed(action, repeat=1):
+        counter = QueryCounter(engine)
+        t0 = time.perf_counter()
+        with counter:
+            for _ in range(repeat):
+                result = action()
+        return result, round(1000 * (time.perf_counter() - t0) / repeat, 3), counter.count // repeat
+
+    def unread_count():
+        with app.app_context():
+            return db.session.execute(
+                db.select(db.func.count()).select_from(Notification)
+                .where(Notification.user_id == user_id, Notification.is_read == db.false())
+            ).scalar()
+
+    def badge_miss():
+        with app.app_context():
+            identity_cache.invalidate(user_id)
+            return identity_cache.load(user_id).unread_notifications
+
+    def badge_hit():
+        with app.app_context():
+            return identity_cache.load(user_id).unread_notifications
+
+    report = {'notifications': args.notifications, 'unread': unread}
+    count, count_ms, count_sql = timed(unread_count, args.repeat)
+    badge, miss_ms, miss_sql = timed(badge_miss, args.repeat)
+    badge_hit()
+    _, hit_ms, hit_sql = timed(badge_hit, args.repeat)
+    report['badge'] = {'count_query_ms': count_ms, 'count_query_sql': count_sql,
+                       'counter_miss_ms': miss_ms, 'counter_miss_sql': miss_sql,
+                       'counter_hit_ms': hit_ms, 'counter_hit_sql': hit_sql,
+                       'matches': badge == count}
+
+    client = app.test_client()
+    login(client, f'bench{user_id}@bench.example.com')
+
+    def get(url):
+        return lambda: client.get(url).get_data(as_text=True)
+
+    def deep(url):
+        """Follow ``--pages`` next-page links and time the last one."""
+        for _ in range(args.pages):
+            match = re.search(r'href="([^"]*after=[^"]*)"', client.get(url).get_data(as_text=True))
+            if not match:
+                break
+            url = match.group(1).replace('&amp;', '&')
+        return timed(get(url))
+
+    report['inbox'] = {}
+    for name, url in (('all', '/notifications'), ('unread', '/notifications?filter=unread')):
+        html, first_ms, first_sql = timed(get(url))
+        _, deep_ms, deep_sql = deep(url)
+        report['inbox'][name] = {'first_ms': first_ms, 'first_sql': first_sql,
+                                 f'page_{args.pages}_ms': deep_ms, f'page_{args.pages}_sql': deep_sql}
+
+    html = client.get('/notifications?filter=unread').get_data(as_text=True)
+    ids = re.findall(r'name="notification_ids" value="(\d+)"', html)
+    _, page_ms, page_sql = timed(lambda: client.post('/notifications/read',
+                                                     data={'notification_ids': ids}))
+    _, all_ms, all_sql = timed(lambda: client.post('/notifications/read', data={'all': '1'}))
+    report['mark_read'] = {'page': {'rows': len(ids), 'ms': page_ms, 'sql': page_sql},
+                           'all': {'rows': unread - len(ids), 'ms': all_ms, 'sql': all_sql}}
+
+    with app.app_context():
+        deleted, purge_ms, purge_sql = timed(lambda: inbox.purge(args.retention_days, args.batch_size))
+        left = db.session.execute(
+            db.select(db.func.count()).select_from(Notification)
+            .where(Notification.user_id == user_id)
+        ).scalar()
+    report['purge'] = {'deleted': deleted, 'left': left, 'seconds': round(purge_ms / 1000, 2),
+                       'batches': purge_sql, 'rows_per_s': round(deleted / (purge_ms / 1000))
+                       if purge_ms else None}
+
+    final = badge_miss()
+    report['counter_consistent'] = final == unread_count() == 0
+    print(json.dumps(report, indent=2))
+    return 0 if report['counter_consistent'] and report['badge']['matches'] else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,113 @@
+"""Drain a burst of outbox events through notifications and email.
+
+Queues ``--bids`` "new bid" events spread over ``--auctions`` auctions
+(the closing-minute pattern), drains them into coalesced notifications and
+sends the resulting mail to a local :class:`SMTPSink`.  Reports events per
+second, the coalescing ratio and how many SMTP connections were opened.
+
+Then it starts the app as a web server would (``create_app()``) with the
+default configuration, has a second maximum bid beat a first, and times
+how long the outbid bidder waits for the notification.  The run fails if
+it has not arrived within ``--deliver-timeout`` seconds.
+
+    python -m benchmarks.outbox_drain --bids 20000 --auctions 200
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from benchmarks.common import load_app
+from benchmarks.smtp_sink import SMTPSink
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bids', type=int, default=20000)
+    parser.add_argument('--auctions', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--fail-every', type=int, default=0,
+                        help='make the SMTP sink reject every Nth message')
+    parser.add_argument('--deliver-timeout', type=float, default=10.0)
+    args = parser.parse_args()
+
+    sink = SMTPSink(fail_every=args.fail_every).start()
+    app, db = load_app()
+    app.config.update(MAIL_ENABLED=True, MAIL_SERVER='127.0.0.1', MAIL_PORT=sink.port,
+                      MAIL_USE_TLS=False, MAIL_DEFAULT_SENDER='noreply@example.com',
+                      MAIL_SUPPRESS_SEND=False)
+    from app import mail
+    mail.init_app(app)
+    from models import Auction, User, Notification
+    import bidding
+    import outbox
+
+    with app.app_context():
+        sellers = [User(username=f'seller{i}', email=f'seller{i}@example.com',
+                        password_hash='x', role='seller') for i in range(args.auctions)]
+        db.session.add_all(sellers)
+        db.session.flush()
+        seller_id = sellers[0].id
+        t0 = time.perf_counter()
+        for n in range(args.bids):
+            seller = sellers[n % args.auctions]
+            outbox.enqueue(seller.id, f'New bid of ${n:.2f} on your auction "Lot {seller.id}"',
+                           subject='New bid on your auction', coalesce_key=f'bids:{seller.id}',
+                           summary=f'{{count}} new bids on your auction "Lot {seller.id}"')
+        db.session.commit()
+        enqueue_seconds = time.perf_counter() - t0
+
+        # Skip the coalescing window instead of sleeping through it
+        later = datetime.now(timezone.utc) + timedelta(
+            seconds=app.config['OUTBOX_COALESCE_SECONDS'] + 1)
+        t0 = time.perf_counter()
+        totals = outbox.drain(args.batch_size, now=later)
+        drain_seconds = time.perf_counter() - t0
+        notifications = Notification.query.count()
+
+    # A default deploy: create_app() starts the in-process outbox worker
+    from app import create_app
+    create_app()
+    with app.app_context():
+        first, second = (User(username=f'bidder{i}', email=f'bidder{i}@example.com',
+                              password_hash='x') for i in range(2))
+        now = datetime.now(timezone.utc)
+        auction = Auction(title='Outbid check', description='x' * 20, starting_bid=Decimal('10'),
+                          start_time=now - timedelta(minutes=1), end_time=now + timedelta(hours=1),
+                          status='active', seller_id=seller_id)
+        db.session.add_all([first, second, auction])
+        db.session.commit()
+        auction_id, first_id, second_id = auction.id, first.id, second.id
+        bidding.set_max_bid(auction_id, first_id, '50')
+        bidding.set_max_bid(auction_id, second_id, '100')
+        t0 = time.perf_counter()
+        delivered = None
+        while time.perf_counter() - t0 < args.deliver_timeout:
+            if db.session.execute(db.select(Notification.id).where(
+                    Notification.user_id == first_id,
+                    Notification.message.contains('has been beaten'))).first():
+                delivered = time.perf_counter() - t0
+                break
+            db.session.rollback()
+            time.sleep(0.05)
+    outbox.outbox_worker.stop()
+
+    print(json.dumps({
+        'events': args.bids,
+        'enqueue_us_per_event': round(enqueue_seconds / args.bids * 1e6, 1),
+        'drain_seconds': round(drain_seconds, 3),
+        'events_per_sec': round(totals['events'] / drain_seconds, 1),
+        'notifications': notifications,
+        'coalescing_ratio': round(args.bids / notifications, 1) if notifications else None,
+        'emails_sent': totals['emails_sent'],
+        'emails_failed': totals['emails_failed'],
+        'smtp_messages': len(sink.messages),
+        'smtp_connections': sink.connections,
+        'outbid_notification_s': round(delivered, 2) if delivered is not None else None,
+    }, indent=2))
+    return 0 if delivered is not None else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,93 @@
+"""Requests per second on ``/`` and ``/auctions`` with and without the page cache.
+
+Seeds a dataset, then replays the same mix of anonymous browse requests
+(home page plus list pages over a few pages, categories and searches) for
+``--seconds`` against the ``null`` backend and then the ``local`` backend.
+With ``--bid-every N`` a real bid is placed every N requests so the cached
+run also pays for invalidations.
+
+    python -m benchmarks.page_cache --auctions 20000 --seconds 5 --bid-every 50
+"""
+import argparse
+import json
+import random
+import time
+
+from benchmarks.common import load_app, seed_dataset
+
+
+def run(app, db, cache, backend, urls, seconds, bid_every, live_ids, buyer_ids):
+    import bidding
+    from models import Auction
+
+    cache.use(backend)
+    client = app.test_client()
+    rng = random.Random(1)
+    per_route = {}
+    requests = bids = 0
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+        url = urls[requests % len(urls)]
+        t0 = time.perf_counter()
+        response = client.get(url)
+        elapsed = time.perf_counter() - t0
+        if response.status_code != 200:
+            raise RuntimeError(f'{url} returned {response.status_code}')
+        route = url.split('?')[0]
+        stats = per_route.setdefault(route, [0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+        requests += 1
+        if bid_every and requests % bid_every == 0:
+            with app.app_context():
+                auction_id = rng.choice(live_ids)
+                amount = (db.session.get(Auction, auction_id).current_bid or 0) + 100
+                if bidding.place_bid(auction_id, rng.choice(buyer_ids), amount).accepted:
+                    bids += 1
+    total = time.perf_counter() - started
+    return {
+        'requests': requests,
+        'req_per_sec': round(requests / total, 1),
+        'bids': bids,
+        'routes': {route: {'requests': n, 'mean_ms': round(1000 * t / n, 2)}
+                   for route, (n, t) in per_route.items()},
+        'cache': cache.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--auctions', type=int, default=20000)
+    parser.add_argument('--bids', type=int, default=100000)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--bid-every', type=int, default=0)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    app, db = load_app(args.database_url)
+    from cache import cache, LocalBackend, NullBackend
+    from models import Category
+
+    with app.app_context():
+        data = seed_dataset(db, users=1000, sellers=50, auctions=args.auctions, bids=args.bids)
+        category_ids = [c.id for c in Category.query.all()]
+
+    urls = ['/', '/auctions']
+    urls += [f'/auctions?page={p}' for p in range(2, 6)]
+    urls += [f'/auctions?category={c}' for c in category_ids[:3]]
+    urls += ['/auctions?status=ended', '/auctions?search=vintage']
+
+    results = {
+        'uncached': run(app, db, cache, NullBackend(), urls, args.seconds, args.bid_every,
+                        data['live_auction_ids'], data['buyer_ids']),
+        'cached': run(app, db, cache, LocalBackend(app.config['CACHE_MAX_ENTRIES']), urls,
+                      args.seconds, args.bid_every, data['live_auction_ids'], data['buyer_ids']),
+    }
+    results['speedup'] = round(results['cached']['req_per_sec'] / results['uncached']['req_per_sec'], 2)
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,126 @@
+"""Compare a manual bidding war with proxy bidding on the same auctions.
+
+Every auction gets ``--bidders`` bidders with a private valuation.  In the
+manual run a random bidder who is not winning and can still afford the
+minimum bid submits it, again and again, until nobody can; that is the
+closing-minute request storm.  In the proxy run each bidder sets their
+valuation once with :func:`bidding.set_max_bid` and the engine settles the
+rest.  Reports bid requests and ``Bid`` rows for both runs and how many
+auctions ended with the same winner (they can differ when the top two
+valuations are within one increment: a proxy bids its whole maximum,
+a manual bidder cannot).
+
+    python -m benchmarks.proxy_bidding --auctions 100 --bidders 8
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import load_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--auctions', type=int, default=100)
+    parser.add_argument('--bidders', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    app, db = load_app(args.database_url)
+    from models import User, Auction, Bid
+    from money import minimum_bid, to_decimal
+    import bidding
+
+    rng = random.Random(args.seed)
+    with app.app_context():
+        seller = User(username='bench_seller', email='seller@bench.example.com',
+                      password_hash='x', role='seller')
+        bidders = [User(username=f'bench_bidder{i}', email=f'bidder{i}@bench.example.com',
+                        password_hash='x') for i in range(args.bidders)]
+        db.session.add_all([seller] + bidders)
+        db.session.commit()
+        seller_id = seller.id
+        bidder_ids = [b.id for b in bidders]
+
+        # Distinct valuations per auction so the winner is well defined
+        plans = []
+        for _ in range(args.auctions):
+            starting = to_decimal(rng.uniform(1, 50))
+            values = rng.sample(range(int(starting * 100) + 100, int(starting * 100) + 50000),
+                                args.bidders)
+            plans.append((starting, {b: to_decimal(v / 100) for b, v in zip(bidder_ids, values)}))
+
+    def create(starting):
+        now = datetime.now(timezone.utc)
+        auction = Auction(title='Proxy benchmark lot', description='Proxy bidding benchmark auction',
+                          starting_bid=starting, start_time=now - timedelta(minutes=1),
+                          end_time=now + timedelta(hours=1), status='active', seller_id=seller_id)
+        db.session.add(auction)
+        db.session.commit()
+        return auction.id
+
+    def outcome(auction_id):
+        winner = db.session.execute(
+            db.select(Auction.highest_bidder_id).where(Auction.id == auction_id)
+        ).scalar_one()
+        rows = db.session.query(db.func.count(Bid.id)).filter(Bid.auction_id == auction_id).scalar()
+        return winner, rows
+
+    def manual(starting, values):
+        auction_id = create(starting)
+        requests = 0
+        while True:
+            row = db.session.execute(
+                db.select(Auction.starting_bid, Auction.highest_bid_amount,
+                          Auction.highest_bidder_id).where(Auction.id == auction_id)
+            ).one()
+            db.session.rollback()
+            price = minimum_bid(row.starting_bid, row.highest_bid_amount)
+            eager = [b for b, v in values.items() if b != row.highest_bidder_id and v >= price]
+            if not eager:
+                return auction_id, requests
+            bidding.place_bid(auction_id, rng.choice(eager), price)
+            requests += 1
+
+    def proxy(starting, values):
+        auction_id = create(starting)
+        order = list(values)
+        rng.shuffle(order)
+        for bidder_id in order:
+            bidding.set_max_bid(auction_id, bidder_id, values[bidder_id])
+        return auction_id, len(order)
+
+    report = {'auctions': args.auctions, 'bidders_per_auction': args.bidders}
+    winners = {}
+    with app.app_context():
+        for name, run in (('manual', manual), ('proxy', proxy)):
+            requests = rows = 0
+            t0 = time.perf_counter()
+            for n, (starting, values) in enumerate(plans):
+                auction_id, sent = run(starting, values)
+                winner, written = outcome(auction_id)
+                winners.setdefault(n, []).append(winner)
+                requests += sent
+                rows += written
+            elapsed = time.perf_counter() - t0
+            report[name] = {
+                'bid_requests': requests,
+                'bid_rows': rows,
+                'requests_per_auction': round(requests / args.auctions, 1),
+                'seconds': round(elapsed, 3),
+            }
+
+    report['request_reduction'] = round(
+        report['manual']['bid_requests'] / max(report['proxy']['bid_requests'], 1), 1)
+    report['row_reduction'] = round(
+        report['manual']['bid_rows'] / max(report['proxy']['bid_rows'], 1), 1)
+    report['same_winner'] = sum(1 for pair in winners.values() if pair[0] == pair[1])
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
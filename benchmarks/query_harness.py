@@ -0,0 +1,192 @@
+"""Query-count and query-plan regression harness for the hot routes.
+
+Seeds a large fixture (100k auctions / 1M bids by default), requests each
+hot route once to warm up and once under a :class:`QueryCounter`, and then
+asks the database to EXPLAIN every captured SELECT.  The run fails when a
+route issues more statements than its budget or when a plan full-scans one
+of the large tables.
+
+    python -m benchmarks.query_harness
+    python -m benchmarks.query_harness --auctions 5000 --bids 50000
+"""
+import argparse
+import json
+import re
+import sys
+import time
+
+from sqlalchemy import text
+
+from benchmarks.common import load_app, seed_dataset, seed_notifications, QueryCounter, login
+
+# Maximum SQL statements per request; the session user comes from the
+# identity cache and categories from the catalog, both warmed by the first request
+QUERY_BUDGETS = {
+    'index': 1,
+    'auction_list': 2,
+    'auction_list_category': 2,
+    'auction_list_search': 2,
+    'auction_detail': 2,
+    'auction_bids': 2,
+    'auction_detail_archived': 2,
+    'auction_bids_archived': 2,
+    'buyer_dashboard': 3,
+    'seller_dashboard': 2,
+    'admin_dashboard': 1,
+    'admin_auctions': 1,
+    'manage_users': 1,
+    'manage_users_filtered': 1,
+    'notifications': 1,
+    'notifications_unread': 1,
+    'place_bid': 7,
+}
+
+# Tables that grow with traffic and must never be scanned end to end
+LARGE_TABLES = ('auction', 'bid', 'bid_archive', 'bid_position', 'notification', 'user', 'user_stats')
+
+SQLITE_FULL_SCAN = re.compile(r'\bSCAN (\w+)(?! USING (?:COVERING )?INDEX)')
+POSTGRES_FULL_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def explain(db, statement, parameters):
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        rows = db.session.connection().exec_driver_sql(
+            f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+        plan = '\n'.join(row[-1] for row in rows)
+        scans = SQLITE_FULL_SCAN.findall(plan)
+    else:
+        rows = db.session.connection().exec_driver_sql(
+            f'EXPLAIN {statement}', parameters).fetchall()
+        plan = '\n'.join(row[0] for row in rows)
+        scans = POSTGRES_FULL_SCAN.findall(plan)
+    db.session.rollback()
+    # ORM joins alias tables as user_1, auction_1, ...
+    tables = (re.sub(r'_\d+$', '', table.strip('"')) for table in scans)
+    return plan, [table for table in tables if table in LARGE_TABLES]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--auctions', type=int, default=100000)
+    parser.add_argument('--bids', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--notifications', type=int, default=100000,
+                        help="notifications in the first buyer's inbox")
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--json', action='store_true', help='print the full report as JSON')
+    args = parser.parse_args()
+
+    app, db = load_app(args.database_url)
+    import archive
+    from models import Auction, BidArchiveSummary
+    from cache import cache, NullBackend
+
+    # Measure the queries behind each page, not the page cache
+    cache.use(NullBackend())
+
+    with app.app_context():
+        t0 = time.perf_counter()
+        fixture = seed_dataset(db, users=args.users, sellers=max(args.users // 50, 1),
+                               auctions=args.auctions, bids=args.bids)
+        seed_notifications(db, fixture['buyer_ids'][0], args.notifications)
+        # Finished auctions' bids go to the archive, as the closer would
+        archive.archive_due(after_hours=0)
+        if db.engine.dialect.name == 'sqlite':
+            db.session.execute(text('ANALYZE'))
+            db.session.commit()
+        seed_seconds = time.perf_counter() - t0
+        engine = db.engine
+        live_id = fixture['live_auction_ids'][0]
+        live = db.session.get(Auction, live_id)
+        next_amount = live.minimum_bid
+        bid_state = (live.bid_count, live.highest_bid_amount)
+        category_id = live.category_id
+        archived_id = db.session.execute(
+            db.select(BidArchiveSummary.auction_id).limit(1)
+        ).scalar()
+
+    seller_email = f'bench{fixture["seller_ids"][0]}@bench.example.com'
+    buyer_email = f'bench{fixture["buyer_ids"][0]}@bench.example.com'
+    routes = [
+        ('index', None, 'GET', '/', None),
+        ('auction_list', None, 'GET', '/auctions', None),
+        ('auction_list_category', None, 'GET', f'/auctions?category={category_id}', None),
+        ('auction_list_search', None, 'GET', '/auctions?search=vintage+cam', None),
+        ('auction_detail', None, 'GET', f'/auction/{live_id}', None),
+        ('auction_bids', None, 'GET', f'/auction/{live_id}/bids', None),
+        ('auction_detail_archived', None, 'GET', f'/auction/{archived_id}', None),
+        ('auction_bids_archived', None, 'GET', f'/auction/{archived_id}/bids', None),
+        ('buyer_dashboard', buyer_email, 'GET', '/dashboard/buyer', None),
+        ('seller_dashboard', seller_email, 'GET', '/dashboard/seller', None),
+        ('admin_dashboard', ('admin@auction.com', 'admin123'), 'GET', '/dashboard/admin', None),
+        ('admin_auctions', ('admin@auction.com', 'admin123'), 'GET', '/admin/auctions?status=all', None),
+        ('manage_users', ('admin@auction.com', 'admin123'), 'GET', '/admin/users', None),
+        ('manage_users_filtered', ('admin@auction.com', 'admin123'), 'GET',
+         '/admin/users?role=seller&q=bench1', None),
+        ('notifications', buyer_email, 'GET', '/notifications', None),
+        ('notifications_unread', buyer_email, 'GET', '/notifications?filter=unread', None),
+        ('place_bid', buyer_email, 'POST', '/bid',
+         {'auction_id': live_id, 'amount': str(next_amount)}),
+    ]
+
+    client = app.test_client()
+    report = {'seed_seconds': round(seed_seconds, 1), 'routes': {}}
+    failures = []
+    current_login = None
+    for name, who, method, url, data in routes:
+        if who != current_login:
+            if who is None:
+                client.get('/logout')
+            elif isinstance(who, tuple):
+                login(client, *who)
+            else:
+                login(client, who)
+            current_login = who
+        if method == 'GET':
+            client.get(url)
+        counter = QueryCounter(engine)
+        with counter:
+            response = client.open(url, method=method, data=data)
+
+        with app.app_context():
+            plans = []
+            scanned = set()
+            for statement, parameters in counter.statements:
+                if not statement.lstrip().upper().startswith('SELECT'):
+                    continue
+                plan, scans = explain(db, statement, parameters)
+                scanned.update(scans)
+                plans.append({'sql': statement, 'plan': plan})
+
+        budget = QUERY_BUDGETS[name]
+        entry = {'status': response.status_code, 'queries': counter.count,
+                 'budget': budget, 'full_scans': sorted(scanned), 'plans': plans}
+        report['routes'][name] = entry
+        if counter.count > budget:
+            failures.append(f'{name}: {counter.count} queries (budget {budget})')
+        if scanned:
+            failures.append(f'{name}: full scan of {", ".join(sorted(scanned))}')
+        if response.status_code >= 400:
+            failures.append(f'{name}: HTTP {response.status_code}')
+
+    # A rejected bid would only measure the redirect back to the form
+    with app.app_context():
+        live = db.session.get(Auction, live_id)
+        if (live.bid_count, live.highest_bid_amount) == bid_state:
+            failures.append(f'place_bid: bid of {next_amount} was not accepted')
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f'seeded in {report["seed_seconds"]}s')
+        for name, entry in report['routes'].items():
+            print(f'{name:24} {entry["queries"]:3d}/{entry["budget"]:<3d} queries'
+                  f'  scans: {", ".join(entry["full_scans"]) or "-"}')
+    for failure in failures:
+        print(f'FAIL {failure}', file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,141 @@
+"""Cost of the rate limiter on allowed bids, and what a scripted bidder gets.
+
+Reports:
+
+* one limiter check of the three bid rules, in microseconds, outside any
+  view (limits too high to trip);
+* ``--bids`` allowed ``POST /bid`` requests, ms and SQL per request, with
+  the limiter off and on;
+* a scripted bidder firing ``--flood`` bids at one auction as fast as it
+  can, with the limiter off and on: requests that reached the bid path,
+  requests refused with 429, and SQL statements run for each kind;
+* ``--flood`` failed logins from one address;
+* ``--flood`` anonymous bids at one auction, each from its own address,
+  followed by one bid from a signed-in bidder.
+
+The run fails if a refused request ran any SQL, or if the anonymous
+flood got the signed-in bidder refused.
+
+    python -m benchmarks.rate_limit --flood 1000
+"""
+import argparse
+import json
+import time
+
+from benchmarks.common import load_app, seed_dataset, QueryCounter, login
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bids', type=int, default=500)
+    parser.add_argument('--flood', type=int, default=1000)
+    parser.add_argument('--checks', type=int, default=100000)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    app, db = load_app(args.database_url)
+    from cache import cache, NullBackend as NullCache
+    from models import Auction
+    from ratelimit import rate_limiter, parse_limit, LocalBackend, NullBackend
+
+    cache.use(NullCache())
+    configured = dict(rate_limiter.limits)
+    unlimited = {rule: parse_limit(f'{10 ** 9}/1') for rule in configured}
+    with app.app_context():
+        data = seed_dataset(db, users=200, sellers=10, auctions=200, bids=1000)
+        auction_ids = db.session.execute(
+            db.select(Auction.id).where(Auction.status == 'active').order_by(Auction.id)
+        ).scalars().all()
+        engine = db.engine
+
+    rules = ('bid_user', 'bid_ip', 'bid_auction')
+    rate_limiter.use(LocalBackend())
+    rate_limiter.limits = unlimited
+    with app.test_request_context('/bid', method='POST', data={'auction_id': str(auction_ids[0])}):
+        from flask import session
+        session['_user_id'] = str(data['buyer_ids'][0])
+        rate_limiter.check(rules)
+        t0 = time.perf_counter()
+        for _ in range(args.checks):
+            rate_limiter.check(rules)
+        check_us = 1e6 * (time.perf_counter() - t0) / args.checks
+    report = {'check_us': round(check_us, 2)}
+
+    client = app.test_client()
+    login(client, f'bench{data["buyer_ids"][0]}@bench.example.com')
+
+    def post_bids(count, auction_id=None):
+        """POST ``count`` bids; returns {status: [requests, statements, seconds]}."""
+        results = {}
+        counter = QueryCounter(engine)
+        with counter:
+            for i in range(count):
+                before = counter.count
+                t0 = time.perf_counter()
+                response = client.post('/bid', data={
+                    'auction_id': auction_id or auction_ids[i % len(auction_ids)], 'amount': '1'})
+                seconds = time.perf_counter() - t0
+                totals = results.setdefault(response.status_code, [0, 0, 0.0])
+                totals[0] += 1
+                totals[1] += counter.count - before
+                totals[2] += seconds
+                # Redirects are not followed, so drop the flash before the cookie grows
+                with client.session_transaction() as session:
+                    session.pop('_flashes', None)
+        return results
+
+    report['allowed_bids'] = {}
+    for name, backend in (('limiter_off', NullBackend()), ('limiter_on', LocalBackend())):
+        rate_limiter.use(backend)
+        post_bids(20)
+        results = post_bids(args.bids)
+        report['allowed_bids'][name] = {
+            'ms': round(1000 * sum(r[2] for r in results.values()) / args.bids, 3),
+            'sql': round(sum(r[1] for r in results.values()) / args.bids, 2)}
+
+    rate_limiter.limits = configured
+    report['flood'] = {}
+    for name, backend in (('limiter_off', NullBackend()), ('limiter_on', LocalBackend())):
+        rate_limiter.use(backend)
+        results = post_bids(args.flood, auction_ids[0])
+        passed = [r for status, r in results.items() if status != 429]
+        refused = results.get(429, [0, 0, 0.0])
+        report['flood'][name] = {
+            'seconds': round(sum(r[2] for r in results.values()), 3),
+            'reached_bid_path': sum(r[0] for r in passed),
+            'sql_reached': sum(r[1] for r in passed),
+            'refused_429': refused[0],
+            'sql_refused': refused[1],
+            'ms_per_429': round(1000 * refused[2] / refused[0], 3) if refused[0] else None,
+        }
+    flood_stats = rate_limiter.stats()
+
+    rate_limiter.use(LocalBackend())
+    anonymous = app.test_client()
+    counter = QueryCounter(engine)
+    with counter:
+        statuses = [anonymous.post('/login', data={'email': 'nobody@bench.example.com',
+                                                   'password': 'wrong'}).status_code
+                    for _ in range(args.flood)]
+    report['login_flood'] = {'attempts': args.flood, 'refused_429': statuses.count(429),
+                             'sql': counter.count}
+    report['counters'] = {'flood': flood_stats['throttled'],
+                          'login': rate_limiter.stats()['throttled']}
+
+    # Anonymous posts must not use up the auction's bucket for real bidders
+    rate_limiter.use(LocalBackend())
+    target = auction_ids[1]
+    statuses = [anonymous.post('/bid', data={'auction_id': target, 'amount': '1'},
+                               environ_base={'REMOTE_ADDR': f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}'}
+                               ).status_code
+                for i in range(args.flood)]
+    bidder_status = client.post('/bid', data={'auction_id': target, 'amount': '1'}).status_code
+    report['anonymous_flood'] = {'requests': args.flood, 'refused_429': statuses.count(429),
+                                 'bidder_status': bidder_status}
+    print(json.dumps(report, indent=2))
+    return 0 if (report['flood']['limiter_on']['sql_refused'] == 0
+                 and bidder_status != 429) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
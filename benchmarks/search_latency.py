@@ -0,0 +1,86 @@
+"""Compare auction search through the full-text index with the old ``LIKE`` scan.
+
+Seeds ``--auctions`` auctions (500k by default) and runs each search term
+the way ``/auctions`` does -- live auctions only, one page of 12 plus the
+total count -- first with ``LIKE '%term%'`` over title and description,
+then through :func:`search.apply`.  Reports mean and p95 latency per term.
+
+    python -m benchmarks.search_latency --auctions 500000 --repeat 5
+"""
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import or_
+
+from benchmarks.common import load_app, seed_dataset, MAKERS
+
+# From very common to absent; MAKERS gets rarer with the index
+TERMS = ['vintage', 'cam', MAKERS[0], f'{MAKERS[10]} guitar', MAKERS[500][:5],
+         f'rare {MAKERS[2000]}', MAKERS[4500], 'zzzz']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--auctions', type=int, default=500000)
+    parser.add_argument('--bids', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    app, db = load_app(args.database_url)
+    from models import Auction
+    import search
+
+    def live():
+        now = datetime.now(timezone.utc)
+        return Auction.query.filter(Auction.status == 'active',
+                                    Auction.start_time <= now, Auction.end_time > now)
+
+    def like(term):
+        return live().filter(or_(Auction.title.contains(term),
+                                 Auction.description.contains(term))
+                             ).order_by(Auction.end_time.asc())
+
+    def indexed(term):
+        return search.apply(live(), term)
+
+    with app.app_context():
+        t0 = time.perf_counter()
+        seed_dataset(db, users=1000, sellers=50, auctions=args.auctions, bids=args.bids)
+        seeded = time.perf_counter() - t0
+
+        results = {}
+        for term in TERMS:
+            row = {}
+            for name, build in (('like', like), ('fts', indexed)):
+                timings = []
+                for _ in range(args.repeat):
+                    t0 = time.perf_counter()
+                    page = build(term).paginate(page=1, per_page=12, error_out=False)
+                    timings.append(time.perf_counter() - t0)
+                    db.session.rollback()
+                timings.sort()
+                row[name] = {
+                    'matches': page.total,
+                    'mean_ms': round(1000 * statistics.mean(timings), 2),
+                    'p95_ms': round(1000 * timings[int(0.95 * (len(timings) - 1))], 2),
+                }
+            row['speedup'] = round(row['like']['mean_ms'] / row['fts']['mean_ms'], 1) \
+                if row['fts']['mean_ms'] else None
+            results[term] = row
+        dialect = db.engine.dialect.name
+
+    print(json.dumps({
+        'auctions': args.auctions,
+        'seed_seconds': round(seeded, 1),
+        'dialect': dialect,
+        'terms': results,
+    }, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
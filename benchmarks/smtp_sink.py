@@ -0,0 +1,97 @@
+"""Minimal local SMTP server that accepts and counts every message.
+
+A stand-in for the real mail server when exercising the outbox:
+
+    python -m benchmarks.smtp_sink --port 2525
+    MAIL_ENABLED=true MAIL_SERVER=localhost MAIL_PORT=2525 MAIL_USE_TLS=false \\
+        MAIL_DEFAULT_SENDER=noreply@example.com flask outbox-worker
+
+Set ``fail_every`` to reject every Nth message, which exercises retries.
+"""
+import argparse
+import socketserver
+import threading
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), fail_every=0):
+        super().__init__(address, _SMTPHandler)
+        self.fail_every = fail_every
+        self.messages = []
+        self.connections = 0
+        self.attempts = 0
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply('220 smtp-sink ready')
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip()
+            verb = command[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 smtp-sink')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command.split(':', 1)[1].strip())
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                for raw in self.rfile:
+                    if raw in (b'.\r\n', b'.\n'):
+                        break
+                    data.append(raw)
+                with server.lock:
+                    server.attempts += 1
+                    rejected = server.fail_every and server.attempts % server.fail_every == 0
+                    if not rejected:
+                        server.messages.append((recipients, b''.join(data)))
+                self.reply('451 Try again later' if rejected else '250 OK')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=2525)
+    parser.add_argument('--fail-every', type=int, default=0)
+    args = parser.parse_args()
+    server = SMTPSink(('127.0.0.1', args.port), fail_every=args.fail_every)
+    print(f'Listening on 127.0.0.1:{server.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f'{len(server.messages)} messages over {server.connections} connections')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Measure how long a web worker takes to import the app, and check it stays cheap.
+
+Starts ``--runs`` fresh interpreters that each import ``main`` (what
+gunicorn does for ``main:app``) and reports the import time, the whole
+process time and the number of SQL statements run while importing.  A
+worker must start without touching the database, so any statement fails
+the run, as does a median import time above ``--target-ms``.  For
+comparison it also times one ``flask bootstrap`` on a fresh database.
+
+    python -m benchmarks.startup_time --runs 10 --target-ms 1000
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import ROOT
+
+WORKER = '''
+import json, time
+t0 = time.perf_counter()
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+statements = []
+event.listen(Engine, 'before_cursor_execute',
+             lambda conn, cursor, statement, *args: statements.append(statement))
+import main
+print(json.dumps({'import_ms': 1000 * (time.perf_counter() - t0), 'statements': statements}))
+'''
+
+BOOTSTRAP = '''
+import json, time
+t0 = time.perf_counter()
+from app import app
+from bootstrap import bootstrap
+with app.app_context():
+    bootstrap()
+print(json.dumps({'import_ms': 1000 * (time.perf_counter() - t0), 'statements': []}))
+'''
+
+
+def run(code, env):
+    t0 = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report['process_ms'] = 1000 * (time.perf_counter() - t0)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--target-ms', type=float, default=1000.0,
+                        help='fail if the median import time is above this')
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env['DATABASE_URL'] = args.database_url or f'sqlite:///{tempfile.mkdtemp(prefix="bench_")}/startup.db'
+
+    bootstrap = run(BOOTSTRAP, env)
+    runs = [run(WORKER, env) for _ in range(args.runs)]
+    imports = [r['import_ms'] for r in runs]
+    processes = [r['process_ms'] for r in runs]
+    statements = sorted({s for r in runs for s in r['statements']})
+
+    report = {
+        'runs': args.runs,
+        'import_ms': {'median': round(statistics.median(imports), 1), 'max': round(max(imports), 1)},
+        'process_ms': {'median': round(statistics.median(processes), 1),
+                       'max': round(max(processes), 1)},
+        'sql_statements': statements,
+        'bootstrap_ms': round(bootstrap['import_ms'], 1),
+        'target_ms': args.target_ms,
+    }
+    report['ok'] = not statements and report['import_ms']['median'] <= args.target_ms
+    print(json.dumps(report, indent=2))
+    return 0 if report['ok'] else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
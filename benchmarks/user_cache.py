@@ -0,0 +1,95 @@
+"""Session-user cache: SQL saved per page view, hit ratio and lockout delay.
+
+Signs ``--users`` buyers in and has each view their dashboard ``--views``
+times, once with the identity cache off and once with it on, reporting SQL
+statements per view and the cache's hit ratio.  Then checks deactivation:
+
+* through the admin route, which invalidates the cache, the user's next
+  request must already be anonymous;
+* by a direct database update (what another worker's change looks like
+  from here), the user must be locked out within ``--ttl`` seconds.
+
+    python -m benchmarks.user_cache --users 20 --views 50 --ttl 2
+"""
+import argparse
+import json
+import time
+
+from benchmarks.common import load_app, seed_dataset, QueryCounter, login
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--views', type=int, default=50)
+    parser.add_argument('--ttl', type=float, default=2.0)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    app, db = load_app(args.database_url)
+    from cache import cache, NullBackend, LocalBackend
+    from identity import identity_cache
+    from models import User
+
+    cache.use(NullBackend())
+    with app.app_context():
+        data = seed_dataset(db, users=args.users + 1, sellers=1, auctions=200, bids=2000)
+        engine = db.engine
+
+    clients = []
+    for user_id in data['buyer_ids'][:args.users]:
+        client = app.test_client()
+        login(client, f'bench{user_id}@bench.example.com')
+        clients.append((user_id, client))
+
+    def run_views():
+        identity_cache.reset_stats()
+        counter = QueryCounter(engine)
+        t0 = time.perf_counter()
+        with counter:
+            for _ in range(args.views):
+                for _, client in clients:
+                    client.get('/dashboard/buyer')
+        views = args.views * len(clients)
+        return {
+            'sql_per_view': round(counter.count / views, 2),
+            'ms_per_view': round(1000 * (time.perf_counter() - t0) / views, 3),
+            **identity_cache.stats(),
+        }
+
+    report = {'users': len(clients), 'views_per_user': args.views}
+    identity_cache.backend = None
+    report['uncached'] = run_views()
+    identity_cache.ttl = args.ttl
+    identity_cache.backend = LocalBackend(10000)
+    report['cached'] = run_views()
+
+    def locked_out(client):
+        return client.get('/dashboard/buyer').status_code == 302
+
+    admin = app.test_client()
+    login(admin, 'admin@auction.com', 'admin123')
+    user_id, client = clients[0]
+    client.get('/dashboard/buyer')
+    admin.post(f'/admin/users/{user_id}/status', data={'active': 'false'})
+    report['admin_deactivation_immediate'] = locked_out(client)
+
+    user_id, client = clients[1]
+    client.get('/dashboard/buyer')
+    with app.app_context():
+        db.session.execute(db.update(User).where(User.id == user_id).values(is_active=False))
+        db.session.commit()
+    started = time.perf_counter()
+    while not locked_out(client) and time.perf_counter() - started < 2 * args.ttl + 1:
+        time.sleep(0.05)
+    delay = time.perf_counter() - started
+    report['direct_deactivation_delay_s'] = round(delay, 2)
+    report['lockout_within_ttl'] = delay <= args.ttl + 0.5
+
+    print(json.dumps(report, indent=2))
+    ok = report['admin_deactivation_immediate'] and report['lockout_within_ttl']
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,374 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Optional
+
+from flask import current_app
+from sqlalchemy import update, func, select, or_, and_, case
+
+from app import db
+from cache import cache
+from events import broker, auction_channel
+from identity import identity_cache
+from models import Auction, ArchivedBid, Bid, BidArchiveSummary, ProxyBid
+import dashboards
+import outbox
+from money import to_decimal, to_cents, cents, increment_case, minimum_bid
+
+
+@dataclass(frozen=True)
+class BidResult:
+    """Outcome of a call to :func:`place_bid`."""
+    accepted: bool
+    message: str
+    auction_id: int
+    amount: Decimal
+    bid: Optional[Bid] = None
+    minimum: Optional[Decimal] = None
+
+
+def place_bid(auction_id, bidder_id, amount):
+    """Validate and apply a bid in a single transaction.
+
+    The auction row is claimed with one conditional UPDATE that only matches
+    while the auction is live, the bidder is not the seller and ``amount``
+    is at least the starting bid (first bid) or the highest bid plus the
+    increment for its price band, compared in integer cents.  Two
+    concurrent bidders can therefore never both win: the database serialises
+    the UPDATEs and the loser's WHERE clause no longer matches.  The same
+    UPDATE maintains the denormalised bid aggregates on ``Auction``; the
+    ``Bid`` row, the seller's outbox event and the dashboard counters
+    (see :mod:`dashboards`) are written in the same commit, and live
+    viewers are notified once it has landed.  A bid in the final
+    ``SOFT_CLOSE_SECONDS`` pushes ``end_time`` back out to that many
+    seconds from now in the same UPDATE.  Any proxy bids the new bid
+    provokes (see :func:`set_max_bid`) land in the same commit too.
+    """
+    now = datetime.now(timezone.utc)
+    amount = to_decimal(amount)
+    try:
+        claimed = _claim(auction_id, bidder_id, amount, now)
+        if claimed is None:
+            db.session.rollback()
+            return _rejection(auction_id, bidder_id, amount, now)
+        placed = [claimed] + _resolve_proxies(auction_id, now, claimed.starting_bid,
+                                              claimed.title, bidder_id, amount)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    _announce(auction_id, placed, now)
+    if placed[-1].bidder_id != bidder_id:
+        return BidResult(True, f'Bid of ${amount:.2f} placed, but another bidder\'s maximum '
+                               f'bid raised the price to ${placed[-1].amount:.2f}.',
+                         auction_id, amount, bid=claimed.bid)
+    return BidResult(True, f'Bid of ${amount:.2f} placed successfully!',
+                     auction_id, amount, bid=claimed.bid)
+
+
+def set_max_bid(auction_id, bidder_id, max_amount):
+    """Register or raise ``bidder_id``'s hidden maximum bid on an auction.
+
+    The engine then bids on the bidder's behalf, one increment at a time,
+    whenever someone else outbids them, up to ``max_amount``.  Competing
+    maxima are settled at once by :func:`_resolve_proxies`, so a bidding
+    war between two proxies costs at most two ``Bid`` rows instead of one
+    request per increment.  A maximum can only be raised, never lowered.
+    """
+    now = datetime.now(timezone.utc)
+    max_amount = to_decimal(max_amount)
+    try:
+        # Lock the auction before writing the proxy row, which must reference it
+        row = _auction_state(auction_id, lock=True)
+        if row is None:
+            db.session.rollback()
+            return BidResult(False, 'Invalid auction.', auction_id, max_amount)
+        proxy = db.session.execute(
+            select(ProxyBid).where(ProxyBid.auction_id == auction_id,
+                                   ProxyBid.bidder_id == bidder_id)
+        ).scalar_one_or_none()
+        if proxy is not None and max_amount <= proxy.max_amount:
+            db.session.rollback()
+            return BidResult(False, f'Your maximum bid is already ${proxy.max_amount:.2f}.',
+                             auction_id, max_amount)
+        if proxy is None:
+            proxy = ProxyBid(auction_id=auction_id, bidder_id=bidder_id)
+            db.session.add(proxy)
+        proxy.max_amount = max_amount
+        proxy.placed_at = now
+        db.session.flush()
+        # SQLite has no row locks: its write lock comes with the proxy
+        # write, so read the state again under it
+        if db.engine.dialect.name == 'sqlite':
+            row = _auction_state(auction_id)
+
+        problem = _unavailable(row, bidder_id, now)
+        if problem is None and row.highest_bidder_id != bidder_id:
+            minimum = minimum_bid(row.starting_bid, row.highest_bid_amount)
+            if max_amount < minimum:
+                problem = f'Your maximum bid must be at least ${minimum:.2f}'
+        if problem is not None:
+            db.session.rollback()
+            return BidResult(False, problem, auction_id, max_amount)
+
+        placed = _resolve_proxies(auction_id, now, row.starting_bid, row.title,
+                                  row.highest_bidder_id, row.highest_bid_amount)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    _announce(auction_id, placed, now)
+    own = [p.bid for p in placed if p.bidder_id == bidder_id]
+    if placed and placed[-1].bidder_id != bidder_id:
+        return BidResult(False, f'Another bidder\'s maximum bid beat yours; the price is now '
+                                f'${placed[-1].amount:.2f}.',
+                         auction_id, max_amount, bid=own[-1] if own else None)
+    return BidResult(True, f'Maximum bid of ${max_amount:.2f} set. We\'ll bid for you '
+                           f'up to that amount.',
+                     auction_id, max_amount, bid=own[-1] if own else None)
+
+
+@dataclass(frozen=True)
+class _Placed:
+    """A bid claimed inside the current transaction, awaiting announcement.
+
+    Plain values are copied out so nothing is reloaded after the commit.
+    """
+    bid: Bid
+    bid_id: int
+    bidder_id: int
+    amount: Decimal
+    bidder_name: str
+    bid_count: int
+    end_time: datetime
+    extended: bool
+    minimum: Decimal
+    starting_bid: Decimal
+    title: str
+
+
+def _claim(auction_id, bidder_id, amount, now):
+    """Apply one bid with the conditional UPDATE, without committing.
+
+    Returns a :class:`_Placed`, or ``None`` when the UPDATE did not match.
+    """
+    amount_cents = to_cents(amount)
+    highest = cents(Auction.highest_bid_amount)
+    new_end_time = Auction.end_time
+    soft_close = current_app.config['SOFT_CLOSE_SECONDS']
+    if soft_close:
+        extended_to = now + timedelta(seconds=soft_close)
+        new_end_time = case((Auction.end_time < extended_to, extended_to), else_=Auction.end_time)
+    stmt = (
+        update(Auction)
+        .where(
+            Auction.id == auction_id,
+            Auction.status == 'active',
+            Auction.start_time <= now,
+            Auction.end_time > now,
+            Auction.seller_id != bidder_id,
+            or_(
+                and_(Auction.highest_bid_amount.is_(None),
+                     cents(Auction.starting_bid) <= amount_cents),
+                highest + increment_case(highest) <= amount_cents,
+            ),
+        )
+        .values(
+            current_bid=amount,
+            bid_count=Auction.bid_count + 1,
+            highest_bid_amount=amount,
+            highest_bidder_id=bidder_id,
+            end_time=new_end_time,
+        )
+        .returning(Auction.seller_id, Auction.title, Auction.bid_count, Auction.end_time,
+                   Auction.starting_bid)
+        .execution_options(synchronize_session=False)
+    )
+    claimed = db.session.execute(stmt).first()
+    if claimed is None:
+        return None
+
+    bid = Bid(amount=amount, auction_id=auction_id, bidder_id=bidder_id, timestamp=now)
+    db.session.add(bid)
+    outbox.enqueue(
+        claimed.seller_id,
+        f'New bid of ${amount:.2f} on your auction "{claimed.title}"',
+        subject='New bid on your auction',
+        coalesce_key=f'bids:{auction_id}',
+        summary=f'{{count}} new bids on your auction "{claimed.title}" - now ${amount:.2f}',
+    )
+    dashboards.record_bid(auction_id, claimed.seller_id, bidder_id, amount, now)
+    db.session.flush()
+    end_time = claimed.end_time
+    if end_time.tzinfo is None:
+        end_time = end_time.replace(tzinfo=timezone.utc)
+    extended = bool(soft_close) and end_time == extended_to
+    # Usually a hit: the request already loaded current_user through it
+    bidder_name = identity_cache.load(bidder_id).username
+    return _Placed(bid, bid.id, bidder_id, amount, bidder_name, claimed.bid_count, end_time,
+                   extended, minimum_bid(claimed.starting_bid, amount), claimed.starting_bid,
+                   claimed.title)
+
+
+def _resolve_proxies(auction_id, now, starting_bid, title, holder, highest):
+    """Bid for proxies until no maximum can beat the current price.
+
+    Only two maxima can matter: the best one wins at one increment over the
+    runner-up's, and everything below the runner-up is already beaten.  The
+    top three proxies are read (the current high bidder may own one of
+    them) through ``ix_proxy_bid_auction_max``, so each call costs an index
+    probe, not a scan over every proxy, and claims at most two bids: the
+    runner-up's maximum and the winner's answer to it.  Ties go to the
+    current high bidder, then to whoever set their maximum first.
+
+    ``holder`` and ``highest`` describe the current top bid.  Must run inside
+    the transaction that changed the auction, after its row is locked.
+    Returns the :class:`_Placed` bids in order.
+    """
+    floor = minimum_bid(starting_bid, highest)
+    proxies = db.session.execute(
+        select(ProxyBid.bidder_id, ProxyBid.max_amount)
+        .where(ProxyBid.auction_id == auction_id)
+        .order_by(ProxyBid.max_amount.desc(), ProxyBid.placed_at, ProxyBid.id)
+        .limit(3)
+    ).all()
+
+    field = []
+    if holder is not None:
+        ceiling = max([highest] + [p.max_amount for p in proxies if p.bidder_id == holder])
+        field.append((holder, ceiling))
+    field += [(p.bidder_id, p.max_amount) for p in proxies
+              if p.bidder_id != holder and p.max_amount >= floor]
+    # Stable sort: the holder, then earlier proxies, win ties
+    field.sort(key=lambda entry: entry[1], reverse=True)
+    if not field or (field[0][0] == holder and len(field) == 1):
+        return []
+
+    leader, ceiling = field[0]
+    if len(field) == 1:
+        bids = [(leader, floor)]
+    else:
+        runner, runner_ceiling = field[1]
+        answer = minimum_bid(starting_bid, runner_ceiling)
+        if ceiling >= answer:
+            bids = [(runner, runner_ceiling)] if runner != holder else []
+            bids.append((leader, answer))
+        else:
+            # Within one increment of the runner-up: bid the whole maximum
+            bids = [(leader, ceiling)]
+        if any(p.bidder_id == runner for p in proxies):
+            outbox.enqueue(
+                runner,
+                f'Your maximum bid of ${runner_ceiling:.2f} on "{title}" has been beaten.',
+                subject='You have been outbid',
+            )
+
+    placed = []
+    for bidder_id, amount in bids:
+        claimed = _claim(auction_id, bidder_id, amount, now)
+        if claimed is None:
+            # Someone changed the auction under us; their transaction resolves next
+            break
+        placed.append(claimed)
+    return placed
+
+
+def _auction_state(auction_id, lock=False):
+    stmt = select(Auction.seller_id, Auction.title, Auction.status, Auction.start_time,
+                  Auction.end_time, Auction.starting_bid, Auction.highest_bid_amount,
+                  Auction.highest_bidder_id).where(Auction.id == auction_id)
+    if lock:
+        stmt = stmt.with_for_update()
+    return db.session.execute(stmt).first()
+
+
+def _unavailable(row, bidder_id, now):
+    """Why ``bidder_id`` cannot bid on the auction in ``row`` at all, or ``None``."""
+    if row is None:
+        return 'Invalid auction.'
+
+    start_time = row.start_time
+    end_time = row.end_time
+    if start_time.tzinfo is None:
+        start_time = start_time.replace(tzinfo=timezone.utc)
+    if end_time.tzinfo is None:
+        end_time = end_time.replace(tzinfo=timezone.utc)
+    if row.status != 'active' or not (start_time <= now < end_time):
+        return 'This auction is no longer active.'
+
+    if row.seller_id == bidder_id:
+        return 'You cannot bid on your own auction.'
+    return None
+
+
+def _announce(auction_id, placed, now):
+    """Push committed bids to live viewers."""
+    if not placed:
+        return
+    cache.invalidate('auctions')
+    for p in placed:
+        broker.publish(auction_channel(auction_id), 'bid', {
+            'id': p.bid_id,
+            'amount': float(p.amount),
+            'bidder_name': p.bidder_name,
+            'timestamp': now.isoformat(),
+            'current_bid': float(p.amount),
+            'minimum_bid': float(p.minimum),
+            'bid_count': p.bid_count,
+            'end_time': p.end_time.isoformat(),
+            'extended': p.extended,
+        }, id=p.bid_id)
+
+
+def _rejection(auction_id, bidder_id, amount, now):
+    """Work out why the conditional UPDATE did not match.
+
+    Only runs on the reject path, so accepted bids never pay for it.
+    """
+    row = _auction_state(auction_id)
+    db.session.rollback()
+
+    problem = _unavailable(row, bidder_id, now)
+    if problem is not None:
+        return BidResult(False, problem, auction_id, amount)
+
+    minimum = minimum_bid(row.starting_bid, row.highest_bid_amount)
+    return BidResult(False, f'Bid must be at least ${minimum:.2f}',
+                     auction_id, amount, minimum=minimum)
+
+
+def recompute_bid_aggregates(auction_ids=None):
+    """Rebuild ``bid_count``, ``highest_bid_amount`` and ``highest_bidder_id`` from the bids.
+
+    Runs as one set-based UPDATE with correlated subqueries per bid table:
+    archived auctions (those with a ``BidArchiveSummary``) are recomputed
+    from ``ArchivedBid``, the rest from ``Bid``.  Pass ``auction_ids`` to
+    repair specific auctions; by default every auction is recomputed.
+    Returns the number of auctions updated.
+    """
+    archived = (select(BidArchiveSummary.auction_id)
+                .where(BidArchiveSummary.auction_id == Auction.id).exists())
+    updated = 0
+    for model, where in ((Bid, ~archived), (ArchivedBid, archived)):
+        top_bid = (
+            select(model.amount, model.bidder_id)
+            .where(model.auction_id == Auction.id)
+            .order_by(model.amount.desc(), model.id.asc())
+            .limit(1)
+        )
+        stmt = update(Auction).where(where).values(
+            bid_count=select(func.count(model.id))
+            .where(model.auction_id == Auction.id)
+            .scalar_subquery(),
+            highest_bid_amount=top_bid.with_only_columns(model.amount).scalar_subquery(),
+            highest_bidder_id=top_bid.with_only_columns(model.bidder_id).scalar_subquery(),
+        ).execution_options(synchronize_session=False)
+        if auction_ids is not None:
+            stmt = stmt.where(Auction.id.in_(auction_ids))
+        updated += db.session.execute(stmt).rowcount
+
+    db.session.commit()
+    cache.invalidate('auctions')
+    return updated
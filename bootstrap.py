@@ -0,0 +1,78 @@
+"""One-shot schema setup and default data, run once per deploy.
+
+Importing ``app`` no longer touches the database, so web workers start
+without racing each other over ``CREATE TABLE`` and the seed rows (which
+on SQLite meant "database is locked" with several workers).  Run
+``flask bootstrap`` before starting them instead; it is safe to repeat.
+
+The admin user and the default categories are each written with a single
+``INSERT ... ON CONFLICT DO NOTHING``, so existing rows are left alone and
+a repeat run costs two statements rather than a lookup per row.
+"""
+from sqlalchemy import insert, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from werkzeug.security import generate_password_hash
+
+from app import db
+from models import User, Category
+import migrations
+
+ADMIN = {'username': 'admin', 'email': 'admin@auction.com', 'password': 'admin123'}
+
+DEFAULT_CATEGORIES = [
+    {'name': 'Electronics', 'description': 'Computers, phones, gadgets and electronic devices'},
+    {'name': 'Collectibles', 'description': 'Rare items, antiques, and collectible memorabilia'},
+    {'name': 'Art & Crafts', 'description': 'Paintings, sculptures, handmade items and artwork'},
+    {'name': 'Home & Garden', 'description': 'Furniture, decor, tools and garden equipment'},
+    {'name': 'Fashion', 'description': 'Clothing, accessories, shoes and fashion items'},
+    {'name': 'Books & Media', 'description': 'Books, movies, music and educational materials'},
+]
+
+_UPSERT_DIALECTS = {'sqlite': sqlite, 'postgresql': postgresql}
+
+
+def _insert_missing(model, rows, key):
+    """Insert the ``rows`` whose ``key`` is not taken yet; return how many were added."""
+    dialect = _UPSERT_DIALECTS.get(db.engine.dialect.name)
+    if dialect is not None:
+        statement = dialect.insert(model).values(rows).on_conflict_do_nothing()
+        return db.session.execute(statement).rowcount
+    column = getattr(model, key)
+    taken = set(db.session.execute(
+        select(column).where(column.in_([row[key] for row in rows]))
+    ).scalars())
+    missing = [row for row in rows if row[key] not in taken]
+    if missing:
+        db.session.execute(insert(model), missing)
+    return len(missing)
+
+
+def seed_defaults():
+    """Create the admin user and default categories if missing; return what was added."""
+    created = []
+    admin = {
+        'username': ADMIN['username'],
+        'email': ADMIN['email'],
+        'password_hash': generate_password_hash(ADMIN['password']),
+        'role': 'admin',
+        'is_active': True,
+    }
+    if _insert_missing(User, [admin], 'email'):
+        created.append(f'admin user {ADMIN["email"]}')
+    added = _insert_missing(Category, DEFAULT_CATEGORIES, 'name')
+    if added:
+        created.append(f'{added} categories')
+    db.session.commit()
+    return created
+
+
+def bootstrap():
+    """Create missing tables, apply schema upgrades and seed default data.
+
+    Returns the upgrades applied and the rows seeded, as readable strings.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        # Rewriting a large table can outlast DB_STATEMENT_TIMEOUT_MS
+        db.session.execute(text('SET statement_timeout = 0'))
+    db.create_all()
+    return migrations.upgrade() + seed_defaults()
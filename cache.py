@@ -0,0 +1,282 @@
+"""Short-lived response cache for the public browse pages.
+
+:meth:`Cache.cached` wraps a view and stores its rendered body under a key
+built from the endpoint, the whitelisted query args and who is looking
+(anonymous visitors share one copy; signed-in users get their own because
+the navbar shows their name).  Requests with pending flash messages and
+non-200 responses are never cached.
+
+Entries expire after a short TTL and are also invalidated explicitly:
+every key embeds the current *generation* of the namespaces the view reads
+(``auctions``, ``categories``), and :meth:`Cache.invalidate` bumps a
+generation after a bid, approval, close or category change commits.  Stale
+entries are never looked up again and age out of the LRU.
+
+The backend decides where entries live:
+
+* ``local`` (default) is an in-process LRU capped at ``CACHE_MAX_ENTRIES``.
+* ``redis`` shares entries and generations between workers, so an
+  invalidation in one worker is seen by all.  Requires the ``redis``
+  package.
+* ``null`` disables caching.
+"""
+import functools
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from flask import request, session, make_response, Response
+from flask_login import current_user
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBackend:
+    """Thread-safe in-process LRU with per-entry expiry."""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # Kept outside the LRU: evicting a generation would resurrect stale entries
+        self._generations = {}
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def generations(self, names):
+        with self._lock:
+            return [self._generations.get(name, 0) for name in names]
+
+    def bump(self, name):
+        with self._lock:
+            self._generations[name] = self._generations.get(name, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Share entries and generations between workers through Redis."""
+
+    prefix = 'bidblitz:cache:'
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError('CACHE_BACKEND=redis requires the redis package') from exc
+        self.client = redis.Redis.from_url(url)
+        self.evictions = 0
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(int(ttl), 1))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def generations(self, names):
+        values = self.client.mget([f'{self.prefix}gen:{name}' for name in names])
+        return [int(v) if v is not None else 0 for v in values]
+
+    def bump(self, name):
+        self.client.incr(f'{self.prefix}gen:{name}')
+
+    def clear(self):
+        # Entries carry TTLs; bumping every generation is enough
+        for key in self.client.scan_iter(f'{self.prefix}gen:*'):
+            self.client.incr(key)
+
+    def __len__(self):
+        return 0
+
+
+class NullBackend:
+    """Cache nothing; used to measure the uncached baseline."""
+
+    evictions = 0
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def generations(self, names):
+        return [0] * len(names)
+
+    def bump(self, name):
+        pass
+
+    def clear(self):
+        pass
+
+    def __len__(self):
+        return 0
+
+
+class Cache:
+    """View response cache with generation-based invalidation."""
+
+    def __init__(self, app=None):
+        self.backend = NullBackend()
+        self.default_ttl = 30
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        name = app.config.setdefault('CACHE_BACKEND', 'local')
+        self.default_ttl = app.config.setdefault('CACHE_DEFAULT_TTL', 30)
+        if name == 'local':
+            backend = LocalBackend(app.config.setdefault('CACHE_MAX_ENTRIES', 1000))
+        elif name == 'redis':
+            backend = RedisBackend(app.config['CACHE_REDIS_URL'])
+        elif name == 'null':
+            backend = NullBackend()
+        else:
+            raise ValueError(f'Unknown CACHE_BACKEND {name!r}')
+        self.use(backend)
+        app.extensions['cache'] = self
+
+    def use(self, backend):
+        self.backend = backend
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = self.invalidations = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'entries': len(self.backend),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+            'invalidations': self.invalidations,
+            'evictions': self.backend.evictions,
+        }
+
+    def invalidate(self, *namespaces):
+        """Drop every entry that depends on ``namespaces``.
+
+        Call after the change has committed.  Never raises: a failed
+        invalidation only means a page is stale until its TTL runs out.
+        """
+        for name in namespaces:
+            try:
+                self.backend.bump(name)
+            except Exception:
+                logger.exception('Failed to invalidate cache namespace %s', name)
+        with self._lock:
+            self.invalidations += len(namespaces)
+
+    def clear(self):
+        self.backend.clear()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def cached(self, namespaces, args=(), ttl=None):
+        """Cache a GET view's 200 responses.
+
+        ``namespaces`` are the data the view reads; ``args`` are the query
+        args that change its output -- anything else in the query string is
+        ignored so it cannot be used to flood the cache.
+        """
+        namespaces = tuple(namespaces)
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*view_args, **view_kwargs):
+                if request.method != 'GET' or '_flashes' in session:
+                    return view(*view_args, **view_kwargs)
+
+                # The navbar shows the viewer's unread badge, so it is part of the key
+                viewer = (f'user:{current_user.id}:{current_user.unread_notifications}'
+                          if current_user.is_authenticated else 'anon')
+                try:
+                    generations = self.backend.generations(namespaces)
+                except Exception:
+                    logger.exception('Cache lookup failed')
+                    return view(*view_args, **view_kwargs)
+                key = '|'.join([
+                    request.endpoint,
+                    viewer,
+                    ','.join(f'{n}={g}' for n, g in zip(namespaces, generations)),
+                    json.dumps(view_kwargs, sort_keys=True),
+                    '&'.join(f'{a}={request.args.get(a, "")}' for a in args),
+                ])
+
+                try:
+                    entry = self.backend.get(key)
+                except Exception:
+                    logger.exception('Cache lookup failed')
+                    entry = None
+                if entry is not None:
+                    self._count(True)
+                    response = Response(entry['body'], mimetype=entry['mimetype'])
+                    response.headers['X-Cache'] = 'HIT'
+                    return response
+
+                self._count(False)
+                response = make_response(view(*view_args, **view_kwargs))
+                if response.status_code == 200 and not response.direct_passthrough:
+                    try:
+                        self.backend.set(key, {
+                            'body': response.get_data(as_text=True),
+                            'mimetype': response.mimetype,
+                        }, ttl or self.default_ttl)
+                    except Exception:
+                        logger.exception('Cache store failed')
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
+
+
+cache = Cache()
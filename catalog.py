@@ -0,0 +1,135 @@
+"""In-process category catalog with live counts of active auctions.
+
+Every page that shows categories (the home page, the browse filter, the
+auction form's picker) reads them from :data:`category_catalog` instead
+of the database.  The catalog holds one :class:`CategoryEntry` per
+category, loaded with a single ``SELECT``, and serves it until it is
+invalidated or ``CATEGORY_CATALOG_TTL`` seconds pass.
+
+Each entry carries ``Category.active_auctions``, which is kept by delta
+like the dashboard counters (see dashboards.py).  Code that moves an
+auction into or out of ``active`` calls :func:`record_status_change`
+inside its transaction.  The deltas are written just before it commits,
+one ``UPDATE ... SET active_auctions = active_auctions + n`` per category
+in id order, and once it has committed the catalog in this worker is
+invalidated.  Creating a category invalidates it the same way.  Other
+workers see either change within ``CATEGORY_CATALOG_TTL`` seconds.
+
+The catalog is versioned: a load that raced an invalidation is served
+once but not kept.  :func:`rebuild` recounts from ``Auction``
+(``flask rebuild-category-counts``).
+"""
+import threading
+import time
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import select, update, func, event
+
+from app import db
+from models import Auction, Category
+
+CategoryEntry = namedtuple('CategoryEntry', 'id name description active_auctions')
+
+# session.info keys: deltas waiting for the commit, and "invalidate after it"
+_PENDING = 'category_deltas'
+_CHANGED = 'category_counts_changed'
+
+
+def record_status_change(category_ids, old_status, new_status):
+    """Count auctions in ``category_ids`` moved from ``old_status`` (None when new) to ``new_status``."""
+    delta = (new_status == 'active') - (old_status == 'active')
+    if not delta:
+        return
+    pending = db.session.info.setdefault(_PENDING, {})
+    for category_id in category_ids:
+        if category_id is not None:
+            pending[category_id] = pending.get(category_id, 0) + delta
+
+
+@event.listens_for(db.session, 'before_commit')
+def _write_deltas(session):
+    pending = session.info.pop(_PENDING, None)
+    if not pending:
+        return
+    for category_id, delta in sorted(pending.items()):
+        if delta:
+            session.execute(
+                update(Category)
+                .where(Category.id == category_id)
+                .values(active_auctions=Category.active_auctions + delta)
+                .execution_options(synchronize_session=False)
+            )
+    session.info[_CHANGED] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_after_commit(session):
+    if session.info.pop(_CHANGED, False):
+        category_catalog.invalidate()
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _drop_deltas(session, previous_transaction):
+    session.info.pop(_PENDING, None)
+    session.info.pop(_CHANGED, None)
+
+
+def rebuild():
+    """Recount ``Category.active_auctions`` from ``Auction``; return the number of categories."""
+    active = (select(func.count()).select_from(Auction)
+              .where(Auction.category_id == Category.id, Auction.status == 'active')
+              .scalar_subquery())
+    result = db.session.execute(
+        update(Category).values(active_auctions=active).execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    category_catalog.invalidate()
+    return result.rowcount
+
+
+class CategoryCatalog:
+    """TTL + explicit-invalidation cache of every category and its active auction count."""
+
+    def __init__(self):
+        self.version = 0
+        self._lock = threading.Lock()
+        self._entries = None
+        self._expires_at = 0.0
+        self.loads = 0
+
+    def all(self):
+        """Every category as a :class:`CategoryEntry`, in id order."""
+        with self._lock:
+            if self._entries is not None and time.monotonic() < self._expires_at:
+                return self._entries
+            version = self.version
+        entries = tuple(CategoryEntry(*row) for row in db.session.execute(
+            select(Category.id, Category.name, Category.description, Category.active_auctions)
+            .order_by(Category.id)
+        ))
+        ttl = current_app.config['CATEGORY_CATALOG_TTL']
+        with self._lock:
+            self.loads += 1
+            # An invalidation while we were reading means these may be stale already
+            if ttl > 0 and version == self.version:
+                self._entries = entries
+                self._expires_at = time.monotonic() + ttl
+        return entries
+
+    def choices(self):
+        """``(id, name)`` pairs for a category ``SelectField``."""
+        return [(entry.id, entry.name) for entry in self.all()]
+
+    def busiest(self, limit):
+        """The ``limit`` categories with the most active auctions."""
+        return sorted(self.all(), key=lambda entry: (-entry.active_auctions, entry.name))[:limit]
+
+    def invalidate(self):
+        """Drop the loaded catalog; call after a category or its counts changed."""
+        with self._lock:
+            self.version += 1
+            self._entries = None
+
+
+category_catalog = CategoryCatalog()
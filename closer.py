@@ -0,0 +1,224 @@
+"""Close ended auctions and record their winners.
+
+:func:`close_due_auctions` closes one bounded batch: it claims due
+auctions (``FOR UPDATE SKIP LOCKED`` on PostgreSQL, a status-guarded
+UPDATE everywhere), copies the denormalised highest bid into
+``winner_id``/``current_bid`` in the same statement and queues the winner
+and seller notifications and the dashboard counters in the same
+transaction.  Several workers can run it at once; each auction is closed
+exactly once.
+
+:class:`AuctionCloser` runs batches in a background thread.  Rather than
+polling it sleeps until the earliest ``end_time`` of a live auction, read
+from ``ix_auction_status_end_time``, and can be woken early when an end
+time changes.  Soft-close extensions only ever move an end time later, so
+a closer that wakes for an extended auction finds nothing due, re-reads
+the index and goes back to sleep; nothing is rescanned.  It also moves the
+bids of long-finished auctions into the archive (see archive.py).
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import select, update, func
+
+from app import db
+from cache import cache
+from events import broker, auction_channel
+from models import Auction, User
+from money import as_json
+import archive
+import catalog
+import dashboards
+import outbox
+
+logger = logging.getLogger(__name__)
+
+
+def close_due_auctions(batch_size=100, now=None):
+    """Close up to ``batch_size`` ended auctions and return how many were closed."""
+    return _close_batch(batch_size, now or datetime.now(timezone.utc))[1]
+
+
+def _close_batch(batch_size, now):
+    """Close one batch and return ``(found, closed)``.
+
+    ``closed`` is smaller than ``found`` when another worker claimed some of
+    the rows first.
+    """
+    try:
+        due = db.session.execute(
+            select(Auction.id)
+            .where(Auction.status == 'active', Auction.end_time <= now)
+            .order_by(Auction.end_time)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not due:
+            db.session.rollback()
+            return 0, 0
+
+        # The status guard makes the UPDATE the claim: a concurrent closer
+        # that already took a row leaves nothing for this one to match.  The
+        # end_time guard skips auctions a late bid extended since the SELECT
+        closed = db.session.execute(
+            update(Auction)
+            .where(Auction.id.in_(due), Auction.status == 'active', Auction.end_time <= now)
+            .values(
+                status='completed',
+                winner_id=Auction.highest_bidder_id,
+                current_bid=func.coalesce(Auction.highest_bid_amount, Auction.current_bid),
+            )
+            .returning(Auction.id, Auction.title, Auction.seller_id, Auction.category_id,
+                       Auction.highest_bidder_id, Auction.highest_bid_amount)
+            .execution_options(synchronize_session=False)
+        ).all()
+
+        winner_ids = {row.highest_bidder_id for row in closed if row.highest_bidder_id}
+        usernames = dict(db.session.execute(
+            select(User.id, User.username).where(User.id.in_(winner_ids))
+        ).all()) if winner_ids else {}
+
+        for row in closed:
+            if not row.highest_bidder_id:
+                continue
+            amount = row.highest_bid_amount
+            outbox.enqueue(
+                row.highest_bidder_id,
+                f'Congratulations! You won the auction for "{row.title}" with a bid of ${amount:.2f}',
+                subject='You won an auction',
+            )
+            outbox.enqueue(
+                row.seller_id,
+                f'Your auction "{row.title}" has ended. Winner: {usernames.get(row.highest_bidder_id)} - ${amount:.2f}',
+                subject='Your auction has ended',
+            )
+        dashboards.record_closed(closed)
+        catalog.record_status_change([row.category_id for row in closed], 'active', 'completed')
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if closed:
+        cache.invalidate('auctions')
+    for row in closed:
+        broker.publish(auction_channel(row.id), 'auction', {
+            'status': 'completed',
+            'current_bid': as_json(row.highest_bid_amount),
+            'winner_name': usernames.get(row.highest_bidder_id),
+        })
+    return len(due), len(closed)
+
+
+def close_all_due(batch_size=100, now=None):
+    """Run batches until no ended auction is left and return ``(closed, seconds)``."""
+    now = now or datetime.now(timezone.utc)
+    started = time.perf_counter()
+    total = 0
+    while True:
+        found, closed = _close_batch(batch_size, now)
+        total += closed
+        # Keep going after losing a race to another worker; stop once drained
+        if found < batch_size and found == closed:
+            break
+    return total, time.perf_counter() - started
+
+
+def next_end_time():
+    """Earliest ``end_time`` among live auctions, or ``None`` if there are none."""
+    end_time = db.session.execute(
+        select(func.min(Auction.end_time)).where(Auction.status == 'active')
+    ).scalar()
+    db.session.rollback()
+    if end_time is not None and end_time.tzinfo is None:
+        end_time = end_time.replace(tzinfo=timezone.utc)
+    return end_time
+
+
+class AuctionCloser:
+    """Background thread that closes auctions as their end time passes."""
+
+    def __init__(self, app=None, batch_size=100, max_sleep=60.0):
+        self.app = app
+        self.batch_size = batch_size
+        self.max_sleep = max_sleep
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.closed_total = 0
+        self.archived_total = 0
+        self.last_run = {'closed': 0, 'seconds': 0.0, 'closed_per_second': 0.0}
+        self._next_archive = 0.0
+        # Where the archive walk stopped; back to 0 once a pass completes
+        self._archive_resume = 0
+
+    def start(self, app=None):
+        self.app = app or self.app
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self.run, name='auction-closer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def wake(self):
+        """Re-read the next end time now, e.g. after an auction was approved or extended."""
+        self._wake.set()
+
+    def run_once(self):
+        """Close everything that is due and return seconds until the next end time.
+
+        Every ``BID_ARCHIVE_INTERVAL`` seconds it also archives the bids of
+        long-finished auctions for up to ``BID_ARCHIVE_MAX_SECONDS``, and
+        comes back sooner, where the walk stopped, while a backlog is left.
+        """
+        backlog = False
+        with self.app.app_context():
+            closed, seconds = close_all_due(self.batch_size)
+            self.closed_total += closed
+            if closed:
+                self.last_run = {
+                    'closed': closed,
+                    'seconds': round(seconds, 3),
+                    'closed_per_second': round(closed / seconds, 1) if seconds else float(closed),
+                }
+                logger.info('Closed %d auctions in %.3fs', closed, seconds)
+            config = self.app.config
+            if config['BID_ARCHIVE_INTERVAL'] and time.monotonic() >= self._next_archive:
+                auctions, bids, resume = archive.archive_due(
+                    max_seconds=config['BID_ARCHIVE_MAX_SECONDS'], after=self._archive_resume)
+                backlog = resume is not None
+                self._archive_resume = resume or 0
+                self.archived_total += bids
+                if bids:
+                    logger.info('Archived %d bids from %d auctions', bids, auctions)
+                if not backlog:
+                    self._next_archive = time.monotonic() + config['BID_ARCHIVE_INTERVAL']
+            upcoming = next_end_time()
+        if upcoming is None:
+            delay = self.max_sleep
+        else:
+            delay = (upcoming - datetime.now(timezone.utc)).total_seconds()
+        if backlog:
+            delay = min(delay, 1.0)
+        return min(max(delay, 0.1), self.max_sleep)
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                delay = self.run_once()
+            except Exception:
+                logger.exception('Auction closer batch failed')
+                delay = self.max_sleep
+            self._wake.wait(delay)
+            self._wake.clear()
+
+
+auction_closer = AuctionCloser()
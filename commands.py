@@ -0,0 +1,203 @@
+import time
+
+import click
+
+from app import app
+
+
+@app.cli.command('bootstrap')
+def bootstrap_command():
+    """Create the schema and default data; run once per deploy, before the workers."""
+    from bootstrap import bootstrap
+
+    done = bootstrap()
+    click.echo(f'Applied: {", ".join(done)}' if done else 'Database is up to date.')
+
+
+@app.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Create missing tables and apply in-place schema upgrades."""
+    from app import db
+    import migrations
+
+    db.create_all()
+    added = migrations.upgrade()
+    click.echo(f'Applied: {", ".join(added)}' if added else 'Schema is up to date.')
+
+
+@app.cli.command('repair-bid-aggregates')
+@click.option('--auction', 'auction_ids', type=int, multiple=True,
+              help='Only repair these auction ids (repeatable).')
+def repair_bid_aggregates_command(auction_ids):
+    """Recompute Auction bid counts and highest bids from the live and archived bids."""
+    from bidding import recompute_bid_aggregates
+
+    updated = recompute_bid_aggregates(list(auction_ids) or None)
+    click.echo(f'Recomputed bid aggregates for {updated} auctions.')
+
+
+@app.cli.command('archive-bids')
+@click.option('--batch-size', type=int, default=None, help='Auctions per transaction.')
+@click.option('--after-hours', type=int, default=None,
+              help='Only auctions finished at least this long ago (BID_ARCHIVE_AFTER_HOURS).')
+def archive_bids_command(batch_size, after_hours):
+    """Move the bids of finished auctions out of the hot bid table."""
+    import archive
+
+    started = time.perf_counter()
+    auctions, bids, _ = archive.archive_due(batch_size, after_hours)
+    click.echo(f'Archived {bids} bids from {auctions} auctions in {time.perf_counter() - started:.3f}s.')
+
+
+@app.cli.command('import-auctions')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--seller', required=True, help='Email of the seller the auctions belong to.')
+@click.option('--images', 'image_dir', type=click.Path(exists=True, file_okay=False), default=None,
+              help='Directory the rows\' image paths are relative to.')
+@click.option('--batch-size', type=int, default=None, help='Rows per transaction (IMPORT_BATCH_SIZE).')
+def import_auctions_command(path, seller, image_dir, batch_size):
+    """Import auctions from a CSV or JSON-lines file and list the rejected rows."""
+    from app import db
+    from models import User
+    import importer
+
+    user = db.session.execute(db.select(User).where(User.email == seller)).scalar()
+    if user is None or not user.can_sell():
+        raise click.ClickException(f'{seller} is not a seller.')
+    started = time.perf_counter()
+    try:
+        with open(path, 'rb') as fh:
+            report = importer.import_auctions(
+                fh, user.id, importer.format_for(path),
+                status='pending' if user.role != 'admin' else 'active',
+                image_dir=image_dir, batch_size=batch_size)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for line, message in sorted(report.errors):
+        click.echo(f'line {line}: {message}')
+    if report.unlisted:
+        click.echo(f'... and {report.unlisted} more rejected rows.')
+    if report.stopped:
+        click.echo(f'Stopped at line {report.stopped[0]}: {report.stopped[1]}')
+    click.echo(f'Imported {report.imported} of {report.rows} rows '
+               f'({report.rejected} rejected) in {time.perf_counter() - started:.1f}s.')
+
+
+@app.cli.command('rebuild-dashboards')
+def rebuild_dashboards_command():
+    """Recompute the seller and buyer dashboard stats from auctions and bids."""
+    import dashboards
+
+    users = dashboards.rebuild()
+    click.echo(f'Rebuilt dashboard stats for {users} users.')
+
+
+@app.cli.command('rebuild-category-counts')
+def rebuild_category_counts_command():
+    """Recount the active auctions in each category."""
+    import catalog
+
+    categories = catalog.rebuild()
+    click.echo(f'Recounted active auctions for {categories} categories.')
+
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Re-index every auction for full-text search."""
+    import search
+
+    search.rebuild()
+    click.echo('Search index rebuilt.')
+
+
+@app.cli.command('close-auctions')
+@click.option('--batch-size', type=int, default=None, help='Auctions closed per transaction.')
+@click.option('--watch', is_flag=True, help='Keep running and close auctions as they end.')
+def close_auctions_command(batch_size, watch):
+    """Close ended auctions and notify winners and sellers."""
+    import closer
+
+    batch_size = batch_size or app.config['AUCTION_CLOSER_BATCH_SIZE']
+    if not watch:
+        closed, seconds = closer.close_all_due(batch_size)
+        rate = closed / seconds if seconds else 0.0
+        click.echo(f'Closed {closed} auctions in {seconds:.3f}s ({rate:.1f}/s).')
+        return
+
+    worker = closer.AuctionCloser(app, batch_size=batch_size)
+    click.echo('Watching for ended auctions (Ctrl+C to stop)...')
+    try:
+        while True:
+            delay = worker.run_once()
+            if worker.last_run['closed']:
+                click.echo(f'Closed {worker.last_run["closed"]} auctions '
+                           f'({worker.last_run["closed_per_second"]}/s), {worker.closed_total} total.')
+                worker.last_run = {'closed': 0, 'seconds': 0.0, 'closed_per_second': 0.0}
+            time.sleep(delay)
+    except KeyboardInterrupt:
+        pass
+
+
+@app.cli.command('outbox-worker')
+@click.option('--once', is_flag=True, help='Drain pending events once and exit.')
+@click.option('--batch-size', type=int, default=500)
+@click.option('--interval', type=float, default=1.0, help='Seconds between drains.')
+def outbox_worker_command(once, batch_size, interval):
+    """Deliver queued notifications and emails."""
+    import outbox
+
+    worker = outbox.OutboxWorker(app, batch_size=batch_size, interval=interval)
+    if once:
+        click.echo(worker.run_once())
+        return
+    click.echo('Draining the outbox (Ctrl+C to stop)...')
+    try:
+        while True:
+            totals = worker.run_once()
+            if (totals['events'] or totals['emails_sent'] or totals['emails_failed']
+                    or totals.get('notifications_purged')):
+                click.echo(totals)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+
+@app.cli.command('purge-notifications')
+@click.option('--days', type=int, default=None,
+              help='Keep read notifications this many days (default NOTIFICATION_RETENTION_DAYS).')
+@click.option('--batch-size', type=int, default=None, help='Rows deleted per transaction.')
+def purge_notifications_command(days, batch_size):
+    """Delete old read notifications in batches."""
+    import inbox
+
+    started = time.perf_counter()
+    deleted = inbox.purge(days, batch_size)
+    click.echo(f'Deleted {deleted} read notifications in {time.perf_counter() - started:.3f}s.')
+
+
+@app.cli.command('migrate-images')
+def migrate_images_command():
+    """Move images uploaded before the image store into it and render their variants."""
+    import os
+    from app import db
+    from models import Auction
+    import images
+
+    upload_folder = os.path.join(app.root_path, app.config['UPLOAD_FOLDER'])
+    moved = missing = 0
+    for auction in Auction.query.filter(Auction.image_filename.isnot(None)).all():
+        if images.STORED_NAME.match(auction.image_filename):
+            continue
+        path = os.path.join(upload_folder, auction.image_filename)
+        try:
+            with open(path, 'rb') as fh:
+                name = images.store(fh)
+        except (OSError, ValueError) as e:
+            click.echo(f'Skipping auction {auction.id}: {e}')
+            missing += 1
+            continue
+        images.render(name)
+        auction.image_filename = name
+        db.session.commit()
+        moved += 1
+    click.echo(f'Moved {moved} images into the store ({missing} skipped).')
@@ -0,0 +1,269 @@
+"""Per-user dashboard read models, kept current as bids land and auctions change.
+
+``UserStats`` holds one row of counters per user: their auctions by
+status, bids received, revenue, bids placed, live auctions they are
+winning or have been outbid on, auctions won and money spent, and their
+unread notifications for the navbar badge.  ``BidPosition`` holds one
+row per bidder per auction they bid on and flags the current leader.  The
+dashboards read a stats row by primary key and one page of rows through
+an index, however long the user's history.
+
+Counters only ever change by deltas.  Code that changes an auction calls
+:func:`add` (or one of the ``record_*`` helpers) inside its transaction,
+and the deltas are written just before that transaction commits, as one
+multi-row ``INSERT ... ON CONFLICT DO UPDATE SET x = user_stats.x +
+excluded.x``.  A rolled-back bid leaves no trace, and concurrent writers
+add to each other's counts instead of overwriting them.  Rows are written
+in user id order, so two transactions lock shared users in the same order.
+
+:func:`rebuild` recomputes both tables from ``Auction``, the live and
+archived bids and ``Notification`` (``flask rebuild-dashboards``).
+"""
+from sqlalchemy import (select, update, insert, delete, func, case, literal, union_all, and_,
+                        false, event)
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from models import Auction, ArchivedBid, Bid, BidPosition, Notification, UserStats
+from money import cents
+
+STAT_COLUMNS = (
+    'auctions_pending', 'auctions_active', 'auctions_completed', 'auctions_cancelled',
+    'bids_received', 'bid_amount_received', 'revenue',
+    'bids_placed', 'auctions_winning', 'auctions_outbid', 'auctions_won', 'total_spent',
+    'notifications_unread',
+)
+
+_UPSERT_DIALECTS = {'sqlite': sqlite, 'postgresql': postgresql}
+
+# session.info key of the deltas waiting for the current transaction to commit
+_PENDING = 'dashboard_deltas'
+
+# Rows per upsert, well under SQLite's parameter limit
+_CHUNK = 500
+
+
+def add(user_id, **deltas):
+    """Add ``deltas`` to ``user_id``'s counters when the current transaction commits."""
+    if user_id is None:
+        return
+    pending = db.session.info.setdefault(_PENDING, {}).setdefault(user_id, {})
+    for column, delta in deltas.items():
+        pending[column] = pending.get(column, 0) + delta
+
+
+def stats_for(user_id):
+    """``user_id``'s :class:`UserStats`, all zeros if they have done nothing yet."""
+    stats = db.session.get(UserStats, user_id)
+    if stats is None:
+        stats = UserStats(user_id=user_id, **dict.fromkeys(STAT_COLUMNS, 0))
+    return stats
+
+
+def record_created(seller_id, status, count=1):
+    """Count ``count`` new auctions in ``status`` for ``seller_id``."""
+    add(seller_id, **{f'auctions_{status}': count})
+
+
+def record_bid(auction_id, seller_id, bidder_id, amount, now):
+    """Move the lead on ``auction_id`` to ``bidder_id`` and count the bid.
+
+    Call inside the bid's transaction, after the auction row was claimed
+    (which serialises bids on it).  Costs two statements: one takes the
+    lead off the previous leader, one upserts the bidder's position.
+    """
+    displaced = db.session.execute(
+        update(BidPosition)
+        .where(BidPosition.auction_id == auction_id, BidPosition.is_leading.is_(True),
+               BidPosition.user_id != bidder_id)
+        .values(is_leading=False)
+        .returning(BidPosition.user_id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    bid_count = _upsert_position(auction_id, bidder_id, amount, now)
+
+    add(seller_id, bids_received=1, bid_amount_received=amount)
+    if bid_count == 1:
+        add(bidder_id, bids_placed=1, auctions_winning=1)
+    elif displaced:
+        add(bidder_id, bids_placed=1, auctions_winning=1, auctions_outbid=-1)
+    else:
+        # Raising their own lead
+        add(bidder_id, bids_placed=1)
+    for user_id in displaced:
+        add(user_id, auctions_winning=-1, auctions_outbid=1)
+
+
+def _upsert_position(auction_id, user_id, amount, now):
+    """Record a bid in the bidder's position and return their bid count on the auction."""
+    values = {'auction_id': auction_id, 'user_id': user_id, 'bid_count': 1,
+              'last_amount': amount, 'last_bid_at': now, 'is_leading': True}
+    dialect = _UPSERT_DIALECTS.get(db.engine.dialect.name)
+    if dialect is not None:
+        stmt = dialect.insert(BidPosition).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['auction_id', 'user_id'],
+            set_={'bid_count': BidPosition.bid_count + 1,
+                  'last_amount': stmt.excluded.last_amount,
+                  'last_bid_at': stmt.excluded.last_bid_at,
+                  'is_leading': True},
+        )
+        return db.session.execute(stmt.returning(BidPosition.bid_count)).scalar()
+    bid_count = db.session.execute(
+        update(BidPosition)
+        .where(BidPosition.auction_id == auction_id, BidPosition.user_id == user_id)
+        .values(bid_count=BidPosition.bid_count + 1, last_amount=amount, last_bid_at=now,
+                is_leading=True)
+        .returning(BidPosition.bid_count)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    if bid_count is None:
+        db.session.execute(insert(BidPosition).values(values))
+        bid_count = 1
+    return bid_count
+
+
+def _retire_positions(auction_ids):
+    """Take every position on ``auction_ids`` off the live winning/outbid counts."""
+    for user_id, is_leading, count in db.session.execute(
+        select(BidPosition.user_id, BidPosition.is_leading, func.count())
+        .where(BidPosition.auction_id.in_(auction_ids))
+        .group_by(BidPosition.user_id, BidPosition.is_leading)
+    ):
+        add(user_id, **{'auctions_winning' if is_leading else 'auctions_outbid': -count})
+
+
+def record_closed(rows):
+    """Count auctions the closer completed.
+
+    ``rows`` carry ``id``, ``seller_id``, ``highest_bidder_id`` and
+    ``highest_bid_amount`` as the closing UPDATE returned them.
+    """
+    if not rows:
+        return
+    _retire_positions([row.id for row in rows])
+    for row in rows:
+        add(row.seller_id, auctions_active=-1, auctions_completed=1)
+        if row.highest_bidder_id:
+            add(row.seller_id, revenue=row.highest_bid_amount)
+            add(row.highest_bidder_id, auctions_won=1, total_spent=row.highest_bid_amount)
+
+
+def record_status_change(rows, old_status, new_status):
+    """Count auctions (``id`` and ``seller_id`` rows) moved from ``old_status`` to ``new_status``."""
+    if not rows:
+        return
+    if old_status == 'active':
+        _retire_positions([row.id for row in rows])
+    for row in rows:
+        add(row.seller_id, **{f'auctions_{old_status}': -1, f'auctions_{new_status}': 1})
+
+
+@event.listens_for(db.session, 'before_commit')
+def _write_deltas(session):
+    pending = session.info.pop(_PENDING, None)
+    if not pending:
+        return
+    rows = [{'user_id': user_id, **{c: deltas.get(c, 0) for c in STAT_COLUMNS}}
+            for user_id, deltas in sorted(pending.items()) if any(deltas.values())]
+    dialect = _UPSERT_DIALECTS.get(db.engine.dialect.name)
+    for i in range(0, len(rows), _CHUNK):
+        chunk = rows[i:i + _CHUNK]
+        if dialect is not None:
+            stmt = dialect.insert(UserStats).values(chunk)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['user_id'],
+                set_={c: getattr(UserStats, c) + getattr(stmt.excluded, c) for c in STAT_COLUMNS},
+            )
+            session.execute(stmt)
+            continue
+        for row in chunk:
+            changed = session.execute(
+                update(UserStats)
+                .where(UserStats.user_id == row['user_id'])
+                .values({c: getattr(UserStats, c) + row[c] for c in STAT_COLUMNS})
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not changed:
+                session.execute(insert(UserStats).values(row))
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _drop_deltas(session, previous_transaction):
+    session.info.pop(_PENDING, None)
+
+
+def needs_rebuild():
+    """True when there are auctions but no stats yet, e.g. just after the tables were added."""
+    return (db.session.execute(select(UserStats.user_id).limit(1)).first() is None
+            and db.session.execute(select(Auction.id).limit(1)).first() is not None)
+
+
+def rebuild():
+    """Recompute ``BidPosition`` and ``UserStats`` from ``Auction``, the bids and ``Notification``.
+
+    Runs as a handful of set-based statements in one transaction.  Bids
+    committed while it runs may be counted twice or not at all, so run it
+    on a quiet database (or run it again).  Returns the number of users
+    with stats.
+    """
+    # Live and archived bids alike (see archive.py)
+    bids = union_all(*[
+        select(model.auction_id, model.bidder_id, model.amount, model.timestamp)
+        for model in (Bid, ArchivedBid)
+    ]).subquery('bids')
+
+    db.session.execute(delete(BidPosition))
+    db.session.execute(insert(BidPosition).from_select(
+        ['auction_id', 'user_id', 'bid_count', 'last_amount', 'last_bid_at', 'is_leading'],
+        # A bidder's bids on an auction only ever go up, so their last is their highest
+        select(bids.c.auction_id, bids.c.bidder_id, func.count(), func.max(cents(bids.c.amount)),
+               func.max(bids.c.timestamp),
+               case((Auction.highest_bidder_id == bids.c.bidder_id, True), else_=False))
+        .join(Auction, bids.c.auction_id == Auction.id)
+        .group_by(bids.c.auction_id, bids.c.bidder_id, Auction.highest_bidder_id)
+    ))
+
+    def part(user_id, **values):
+        return select(user_id.label('user_id'),
+                      *[values.get(c, literal(0)).label(c) for c in STAT_COLUMNS])
+
+    def in_status(status):
+        return func.sum(case((Auction.status == status, 1), else_=0))
+
+    won = and_(Auction.status == 'completed', Auction.winner_id.isnot(None))
+    parts = union_all(
+        part(Auction.seller_id,
+             auctions_pending=in_status('pending'), auctions_active=in_status('active'),
+             auctions_completed=in_status('completed'), auctions_cancelled=in_status('cancelled'),
+             revenue=func.sum(case((won, cents(Auction.current_bid)), else_=0)))
+        .group_by(Auction.seller_id),
+        part(Auction.seller_id, bids_received=func.count(),
+             bid_amount_received=func.sum(cents(bids.c.amount)))
+        .select_from(bids).join(Auction, bids.c.auction_id == Auction.id)
+        .group_by(Auction.seller_id),
+        part(bids.c.bidder_id, bids_placed=func.count())
+        .group_by(bids.c.bidder_id),
+        part(Auction.winner_id, auctions_won=func.count(),
+             total_spent=func.sum(cents(Auction.current_bid)))
+        .where(won)
+        .group_by(Auction.winner_id),
+        part(BidPosition.user_id,
+             auctions_winning=func.sum(case((BidPosition.is_leading, 1), else_=0)),
+             auctions_outbid=func.sum(case((BidPosition.is_leading, 0), else_=1)))
+        .join(Auction, BidPosition.auction_id == Auction.id)
+        .where(Auction.status == 'active')
+        .group_by(BidPosition.user_id),
+        part(Notification.user_id, notifications_unread=func.count())
+        .where(Notification.is_read == false())
+        .group_by(Notification.user_id),
+    ).subquery()
+
+    db.session.execute(delete(UserStats))
+    result = db.session.execute(insert(UserStats).from_select(
+        ['user_id', *STAT_COLUMNS],
+        select(parts.c.user_id, *[func.sum(parts.c[c]) for c in STAT_COLUMNS])
+        .group_by(parts.c.user_id)
+    ))
+    db.session.commit()
+    return result.rowcount
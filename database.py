@@ -0,0 +1,182 @@
+"""Backend-aware engine settings, SQLite write queue and read-replica routing.
+
+:func:`engine_options` turns the ``DB_*`` / ``SQLITE_*`` settings into the
+``SQLALCHEMY_ENGINE_OPTIONS`` (and ``SQLALCHEMY_BINDS``) for the backend in
+``DATABASE_URL``:
+
+* SQLite: every connection is switched to ``SQLITE_JOURNAL_MODE`` (WAL by
+  default, so readers never wait for the writer) with
+  ``SQLITE_SYNCHRONOUS`` (``NORMAL``: fsync at checkpoints, not on every
+  commit) and waits ``SQLITE_BUSY_TIMEOUT_MS`` for a lock instead of
+  failing with "database is locked".  SQLite still allows one writer at a
+  time, so with ``SQLITE_WRITE_QUEUE`` writers in the same process queue
+  on a lock from their first write to their commit or rollback, instead
+  of polling in SQLite's busy handler with growing sleeps.
+* PostgreSQL (and other servers): a pool of ``DB_POOL_SIZE`` connections
+  plus ``DB_MAX_OVERFLOW``, recycled and pinged before use, and a
+  server-side ``statement_timeout`` of ``DB_STATEMENT_TIMEOUT_MS``.
+
+Under gevent workers (gunicorn.conf.py) psycopg2 waits for the server on
+the gevent hub, so a slow query only holds up its own request and not the
+live streams sharing the worker.
+
+With ``DATABASE_REPLICA_URL`` set, :class:`RoutingSession` sends the reads
+of ``GET`` requests to ``DATABASE_REPLICA_ENDPOINTS`` to the replica.  Those
+pages may then lag the primary by the replication delay; live updates and
+the next bid correct them.
+"""
+import logging
+import sys
+import threading
+
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+REPLICA = 'replica'
+
+# Statements that make SQLite take the write lock
+_WRITES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'CREATE', 'DROP', 'ALTER')
+
+
+def _server_options(config):
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': True,
+    }
+    timeout = config['DB_STATEMENT_TIMEOUT_MS']
+    if timeout:
+        # Understood by psycopg2 and psycopg 3
+        options['connect_args'] = {'options': f'-c statement_timeout={int(timeout)}'}
+    return options
+
+
+def _options(url, config):
+    if make_url(url).get_backend_name() == 'sqlite':
+        # Per-connection PRAGMAs are applied by init_app; the pool itself
+        # is left to Flask-SQLAlchemy's SQLite defaults
+        return {'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000}}
+    return _server_options(config)
+
+
+def engine_options(config):
+    """Engine options for ``SQLALCHEMY_DATABASE_URI``; also sets up the replica bind."""
+    replica_url = config.get('DATABASE_REPLICA_URL')
+    if replica_url:
+        config.setdefault('SQLALCHEMY_BINDS', {})[REPLICA] = {
+            'url': replica_url, **_options(replica_url, config)}
+    return _options(config['SQLALCHEMY_DATABASE_URI'], config)
+
+
+class WriteQueue:
+    """Let one connection at a time write to a SQLite database.
+
+    Taken before a connection's first write statement and held until its
+    transaction ends, which is exactly how long SQLite holds its own write
+    lock.  Waiters give up after ``timeout`` seconds and fall through to
+    SQLite's busy handler, so a stuck writer cannot wedge the process.
+    """
+
+    def __init__(self, engine, timeout):
+        self.engine = engine
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'commit', self._release)
+        event.listen(engine, 'rollback', self._release)
+        event.listen(engine, 'checkin', self._checkin)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        info = conn.info
+        if info.get('write_queue') or not statement.lstrip()[:7].upper().startswith(_WRITES):
+            return
+        if self._lock.acquire(timeout=self.timeout):
+            info['write_queue'] = True
+        else:
+            logger.warning('Waited %.1fs for the SQLite write queue; writing anyway', self.timeout)
+
+    def _release(self, conn):
+        self._unlock(conn.info)
+
+    def _checkin(self, dbapi_connection, connection_record):
+        # A session closed without commit or rollback resets the connection here
+        self._unlock(connection_record.info)
+
+    def _unlock(self, info):
+        if info.pop('write_queue', False):
+            self._lock.release()
+
+
+def _sqlite_pragmas(config):
+    pragmas = [f'PRAGMA busy_timeout = {int(config["SQLITE_BUSY_TIMEOUT_MS"])}']
+    if config['SQLITE_JOURNAL_MODE']:
+        pragmas.append(f'PRAGMA journal_mode = {config["SQLITE_JOURNAL_MODE"]}')
+    if config['SQLITE_SYNCHRONOUS']:
+        pragmas.append(f'PRAGMA synchronous = {config["SQLITE_SYNCHRONOUS"]}')
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+    return on_connect
+
+
+def _gevent_patched():
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('socket')
+
+
+def _gevent_wait(conn, timeout=None):
+    """psycopg2 wait callback that yields to other greenlets while the server works."""
+    from gevent.socket import wait_read, wait_write
+    from psycopg2 import extensions, OperationalError
+
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            return
+        if state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise OperationalError(f'Bad result from poll: {state!r}')
+
+
+def init_app(app, db):
+    """Attach the SQLite connection settings and write queue to the app's engines."""
+    with app.app_context():
+        engines = db.engines
+    for engine in engines.values():
+        if engine.dialect.driver == 'psycopg2' and _gevent_patched():
+            from psycopg2 import extensions
+            extensions.set_wait_callback(_gevent_wait)
+        if engine.dialect.name != 'sqlite':
+            continue
+        event.listen(engine, 'connect', _sqlite_pragmas(app.config))
+        if app.config['SQLITE_WRITE_QUEUE']:
+            WriteQueue(engine, app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000)
+
+
+class RoutingSession(Session):
+    """``db.session`` that reads from the replica on read-only pages."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and _reads_from_replica():
+            replica = self._db.engines.get(REPLICA)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _reads_from_replica():
+    return (has_request_context()
+            and request.method in ('GET', 'HEAD')
+            and request.endpoint in current_app.config['DATABASE_REPLICA_ENDPOINTS'])
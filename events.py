@@ -0,0 +1,170 @@
+"""Publish/subscribe fan-out for live auction updates.
+
+Writers call :meth:`Broker.publish` after their transaction commits; the
+``/auction/<id>/stream`` endpoint holds a :class:`Subscription` per open
+page.  A subscription is only a bounded queue, so idle viewers cost memory
+rather than threads: gunicorn.conf.py runs gevent workers, where a
+waiting stream is a parked greenlet, so each worker holds thousands of
+them.  ``benchmarks/event_fanout.py`` measures a served worker doing so.
+
+The backend decides how far a published event travels:
+
+* ``local`` (default) delivers to subscribers in the publishing process.
+* ``redis`` relays through Redis pub/sub so every worker sees every event.
+  One listener thread per worker feeds the local fan-out.  Requires the
+  ``redis`` package; a Redis on localhost is enough for several workers on
+  one machine.
+"""
+import json
+import logging
+import queue
+import threading
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """A single listener's bounded inbox on one channel."""
+
+    def __init__(self, broker, channel, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.queue = queue.Queue(maxsize)
+        # Set when events were dropped because the reader fell behind
+        self.overflowed = False
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout=None):
+        """Return the next message, or ``None`` if ``timeout`` expires first."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBackend:
+    """Deliver events to subscribers in this process only."""
+
+    def start(self, deliver):
+        self._deliver = deliver
+
+    def publish(self, channel, message):
+        self._deliver(channel, message)
+
+
+class RedisBackend:
+    """Relay events through Redis pub/sub so all workers receive them."""
+
+    prefix = 'bidblitz:'
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError('EVENTS_BACKEND=redis requires the redis package') from exc
+        self.client = redis.Redis.from_url(url)
+
+    def start(self, deliver):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(f'{self.prefix}*')
+
+        def listen():
+            for item in pubsub.listen():
+                channel = item['channel'].decode()[len(self.prefix):]
+                deliver(channel, json.loads(item['data']))
+
+        threading.Thread(target=listen, name='events-redis', daemon=True).start()
+
+    def publish(self, channel, message):
+        self.client.publish(f'{self.prefix}{channel}', json.dumps(message))
+
+
+class Broker:
+    """Channel-keyed fan-out to :class:`Subscription` objects."""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self.backend = None
+        self.queue_size = 100
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        name = app.config.setdefault('EVENTS_BACKEND', 'local')
+        self.queue_size = app.config.setdefault('EVENTS_QUEUE_SIZE', 100)
+        if name == 'redis':
+            backend = RedisBackend(app.config['EVENTS_REDIS_URL'])
+        elif name == 'local':
+            backend = LocalBackend()
+        else:
+            raise ValueError(f'Unknown EVENTS_BACKEND {name!r}')
+        self.use(backend)
+        app.extensions['events'] = self
+
+    def use(self, backend):
+        self.backend = backend
+        backend.start(self._deliver)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, self.queue_size)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            listeners = self._subscribers.get(subscription.channel)
+            if listeners is not None:
+                listeners.discard(subscription)
+                if not listeners:
+                    del self._subscribers[subscription.channel]
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._subscribers.get(channel, ()))
+            return sum(len(s) for s in self._subscribers.values())
+
+    def publish(self, channel, event, data, id=None):
+        """Send ``event`` to every subscriber of ``channel``.
+
+        Publishing never raises: a lost live update must not fail the
+        request that committed the change.
+        """
+        if self.backend is None:
+            return
+        try:
+            self.backend.publish(channel, {'event': event, 'data': data, 'id': id})
+        except Exception:
+            logger.exception('Failed to publish %s on %s', event, channel)
+
+    def _deliver(self, channel, message):
+        with self._lock:
+            listeners = list(self._subscribers.get(channel, ()))
+        for subscription in listeners:
+            subscription.put(message)
+
+
+broker = Broker()
+
+
+def auction_channel(auction_id):
+    return f'auction:{auction_id}'
+
+
+def format_sse(event, data, id=None):
+    """Encode one Server-Sent Events frame."""
+    frame = f'event: {event}\ndata: {json.dumps(data)}\n'
+    if id is not None:
+        frame = f'id: {id}\n' + frame
+    return frame + '\n'
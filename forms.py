@@ -1,9 +1,16 @@
 from flask_wtf import FlaskForm
-from flask_wtf.file import FileField, FileAllowed
-from wtforms import StringField, TextAreaField, FloatField, SelectField, PasswordField, DateTimeLocalField, HiddenField
+from flask_wtf.file import FileField, FileAllowed, FileRequired
+from wtforms import StringField, TextAreaField, DecimalField, SelectField, PasswordField, DateTimeLocalField, HiddenField
 from wtforms.validators import DataRequired, Email, Length, NumberRange, EqualTo, ValidationError
 from datetime import datetime, timezone
-from models import User, Category
+from decimal import Decimal
+from models import User
+from catalog import category_catalog
+from money import CENT
+
+def whole_cents(form, field):
+    if field.data is not None and field.data != field.data.quantize(CENT):
+        raise ValidationError('Amounts cannot have more than two decimal places.')
 
 class LoginForm(FlaskForm):
     email = StringField('Email', validators=[DataRequired(), Email()])
@@ -31,17 +38,18 @@ class RegisterForm(FlaskForm):
 class AuctionForm(FlaskForm):
     title = StringField('Title', validators=[DataRequired(), Length(min=5, max=200)])
     description = TextAreaField('Description', validators=[DataRequired(), Length(min=20)])
-    starting_bid = FloatField('Starting Bid ($)', validators=[DataRequired(), NumberRange(min=0.01)])
+    starting_bid = DecimalField('Starting Bid ($)', places=2,
+                                validators=[DataRequired(), NumberRange(min=Decimal('0.01')), whole_cents])
     category_id = SelectField('Category', coerce=int, validators=[DataRequired()])
     image = FileField('Product Image', validators=[
-        FileAllowed(['jpg', 'jpeg', 'png', 'gif'], 'Images only!')
+        FileAllowed(['jpg', 'jpeg', 'png', 'gif', 'webp'], 'Images only!')
     ])
     start_time = DateTimeLocalField('Start Time', validators=[DataRequired()], format='%Y-%m-%dT%H:%M')
     end_time = DateTimeLocalField('End Time', validators=[DataRequired()], format='%Y-%m-%dT%H:%M')
 
     def __init__(self, *args, **kwargs):
         super(AuctionForm, self).__init__(*args, **kwargs)
-        self.category_id.choices = [(c.id, c.name) for c in Category.query.all()]
+        self.category_id.choices = category_catalog.choices()
 
     def validate_start_time(self, start_time):
         if start_time.data < datetime.now():
@@ -52,25 +60,27 @@ class AuctionForm(FlaskForm):
             if end_time.data <= self.start_time.data:
                 raise ValidationError('End time must be after start time.')
 
+class AuctionImportForm(FlaskForm):
+    file = FileField('Listings File', validators=[
+        FileRequired(), FileAllowed(['csv', 'jsonl', 'ndjson'], 'CSV or JSON lines files only!')
+    ])
+
 class BidForm(FlaskForm):
-    amount = FloatField('Bid Amount ($)', validators=[DataRequired(), NumberRange(min=0.01)])
+    amount = DecimalField('Bid Amount ($)', places=2,
+                          validators=[DataRequired(), NumberRange(min=Decimal('0.01')), whole_cents])
     auction_id = HiddenField('Auction ID', validators=[DataRequired()])
 
-    def validate_amount(self, amount):
-        from models import Auction, Bid
-        auction = Auction.query.get(self.auction_id.data)
-        if not auction:
+    def validate_auction_id(self, auction_id):
+        # Auction state and minimum bid are checked atomically by bidding.place_bid
+        if not str(auction_id.data).isdigit():
             raise ValidationError('Invalid auction.')
-        
-        if not auction.is_active:
-            raise ValidationError('This auction is no longer active.')
-        
-        # Check if bid is higher than current highest bid or starting bid
-        highest_bid = auction.highest_bid
-        min_bid = highest_bid.amount if highest_bid else auction.starting_bid
-        
-        if amount.data <= min_bid:
-            raise ValidationError(f'Bid must be higher than ${min_bid:.2f}')
+
+class ProxyBidForm(FlaskForm):
+    max_amount = DecimalField('Maximum Bid ($)', places=2,
+                              validators=[DataRequired(), NumberRange(min=Decimal('0.01')), whole_cents])
+    auction_id = HiddenField('Auction ID', validators=[DataRequired()])
+
+    validate_auction_id = BidForm.validate_auction_id
 
 class CategoryForm(FlaskForm):
     name = StringField('Category Name', validators=[DataRequired(), Length(min=2, max=100)])
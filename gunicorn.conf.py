@@ -0,0 +1,17 @@
+"""Gunicorn settings, picked up from the working directory by ``gunicorn``.
+
+Every open auction page holds a Server-Sent Events stream (see events.py).
+A sync or threaded worker would tie up a thread per stream, so workers are
+gevent by default: an idle stream is a greenlet parked on its subscription
+queue, and one worker serves up to ``GUNICORN_WORKER_CONNECTIONS`` open
+connections, streams and page views together.  gevent patches the standard
+library when the worker starts; database.py and images.py adapt to it.
+"""
+import os
+
+wsgi_app = 'app:create_app()'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+# Open connections per gevent worker, live streams included
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 5000))
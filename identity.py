@@ -0,0 +1,140 @@
+"""Cache of who the signed-in user is, so page views skip the user lookup.
+
+Flask-Login asks :func:`app.load_user` for the user on every request that
+carries a session.  :class:`IdentityCache` answers from an in-process LRU
+of :class:`CachedUser` snapshots (id, username, email, role, active flag and
+unread notification count), which is all ``current_user`` is used for; a
+miss reads just those columns, joining the user's ``UserStats`` row by
+primary key for the count.
+
+Entries live for ``USER_CACHE_TTL`` seconds and are dropped as soon as an
+admin changes a user's role or deactivates them (:meth:`invalidate`), so
+in the worker that made the change it applies on the next request.  Other
+workers keep their copy until it expires: a deactivated user is locked out
+everywhere within ``USER_CACHE_TTL`` seconds.  New notifications and
+read-marking invalidate the user the same way, so the navbar badge costs
+no query on a hit.  ``USER_CACHE_TTL=0`` turns the cache off.
+"""
+import threading
+
+from flask_login import UserMixin
+
+from cache import LocalBackend
+
+
+class CachedUser(UserMixin):
+    """Read-only stand-in for ``models.User`` carried by ``current_user``."""
+
+    def __init__(self, id, username, email, role, is_active, unread_notifications=0):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.role = role
+        self._active = bool(is_active)
+        self.unread_notifications = unread_notifications
+
+    @property
+    def is_active(self):
+        return self._active
+
+    def __repr__(self):
+        return f'<CachedUser {self.username}>'
+
+    def can_sell(self):
+        return self.role in ['seller', 'admin']
+
+    def can_admin(self):
+        return self.role == 'admin'
+
+
+class IdentityCache:
+    """TTL + explicit-invalidation cache of :class:`CachedUser` snapshots."""
+
+    def __init__(self, app=None):
+        self.ttl = 30
+        self.backend = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.setdefault('USER_CACHE_TTL', 30)
+        max_entries = app.config.setdefault('USER_CACHE_MAX_ENTRIES', 10000)
+        self.backend = LocalBackend(max_entries) if self.ttl > 0 else None
+        app.extensions['identity_cache'] = self
+
+    def load(self, user_id):
+        """The :class:`CachedUser` for ``user_id``, or None if there is no such user."""
+        key = str(user_id)
+        if self.backend is not None:
+            snapshot = self.backend.get(key)
+            if snapshot is not None:
+                self._count(True)
+                return CachedUser(*snapshot)
+        self._count(False)
+
+        from app import db
+        from models import User, UserStats
+        row = db.session.execute(
+            db.select(User.id, User.username, User.email, User.role, User.is_active,
+                      db.func.coalesce(UserStats.notifications_unread, 0))
+            .outerjoin(UserStats, UserStats.user_id == User.id)
+            .where(User.id == user_id)
+        ).first()
+        if row is None:
+            return None
+        if self.backend is not None:
+            self.backend.set(key, tuple(row), self.ttl)
+        return CachedUser(*row)
+
+    def invalidate(self, *user_ids):
+        """Forget ``user_ids``; call after the change has committed."""
+        if self.backend is not None:
+            for user_id in user_ids:
+                self.backend.delete(str(user_id))
+        with self._lock:
+            self.invalidations += len(user_ids)
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = self.invalidations = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.backend) if self.backend is not None else 0,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+            'invalidations': self.invalidations,
+        }
+
+    def render_metrics(self):
+        """The hit/miss counters in the Prometheus text format."""
+        lines = []
+        for metric, help_text, value in (
+            ('user_cache_hits_total', 'Session user lookups served from the identity cache.',
+             self.hits),
+            ('user_cache_misses_total', 'Session user lookups that read the database.', self.misses),
+            ('user_cache_invalidations_total', 'Users dropped after a change to their snapshot.',
+             self.invalidations),
+        ):
+            lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter', f'{metric} {value}']
+        return '\n'.join(lines) + '\n'
+
+
+identity_cache = IdentityCache()
@@ -0,0 +1,212 @@
+"""Auction image storage and resizing.
+
+Uploads are stored once per content hash under ``IMAGE_FOLDER/originals``,
+so re-uploading the same photo costs nothing.  Originals are never served:
+pages use WebP variants sized for where they appear (:data:`SIZES`), with
+EXIF and other metadata dropped.  Variants are rendered by a small thread
+pool after the upload request returns; if a page asks for one that is not
+ready yet, :func:`variant_path` renders it on the spot.
+
+Variant URLs embed the content hash, so ``/media/...`` responses are served
+with a one-year ``immutable`` cache lifetime.  Auctions created before this
+pipeline keep their ``static/uploads`` file until ``flask migrate-images``
+moves them into the store.
+"""
+import hashlib
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, url_for
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# Longest edge in pixels; roughly twice the CSS size for high-DPI screens
+SIZES = {
+    'thumb': 96,
+    'card': 640,
+    'large': 1600,
+}
+
+FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+STORED_NAME = re.compile(r'^([0-9a-f]{64})\.(jpg|png|gif|webp)$')
+
+_executor = None
+_pending = {}
+_lock = threading.Lock()
+
+
+def image_folder():
+    return os.path.join(current_app.root_path, current_app.config['IMAGE_FOLDER'])
+
+
+def _original_path(folder, digest, ext):
+    return os.path.join(folder, 'originals', digest[:2], f'{digest}.{ext}')
+
+
+def _variant_path(folder, digest, size):
+    return os.path.join(folder, 'variants', digest[:2], f'{digest}-{size}.webp')
+
+
+def store(stream):
+    """Save an uploaded image and return its stored name ``<sha256>.<ext>``.
+
+    Raises :class:`ValueError` if the upload is not a supported image.
+    """
+    folder = image_folder()
+    os.makedirs(os.path.join(folder, 'originals'), exist_ok=True)
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(dir=os.path.join(folder, 'originals'), suffix='.upload')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: stream.read(64 * 1024), b''):
+                digest.update(chunk)
+                out.write(chunk)
+        try:
+            with Image.open(temp_path) as image:
+                image.verify()
+                ext = FORMATS.get(image.format)
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as exc:
+            raise ValueError('The uploaded file is not a valid image.') from exc
+        if ext is None:
+            raise ValueError('Images must be JPEG, PNG, GIF or WebP.')
+
+        digest = digest.hexdigest()
+        path = _original_path(folder, digest, ext)
+        if os.path.exists(path):
+            # Same bytes uploaded before; reuse the stored copy
+            os.unlink(temp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+        return f'{digest}.{ext}'
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def _render(folder, digest, ext, sizes):
+    """Write the WebP variants for one original; safe to run concurrently."""
+    # The same photo stored again already has its variants
+    sizes = [size for size in sizes if not os.path.exists(_variant_path(folder, digest, size))]
+    if not sizes:
+        return
+    sizes = sorted(sizes, key=SIZES.get, reverse=True)
+    longest = SIZES[sizes[0]]
+    with Image.open(_original_path(folder, digest, ext)) as source:
+        # JPEGs can be decoded straight at 1/2, 1/4 or 1/8 scale
+        scale = min(longest / max(source.size), 1)
+        source.draft('RGB', (int(source.width * scale), int(source.height * scale)))
+        # Apply the camera's rotation before the EXIF that carries it is dropped
+        image = ImageOps.exif_transpose(source)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+    image.info = {}
+    os.makedirs(os.path.join(folder, 'variants', digest[:2]), exist_ok=True)
+    # Largest first, each smaller variant resized from the one before
+    for size in sizes:
+        image.thumbnail((SIZES[size], SIZES[size]), Image.LANCZOS)
+        path = _variant_path(folder, digest, size)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.webp')
+        with os.fdopen(fd, 'wb') as out:
+            image.save(out, 'WEBP', quality=80, method=4)
+        os.replace(temp_path, path)
+
+
+def render(name):
+    """Render every variant of a stored image in the calling thread."""
+    match = STORED_NAME.match(name or '')
+    if match is not None:
+        _render(image_folder(), *match.groups(), list(SIZES))
+
+
+def _executor_for(app):
+    global _executor
+    with _lock:
+        if _executor is None:
+            monkey = sys.modules.get('gevent.monkey')
+            if monkey is not None and monkey.is_module_patched('threading'):
+                # Patched threads are greenlets; render on real threads so a
+                # resize does not stall every live stream in the worker
+                from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+                _executor = NativeThreadPoolExecutor(max_workers=app.config['IMAGE_WORKERS'])
+            else:
+                _executor = ThreadPoolExecutor(max_workers=app.config['IMAGE_WORKERS'],
+                                               thread_name_prefix='images')
+        return _executor
+
+
+def process_async(name):
+    """Queue variant rendering for a stored image and return the future."""
+    match = STORED_NAME.match(name or '')
+    if match is None:
+        return None
+    digest, ext = match.groups()
+    folder = image_folder()
+    executor = _executor_for(current_app)
+    with _lock:
+        future = _pending.get(digest)
+        if future is not None:
+            return future
+        future = _pending[digest] = executor.submit(_render, folder, digest, ext, list(SIZES))
+
+    def done(f):
+        # Runs on gevent's hub under gevent workers, where it must not block;
+        # a new future for this digest is only made once this one is gone
+        _pending.pop(digest, None)
+        if f.exception() is not None:
+            logger.error('Rendering variants for %s failed: %s', name, f.exception())
+
+    future.add_done_callback(done)
+    return future
+
+
+def find_original(digest):
+    """Return the extension of the stored original for ``digest``, or ``None``."""
+    directory = os.path.join(image_folder(), 'originals', digest[:2])
+    for ext in FORMATS.values():
+        if os.path.exists(os.path.join(directory, f'{digest}.{ext}')):
+            return ext
+    return None
+
+
+def variant_path(digest, size):
+    """Path of a variant, rendering it now if the pool has not got to it yet.
+
+    Returns ``None`` for an unknown image or size.
+    """
+    if size not in SIZES or not re.fullmatch(r'[0-9a-f]{64}', digest):
+        return None
+    folder = image_folder()
+    path = _variant_path(folder, digest, size)
+    if os.path.exists(path):
+        return path
+    with _lock:
+        future = _pending.get(digest)
+    try:
+        if future is not None:
+            future.result(timeout=30)
+        else:
+            ext = find_original(digest)
+            if ext is None:
+                return None
+            _render(folder, digest, ext, [size])
+    except Exception:
+        logger.exception('Could not render %s variant of %s', size, digest)
+        return None
+    return path
+
+
+def image_url(name, size='card'):
+    """URL for an auction image at ``size``; used by the templates."""
+    match = STORED_NAME.match(name or '')
+    if match is None:
+        # Uploaded before the image store existed
+        return url_for('static', filename='uploads/' + name)
+    return url_for('media', digest=match.group(1), size=size)
@@ -0,0 +1,299 @@
+"""Bulk auction import from CSV or JSON lines.
+
+Sellers with a large inventory upload one file (``/auctions/import``) or
+run ``flask import-auctions`` instead of filling in the create form once
+per item.  :func:`import_auctions` reads the file a row at a time and
+checks each row with the create form's rules (:func:`validate_row`):
+title, description, starting bid, a category by id or name from the
+category catalog, and a start time in the future before the end time.
+Valid rows are inserted ``IMPORT_BATCH_SIZE`` at a time, one ``INSERT``
+and one commit per batch, with the dashboard and category counters moved
+in the same transaction as the form does for a single auction.
+
+A row may name an image file under the image directory given to the
+command (uploads through the site cannot reference files).  Each batch's
+images are stored and rendered by a pool of ``IMAGE_WORKERS`` threads
+before the batch is inserted.  A file shared by many rows is read once
+while it is among the last ``RECENT_IMAGES`` names seen; one that comes
+back later is only hashed again, since stored images are keyed by their
+content.  A row whose image cannot be read is rejected.  Only one batch
+is in flight at a time and the name cache is bounded, so memory stays
+flat however long the file is.
+
+The :class:`ImportReport` that comes back counts the rows read, imported
+and rejected, and lists the first ``IMPORT_MAX_ERRORS`` rejected rows with
+their line number and reason.  A line that cannot be decoded or parsed as
+CSV ends the import there; earlier batches stay committed and the report
+says where reading stopped.
+"""
+import csv
+import json
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+
+from flask import current_app
+from PIL import Image
+from sqlalchemy import insert
+
+from app import db
+from cache import cache
+from catalog import category_catalog
+from models import Auction
+from money import CENT
+import catalog
+import dashboards
+import images
+
+COLUMNS = ('title', 'description', 'starting_bid', 'category', 'start_time', 'end_time', 'image')
+REQUIRED = COLUMNS[:-1]
+
+# Image names an import remembers the stored name of; least recently used go first
+RECENT_IMAGES = 10000
+
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+
+class ImportReport:
+    """Rows read, imported and rejected, with the first rejections' reasons."""
+
+    def __init__(self, max_errors=1000):
+        self.max_errors = max_errors
+        self.rows = 0
+        self.imported = 0
+        self.rejected = 0
+        self.errors = []
+        # (line, reason) where reading gave up, leaving the rest of the file unread
+        self.stopped = None
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line, message))
+
+    def stop(self, line, message):
+        self.stopped = (line, message)
+
+    @property
+    def unlisted(self):
+        """Rejected rows beyond the ones kept in :attr:`errors`."""
+        return self.rejected - len(self.errors)
+
+
+def format_for(filename):
+    """``'csv'`` or ``'jsonl'`` from a file name; raises :class:`ValueError` otherwise."""
+    fmt = FORMATS.get(os.path.splitext(filename or '')[1].lower())
+    if fmt is None:
+        raise ValueError('Import files must be .csv or .jsonl.')
+    return fmt
+
+
+def _rows(stream, fmt, report):
+    """Yield ``(line number, dict)`` for each row of a binary ``stream``.
+
+    Raises :class:`ValueError` if the file cannot be read up to its first
+    row.  A line that cannot be read after that ends the import there: it
+    is recorded with :meth:`ImportReport.stop`, since the rows before it
+    may already be committed.
+    """
+    position = [0]
+
+    def lines():
+        # Decoded a line at a time so a bad byte is pinned to its line
+        for number, raw in enumerate(stream, 1):
+            position[0] = number
+            yield raw.decode('utf-8-sig' if number == 1 else 'utf-8')
+
+    started = False
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(lines())
+            missing = set(REQUIRED) - set(reader.fieldnames or ())
+            if missing:
+                raise ValueError(f'Missing columns: {", ".join(sorted(missing))}.')
+            for row in reader:
+                started = True
+                yield reader.line_num, row
+        else:
+            for line in lines():
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line, parse_float=Decimal)
+                except ValueError:
+                    row = None
+                started = True
+                yield position[0], row if isinstance(row, dict) else None
+        return
+    except UnicodeDecodeError:
+        reason = 'Not UTF-8 text'
+    except csv.Error as exc:
+        reason = f'Not valid CSV ({exc})'
+    if not started:
+        raise ValueError(f'Line {position[0]}: {reason}; import files must be UTF-8 '
+                         f'CSV or JSON lines.')
+    report.stop(position[0], f'{reason}; the rest of the file was not read.')
+
+
+def _text(row, name):
+    value = row.get(name)
+    return str(value).strip() if value is not None else ''
+
+
+def _datetime(row, name):
+    value = _text(row, name)
+    if not value:
+        raise ValueError(f'{name} is required.')
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{name} must be a date and time like 2030-01-31T18:00.') from None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def validate_row(row, categories):
+    """Column values for an ``Auction`` insert, checked as ``forms.AuctionForm`` does.
+
+    ``categories`` maps category ids and lower-cased names to ids.  Raises
+    :class:`ValueError` with the reason a row is rejected.
+    """
+    if row is None:
+        raise ValueError('Not a JSON object.')
+    title = _text(row, 'title')
+    if not 5 <= len(title) <= 200:
+        raise ValueError('title must be between 5 and 200 characters long.')
+    description = _text(row, 'description')
+    if len(description) < 20:
+        raise ValueError('description must be at least 20 characters long.')
+    try:
+        starting_bid = Decimal(_text(row, 'starting_bid'))
+    except InvalidOperation:
+        starting_bid = None
+    if starting_bid is None or not starting_bid.is_finite():
+        raise ValueError('starting_bid must be a number.')
+    if starting_bid < Decimal('0.01'):
+        raise ValueError('starting_bid must be at least 0.01.')
+    if starting_bid != starting_bid.quantize(CENT):
+        raise ValueError('Amounts cannot have more than two decimal places.')
+    category = _text(row, 'category')
+    category_id = categories.get(category.lower())
+    if category_id is None:
+        raise ValueError(f'Unknown category {category!r}.')
+    start_time = _datetime(row, 'start_time')
+    if start_time < datetime.now():
+        raise ValueError('Start time must be in the future.')
+    end_time = _datetime(row, 'end_time')
+    if end_time <= start_time:
+        raise ValueError('End time must be after start time.')
+    return {
+        'title': title,
+        'description': description,
+        'starting_bid': starting_bid,
+        'category_id': category_id,
+        'start_time': start_time,
+        'end_time': end_time,
+        'image_filename': _text(row, 'image') or None,
+    }
+
+
+def _store_image(app, image_dir, name):
+    """Store and render the image ``name`` under ``image_dir``; returns its stored name."""
+    root = os.path.realpath(image_dir)
+    path = os.path.realpath(os.path.join(root, name))
+    if not path.startswith(root + os.sep):
+        raise ValueError(f'Image {name!r} is outside the image directory.')
+    with app.app_context():
+        try:
+            with open(path, 'rb') as fh:
+                stored = images.store(fh)
+            images.render(stored)
+        except (Image.DecompressionBombError, OSError, SyntaxError):
+            raise ValueError(f'Cannot read image {name!r}.') from None
+    return stored
+
+
+def _insert_batch(batch, seller_id, status, image_dir, pool, stored, report):
+    """Store the batch's images, then insert its rows in one transaction.
+
+    ``stored`` maps the last ``RECENT_IMAGES`` image paths seen during
+    this import to the future of their stored name, so a photo shared by
+    many rows is read once.
+    """
+    app = current_app._get_current_object()
+    for _, values in batch:
+        name = values['image_filename']
+        if not name:
+            continue
+        if name in stored:
+            stored.move_to_end(name)
+        else:
+            stored[name] = pool.submit(_store_image, app, image_dir, name)
+    kept = []
+    for line, values in batch:
+        name = values['image_filename']
+        if name:
+            try:
+                values['image_filename'] = stored[name].result()
+            except ValueError as exc:
+                report.reject(line, str(exc))
+                continue
+        kept.append((line, values))
+    # Only after this batch's futures are resolved, so none of them is dropped
+    while len(stored) > RECENT_IMAGES:
+        stored.popitem(last=False)
+    batch = kept
+    if not batch:
+        return
+    created_at = datetime.now(timezone.utc)
+    rows = [dict(values, seller_id=seller_id, status=status, created_at=created_at)
+            for _, values in batch]
+    try:
+        db.session.execute(insert(Auction), rows)
+        dashboards.record_created(seller_id, status, len(rows))
+        catalog.record_status_change([row['category_id'] for row in rows], None, status)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    cache.invalidate('auctions')
+    report.imported += len(rows)
+
+
+def import_auctions(stream, seller_id, fmt, status='pending', image_dir=None, batch_size=None):
+    """Import every valid row of ``stream`` as an auction by ``seller_id`` in ``status``.
+
+    ``fmt`` is ``'csv'`` or ``'jsonl'`` (see :func:`format_for`).  Returns
+    an :class:`ImportReport`; raises :class:`ValueError` if the file
+    cannot be read at all.  A file that turns unreadable part-way keeps
+    the rows before the bad line and says where it stopped in the report.
+    """
+    config = current_app.config
+    batch_size = batch_size or config['IMPORT_BATCH_SIZE']
+    report = ImportReport(config['IMPORT_MAX_ERRORS'])
+    categories = {}
+    for entry in category_catalog.all():
+        categories[str(entry.id)] = categories[entry.name.lower()] = entry.id
+    batch = []
+    stored = OrderedDict()
+    with ThreadPoolExecutor(max_workers=config['IMAGE_WORKERS'],
+                            thread_name_prefix='import-images') as pool:
+        for line, row in _rows(stream, fmt, report):
+            report.rows += 1
+            try:
+                values = validate_row(row, categories)
+                if values['image_filename'] and image_dir is None:
+                    raise ValueError('Images can only be imported with flask import-auctions --images.')
+            except ValueError as exc:
+                report.reject(line, str(exc))
+                continue
+            batch.append((line, values))
+            if len(batch) >= batch_size:
+                _insert_batch(batch, seller_id, status, image_dir, pool, stored, report)
+                batch = []
+        if batch:
+            _insert_batch(batch, seller_id, status, image_dir, pool, stored, report)
+    return report
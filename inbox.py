@@ -0,0 +1,90 @@
+"""Notification inbox: listing, read-marking and retention.
+
+``Notification`` rows are written by the outbox worker (see outbox.py),
+which adds one to the recipient's ``UserStats.notifications_unread`` in
+the same transaction.  The navbar badge reads that counter, usually
+straight from the identity cache, so it never costs a ``COUNT``.
+
+The inbox pages on a ``(created_at, id)`` key through
+``ix_notification_user_created_at`` (``ix_notification_user_is_read_created_at``
+for unread only), so the last page of 100k notifications costs what the
+first does.  Marking read is one guarded ``UPDATE`` however many rows it
+covers, and only the rows it actually flipped come off the counter.
+
+:func:`purge` deletes read notifications older than
+``NOTIFICATION_RETENTION_DAYS`` in batches of ``NOTIFICATION_PURGE_BATCH``,
+committing between batches so writers are never locked out for long.  The
+outbox worker runs it every ``NOTIFICATION_PURGE_INTERVAL`` seconds;
+``flask purge-notifications`` runs it on demand.  Unread notifications
+are never purged.
+"""
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import select, update, delete, false, true
+
+from app import db
+from identity import identity_cache
+from models import Notification
+import admin
+import dashboards
+
+
+def list_notifications(user_id, unread_only=False, after=None, limit=20):
+    """A page of ``user_id``'s notifications, newest first, and the key of the next page."""
+    query = select(Notification).where(Notification.user_id == user_id)
+    if unread_only:
+        query = query.where(Notification.is_read == false())
+    return admin.keyset_page(query, Notification, after, limit)
+
+
+def mark_read(user_id, notification_ids=None):
+    """Mark ``notification_ids`` read, or every unread one when None; return how many changed."""
+    stmt = update(Notification).where(Notification.user_id == user_id,
+                                      Notification.is_read == false())
+    if notification_ids is not None:
+        notification_ids = list(dict.fromkeys(notification_ids))[:admin.MAX_BULK]
+        if not notification_ids:
+            return 0
+        stmt = stmt.where(Notification.id.in_(notification_ids))
+    try:
+        changed = db.session.execute(
+            stmt.values(is_read=True).execution_options(synchronize_session=False)
+        ).rowcount
+        if changed:
+            dashboards.add(user_id, notifications_unread=-changed)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if changed:
+        identity_cache.invalidate(user_id)
+    return changed
+
+
+def purge(retention_days=None, batch_size=None, now=None):
+    """Delete read notifications older than ``retention_days``; return how many went."""
+    config = current_app.config
+    retention_days = config['NOTIFICATION_RETENTION_DAYS'] if retention_days is None else retention_days
+    batch_size = batch_size or config['NOTIFICATION_PURGE_BATCH']
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=retention_days)
+    deleted = 0
+    while True:
+        try:
+            # Read through ix_notification_read_created_at, one short transaction per batch
+            count = db.session.execute(
+                delete(Notification)
+                .where(Notification.id.in_(
+                    select(Notification.id)
+                    .where(Notification.is_read == true(), Notification.created_at < cutoff)
+                    .limit(batch_size)
+                ))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        deleted += count
+        if count < batch_size:
+            return deleted
@@ -0,0 +1,261 @@
+"""Per-request timing, slow-query logging, metrics and a sampling profiler.
+
+Off unless ``INSTRUMENTATION_ENABLED`` is set; when off no hook is
+registered at all, so requests pay nothing.  When on, every request is
+split into SQL time (and statement count), template render time and the
+Python time left over.  The split is sent back in a ``Server-Timing``
+header and folded into per-endpoint histograms served in the Prometheus
+text format by :meth:`Instrumentation.render_metrics` (``/admin/metrics``).
+
+Statements slower than ``SLOW_QUERY_MS`` are logged with the endpoint that
+ran them.  With ``PROFILE_SLOW_REQUEST_MS`` set, a background thread
+samples the stacks of in-flight requests every ``PROFILE_INTERVAL_MS``;
+requests that end up slower than the threshold have their samples written
+to ``PROFILE_DIR`` as collapsed stacks (``frame;frame;frame count``), the
+input format of ``flamegraph.pl`` and speedscope.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, Prometheus' default latency buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestStats:
+    """Timings collected for the request running on the current thread."""
+
+    __slots__ = ('endpoint', 'started', 'sql_seconds', 'sql_count', 'template_seconds',
+                 'render_started', 'samples')
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.sql_seconds = 0.0
+        self.sql_count = 0
+        self.template_seconds = 0.0
+        self.render_started = None
+        self.samples = None
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += 1
+        self.sum += value
+
+
+class Instrumentation:
+    """Flask extension wiring the request, template and SQL hooks."""
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.slow_query_seconds = None
+        self.profile_threshold = None
+        self.profile_interval = 0.005
+        self.profile_dir = 'profiles'
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._durations = defaultdict(Histogram)
+        self._requests = Counter()
+        self._sql_seconds = Counter()
+        self._sql_queries = Counter()
+        self._template_seconds = Counter()
+        self._active = {}
+        self._sampler = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['instrumentation'] = self
+        self.enabled = app.config.setdefault('INSTRUMENTATION_ENABLED', False)
+        if not self.enabled:
+            return
+        slow_query_ms = app.config.setdefault('SLOW_QUERY_MS', 100)
+        self.slow_query_seconds = slow_query_ms / 1000 if slow_query_ms else None
+        profile_ms = app.config.setdefault('PROFILE_SLOW_REQUEST_MS', 0)
+        self.profile_threshold = profile_ms / 1000 if profile_ms else None
+        self.profile_interval = app.config.setdefault('PROFILE_INTERVAL_MS', 5) / 1000
+        self.profile_dir = app.config.setdefault('PROFILE_DIR', 'profiles')
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        # Engine-wide so the engine Flask-SQLAlchemy creates lazily is covered
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        if self.profile_threshold is not None:
+            self._sampler = threading.Thread(target=self._sample, name='request-profiler',
+                                             daemon=True)
+            self._sampler.start()
+
+    @property
+    def current(self):
+        """The :class:`RequestStats` of this thread's request, if instrumented."""
+        return getattr(self._local, 'stats', None)
+
+    # -- hooks -------------------------------------------------------------
+
+    def _before_request(self):
+        stats = RequestStats(request.endpoint or 'unknown')
+        self._local.stats = stats
+        if self._sampler is not None:
+            stats.samples = Counter()
+            with self._lock:
+                self._active[threading.get_ident()] = stats
+
+    def _after_request(self, response):
+        stats = self.current
+        if stats is None:
+            return response
+        total = time.perf_counter() - stats.started
+        python = max(total - stats.sql_seconds - stats.template_seconds, 0.0)
+        response.headers['Server-Timing'] = (
+            f'sql;dur={1000 * stats.sql_seconds:.1f};desc="{stats.sql_count} queries", '
+            f'tpl;dur={1000 * stats.template_seconds:.1f}, '
+            f'app;dur={1000 * python:.1f}, '
+            f'total;dur={1000 * total:.1f}'
+        )
+        with self._lock:
+            self._durations[stats.endpoint].observe(total)
+            self._requests[(stats.endpoint, request.method, response.status_code)] += 1
+            self._sql_seconds[stats.endpoint] += stats.sql_seconds
+            self._sql_queries[stats.endpoint] += stats.sql_count
+            self._template_seconds[stats.endpoint] += stats.template_seconds
+        if self.profile_threshold is not None and total >= self.profile_threshold:
+            self._dump_profile(stats, total)
+        return response
+
+    def _teardown_request(self, exc):
+        self._local.stats = None
+        if self._sampler is not None:
+            with self._lock:
+                self._active.pop(threading.get_ident(), None)
+
+    def _before_render(self, sender, template, context, **extra):
+        stats = self.current
+        if stats is not None:
+            stats.render_started = (time.perf_counter(), stats.sql_seconds)
+
+    def _after_render(self, sender, template, context, **extra):
+        stats = self.current
+        if stats is not None and stats.render_started is not None:
+            # Lazy loads fired from the template count as SQL, not rendering
+            started, sql_before = stats.render_started
+            stats.template_seconds += (time.perf_counter() - started
+                                       - (stats.sql_seconds - sql_before))
+            stats.render_started = None
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info['query_started'] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started']
+        stats = self.current
+        if stats is not None:
+            stats.sql_seconds += elapsed
+            stats.sql_count += 1
+        if self.slow_query_seconds is not None and elapsed >= self.slow_query_seconds:
+            logger.warning('Slow query (%.1f ms) in %s: %s', 1000 * elapsed,
+                           stats.endpoint if stats is not None else 'background',
+                           ' '.join(statement.split())[:1000])
+
+    # -- profiler ----------------------------------------------------------
+
+    def _sample(self):
+        while True:
+            time.sleep(self.profile_interval)
+            with self._lock:
+                active = list(self._active.items())
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for ident, stats in active:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+                    frame = frame.f_back
+                stats.samples[';'.join(reversed(stack))] += 1
+
+    def _dump_profile(self, stats, total):
+        if not stats.samples:
+            return
+        os.makedirs(self.profile_dir, exist_ok=True)
+        name = f'{time.strftime("%Y%m%dT%H%M%S")}-{stats.endpoint}-{int(1000 * total)}ms.folded'
+        path = os.path.join(self.profile_dir, name)
+        try:
+            with open(path, 'w') as f:
+                for stack, count in stats.samples.most_common():
+                    f.write(f'{stack} {count}\n')
+        except OSError:
+            logger.exception('Could not write profile %s', path)
+            return
+        logger.info('Slow request %s took %.0f ms; profile written to %s',
+                    stats.endpoint, 1000 * total, path)
+
+    # -- metrics -----------------------------------------------------------
+
+    def render_metrics(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            durations = {name: (list(h.counts), h.total, h.sum)
+                         for name, h in self._durations.items()}
+            requests = dict(self._requests)
+            sql_seconds = dict(self._sql_seconds)
+            sql_queries = dict(self._sql_queries)
+            template_seconds = dict(self._template_seconds)
+
+        lines = [
+            '# HELP http_request_duration_seconds Request latency by endpoint.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for endpoint, (counts, total, seconds) in sorted(durations.items()):
+            running = 0
+            for bound, count in zip(BUCKETS, counts):
+                running += count
+                lines.append(f'http_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {running}')
+            lines.append(f'http_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {total}')
+            lines.append(f'http_request_duration_seconds_sum{{endpoint="{endpoint}"}} {seconds:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{endpoint="{endpoint}"}} {total}')
+
+        lines += ['# HELP http_requests_total Requests by endpoint, method and status.',
+                  '# TYPE http_requests_total counter']
+        for (endpoint, method, status), count in sorted(requests.items()):
+            lines.append(f'http_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+
+        for metric, help_text, values, fmt in (
+            ('http_request_sql_seconds_total', 'Time spent in SQL by endpoint.', sql_seconds, '.6f'),
+            ('http_request_sql_queries_total', 'SQL statements run by endpoint.', sql_queries, 'd'),
+            ('http_request_template_seconds_total', 'Time spent rendering templates by endpoint.',
+             template_seconds, '.6f'),
+        ):
+            lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+            for endpoint, value in sorted(values.items()):
+                lines.append(f'{metric}{{endpoint="{endpoint}"}} {value:{fmt}}')
+        return '\n'.join(lines) + '\n'
+
+
+instrumentation = Instrumentation()
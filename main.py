@@ -1,4 +1,13 @@
-from app import app
+from app import create_app
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # The development server sets up its own database; deployments run
+    # `flask bootstrap` once before starting any workers
+    from app import app
+    from bootstrap import bootstrap
+
+    with app.app_context():
+        bootstrap()
+    create_app().run(host='0.0.0.0', port=5000, debug=True)
+else:
+    app = create_app()
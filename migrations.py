@@ -0,0 +1,176 @@
+"""In-place schema upgrades for databases created by older versions.
+
+``db.create_all()`` only creates missing tables, so columns and indexes
+added to existing models are applied here.  Every step is idempotent and
+safe to run on each start-up or through ``flask db-upgrade``.
+"""
+from sqlalchemy import Integer, inspect, text
+from sqlalchemy.schema import CreateTable
+
+from app import db
+
+# (table, column, DDL) -- DDL must be valid on both SQLite and PostgreSQL
+COLUMNS = [
+    ('auction', 'bid_count', 'INTEGER NOT NULL DEFAULT 0'),
+    ('auction', 'highest_bid_amount', 'BIGINT'),
+    ('auction', 'highest_bidder_id', 'INTEGER REFERENCES "user" (id)'),
+    ('user_stats', 'notifications_unread', 'INTEGER NOT NULL DEFAULT 0'),
+    ('category', 'active_auctions', 'INTEGER NOT NULL DEFAULT 0'),
+]
+
+# (table, index) pairs superseded by wider indexes on the models; they only slow writes
+STALE_INDEXES = [
+    ('auction', 'ix_auction_winner_id'),
+    ('notification', 'ix_notification_user_is_read'),
+    ('bid', 'ix_bid_bidder_timestamp'),
+]
+
+# Columns that held dollars as FLOAT before money moved to integer cents
+MONEY_COLUMNS = {
+    'auction': ('starting_bid', 'current_bid', 'highest_bid_amount'),
+    'bid': ('amount',),
+}
+
+
+def add_missing_columns():
+    """Add any column from :data:`COLUMNS` the live schema lacks and return their names."""
+    inspector = inspect(db.engine)
+    existing = {}
+    added = []
+    for table, column, ddl in COLUMNS:
+        if table not in existing:
+            existing[table] = {c['name'] for c in inspector.get_columns(table)}
+        if column in existing[table]:
+            continue
+        db.session.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}'))
+        added.append(f'{table}.{column}')
+    db.session.commit()
+    return added
+
+
+def _rebuild_sqlite_table(table_name, names, values):
+    """Recreate ``table_name`` from its model on SQLite, copying ``values`` into ``names``.
+
+    Indexes are left to :func:`create_missing_indexes`.
+    """
+    table = db.metadata.tables[table_name]
+    # The copy's foreign keys need their target tables in the same metadata
+    scratch = db.MetaData()
+    for other in db.metadata.sorted_tables:
+        other.to_metadata(scratch)
+    copy = table.to_metadata(scratch, name=f'{table_name}__new')
+    copy.indexes.clear()
+    db.session.execute(CreateTable(copy))
+    db.session.execute(text(
+        f'INSERT INTO "{copy.name}" ({", ".join(names)}) '
+        f'SELECT {", ".join(values)} FROM "{table_name}"'
+    ))
+    db.session.execute(text(f'DROP TABLE "{table_name}"'))
+    db.session.execute(text(f'ALTER TABLE "{copy.name}" RENAME TO "{table_name}"'))
+
+
+def convert_money_columns():
+    """Rewrite FLOAT dollar columns as BIGINT cents and return the converted tables.
+
+    PostgreSQL converts in place.  SQLite cannot change a column type, so
+    the table is rebuilt from the model and copied across; its indexes are
+    recreated by :func:`create_missing_indexes` afterwards.
+    """
+    inspector = inspect(db.engine)
+    converted = []
+    for table_name, money_columns in MONEY_COLUMNS.items():
+        types = {c['name']: c['type'] for c in inspector.get_columns(table_name)}
+        stale = [name for name in money_columns if not isinstance(types[name], Integer)]
+        if not stale:
+            continue
+        if db.engine.dialect.name == 'postgresql':
+            for name in stale:
+                db.session.execute(text(
+                    f'ALTER TABLE "{table_name}" ALTER COLUMN {name} TYPE BIGINT '
+                    f'USING round({name} * 100)::bigint'
+                ))
+        else:
+            names = [c.name for c in db.metadata.tables[table_name].columns if c.name in types]
+            _rebuild_sqlite_table(table_name, names, [
+                f'CAST(ROUND({name} * 100) AS INTEGER)' if name in stale else name for name in names
+            ])
+        converted.append(table_name)
+    db.session.commit()
+    return converted
+
+
+def make_bid_ids_monotonic():
+    """Rebuild SQLite's ``bid`` with AUTOINCREMENT so an archived bid's id is never reused.
+
+    A plain SQLite rowid is the current maximum plus one, which hands out
+    ids already in ``bid_archive`` once the newest bids are archived.  The
+    rebuilt table's sequence starts above both tables.  PostgreSQL's
+    sequences never go back, so there is nothing to do there.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return []
+    sql = db.session.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'bid'")
+    ).scalar()
+    if 'AUTOINCREMENT' in sql.upper():
+        return []
+    names = [c['name'] for c in inspect(db.engine).get_columns('bid')]
+    _rebuild_sqlite_table('bid', names, names)
+    db.session.execute(text("DELETE FROM sqlite_sequence WHERE name = 'bid'"))
+    db.session.execute(text(
+        "INSERT INTO sqlite_sequence (name, seq) SELECT 'bid', MAX("
+        "(SELECT COALESCE(MAX(id), 0) FROM bid), (SELECT COALESCE(MAX(id), 0) FROM bid_archive))"
+    ))
+    db.session.commit()
+    return ['bid.id autoincrement']
+
+
+def create_missing_indexes():
+    """Create every index declared on the models that the live schema lacks."""
+    inspector = inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        existing = {ix['name'] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            index.create(db.engine)
+            created.append(index.name)
+    return created
+
+
+def drop_stale_indexes():
+    """Drop any index in :data:`STALE_INDEXES` the live schema still has."""
+    inspector = inspect(db.engine)
+    dropped = []
+    for table, name in STALE_INDEXES:
+        if name not in {ix['name'] for ix in inspector.get_indexes(table)}:
+            continue
+        db.session.execute(text(f'DROP INDEX {name}'))
+        dropped.append(name)
+    db.session.commit()
+    return dropped
+
+
+def upgrade():
+    """Bring an existing database up to the current models."""
+    from bidding import recompute_bid_aggregates
+    import catalog
+    import dashboards
+    import search
+
+    added = add_missing_columns()
+    added += convert_money_columns()
+    added += make_bid_ids_monotonic()
+    added += create_missing_indexes()
+    added += drop_stale_indexes()
+    added += search.install()
+    if 'auction.bid_count' in added:
+        recompute_bid_aggregates()
+    if dashboards.needs_rebuild() or 'user_stats.notifications_unread' in added:
+        dashboards.rebuild()
+        added.append('dashboard stats')
+    if 'category.active_auctions' in added:
+        catalog.rebuild()
+        added.append('category counts')
+    return added
@@ -2,6 +2,7 @@ from datetime import datetime, timezone
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from app import db
+from money import Money, minimum_bid
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -16,6 +17,12 @@ class User(UserMixin, db.Model):
     auctions = db.relationship('Auction', backref='seller', lazy=True, foreign_keys='Auction.seller_id')
     bids = db.relationship('Bid', backref='bidder', lazy=True)
 
+    __table_args__ = (
+        # manage_users: ORDER BY created_at DESC, id DESC, optionally by role
+        db.Index('ix_user_created_at', 'created_at', 'id'),
+        db.Index('ix_user_role_created_at', 'role', 'created_at', 'id'),
+    )
+
     def __repr__(self):
         return f'<User {self.username}>'
 
@@ -29,6 +36,8 @@ class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False, unique=True)
     description = db.Column(db.Text)
+    # Kept by delta as auctions go live and leave (see catalog.py)
+    active_auctions = db.Column(db.Integer, nullable=False, default=0)
     
     # Relationships
     auctions = db.relationship('Auction', backref='category', lazy=True)
@@ -40,22 +49,45 @@ class Auction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
-    starting_bid = db.Column(db.Float, nullable=False)
-    current_bid = db.Column(db.Float, default=0.0)
+    starting_bid = db.Column(Money, nullable=False)
+    current_bid = db.Column(Money, default=0)
     image_filename = db.Column(db.String(200))
     start_time = db.Column(db.DateTime, nullable=False)
     end_time = db.Column(db.DateTime, nullable=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     status = db.Column(db.String(20), default='pending')  # pending, active, completed, cancelled
     
+    # Bid aggregates, maintained by bidding.place_bid and rebuilt by
+    # bidding.recompute_bid_aggregates
+    bid_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    highest_bid_amount = db.Column(Money)
+    
     # Foreign Keys
     seller_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'))
     winner_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    highest_bidder_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     
     # Relationships
     bids = db.relationship('Bid', backref='auction', lazy=True, cascade='all, delete-orphan')
     winner = db.relationship('User', foreign_keys=[winner_id])
+    highest_bidder = db.relationship('User', foreign_keys=[highest_bidder_id])
+
+    __table_args__ = (
+        # index/auction_list/closer: status = ? AND end_time range, ORDER BY end_time
+        db.Index('ix_auction_status_end_time', 'status', 'end_time'),
+        # auction_list filtered by category
+        db.Index('ix_auction_category_status_end_time', 'category_id', 'status', 'end_time'),
+        # auction_list status=ended: end_time <= now
+        db.Index('ix_auction_end_time', 'end_time'),
+        # seller_dashboard: seller_id = ? ORDER BY created_at DESC
+        db.Index('ix_auction_seller_created_at', 'seller_id', 'created_at'),
+        # buyer_dashboard: winner_id = ? ORDER BY end_time DESC
+        db.Index('ix_auction_winner_end_time', 'winner_id', 'end_time'),
+        # admin listings: status = ? ORDER BY created_at DESC, id DESC
+        db.Index('ix_auction_status_created_at', 'status', 'created_at', 'id'),
+        db.Index('ix_auction_created_at', 'created_at', 'id'),
+    )
 
     def __repr__(self):
         return f'<Auction {self.title}>'
@@ -100,23 +132,155 @@ class Auction(db.Model):
 
     @property
     def highest_bid(self):
-        return Bid.query.filter_by(auction_id=self.id).order_by(Bid.amount.desc()).first()
+        if not self.bid_count:
+            return None
+        # Bids on a finished auction may have moved to the archive (see archive.py)
+        for model in (Bid, ArchivedBid):
+            bid = model.query.filter_by(auction_id=self.id).order_by(model.amount.desc()).first()
+            if bid is not None:
+                return bid
+        return None
 
     def get_bid_count(self):
-        return Bid.query.filter_by(auction_id=self.id).count()
+        return self.bid_count or 0
+
+    @property
+    def minimum_bid(self):
+        """Smallest bid :func:`bidding.place_bid` will accept right now."""
+        return minimum_bid(self.starting_bid, self.highest_bid_amount)
 
 class Bid(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    amount = db.Column(db.Float, nullable=False)
+    amount = db.Column(Money, nullable=False)
     timestamp = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     
     # Foreign Keys
     auction_id = db.Column(db.Integer, db.ForeignKey('auction.id'), nullable=False)
     bidder_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+    __table_args__ = (
+        # highest_bid and aggregate repair: auction_id = ? ORDER BY amount DESC
+        db.Index('ix_bid_auction_amount', 'auction_id', 'amount'),
+        # auction_detail recent bids: auction_id = ? ORDER BY timestamp DESC
+        db.Index('ix_bid_auction_timestamp', 'auction_id', 'timestamp'),
+        # Never hand out the id of a bid since moved to bid_archive
+        {'sqlite_autoincrement': True},
+    )
+
     def __repr__(self):
         return f'<Bid ${self.amount} on {self.auction.title}>'
 
+class ArchivedBid(db.Model):
+    """A bid on a finished auction, moved out of ``bid`` by archive.py with its id intact."""
+    __tablename__ = 'bid_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    amount = db.Column(Money, nullable=False)
+    timestamp = db.Column(db.DateTime)
+    auction_id = db.Column(db.Integer, db.ForeignKey('auction.id'), nullable=False)
+    bidder_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+
+    bidder = db.relationship('User')
+
+    __table_args__ = (
+        # The only index: an auction's bid history, newest first
+        db.Index('ix_bid_archive_auction_timestamp', 'auction_id', 'timestamp', 'id'),
+    )
+
+class BidArchiveSummary(db.Model):
+    """One row per auction whose bids were archived, written in the same transaction."""
+    __tablename__ = 'bid_archive_summary'
+    auction_id = db.Column(db.Integer, db.ForeignKey('auction.id'), primary_key=True)
+    bid_count = db.Column(db.Integer, nullable=False)
+    bidder_count = db.Column(db.Integer, nullable=False)
+    first_bid_at = db.Column(db.DateTime)
+    last_bid_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+class ProxyBid(db.Model):
+    """A bidder's hidden maximum; bidding.set_max_bid bids on their behalf up to it."""
+    id = db.Column(db.Integer, primary_key=True)
+    max_amount = db.Column(Money, nullable=False)
+    placed_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    
+    # Foreign Keys
+    auction_id = db.Column(db.Integer, db.ForeignKey('auction.id'), nullable=False)
+    bidder_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('auction_id', 'bidder_id', name='uq_proxy_bid_auction_bidder'),
+        # proxy resolution: auction_id = ? ORDER BY max_amount DESC, placed_at LIMIT 3
+        db.Index('ix_proxy_bid_auction_max', 'auction_id', 'max_amount', 'placed_at'),
+    )
+
+    def __repr__(self):
+        return f'<ProxyBid up to ${self.max_amount} on auction {self.auction_id}>'
+
+class BidPosition(db.Model):
+    """Where one bidder stands on one auction, maintained by dashboards.record_bid."""
+    id = db.Column(db.Integer, primary_key=True)
+    bid_count = db.Column(db.Integer, nullable=False, default=0)
+    last_amount = db.Column(Money, nullable=False)
+    last_bid_at = db.Column(db.DateTime, nullable=False)
+    is_leading = db.Column(db.Boolean, nullable=False, default=False)
+    
+    # Foreign Keys
+    auction_id = db.Column(db.Integer, db.ForeignKey('auction.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    
+    # Relationships
+    auction = db.relationship('Auction')
+
+    __table_args__ = (
+        # bid upsert, and every position on an auction when it closes
+        db.UniqueConstraint('auction_id', 'user_id', name='uq_bid_position_auction_user'),
+        # buyer_dashboard: user_id = ? ORDER BY last_bid_at DESC
+        db.Index('ix_bid_position_user_last_bid', 'user_id', 'last_bid_at'),
+    )
+
+    def __repr__(self):
+        return f'<BidPosition user {self.user_id} on auction {self.auction_id}>'
+
+class UserStats(db.Model):
+    """Dashboard and inbox counters for one user, kept current by dashboards.py.
+
+    Only ever changed by adding deltas, and rebuilt by dashboards.rebuild.
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    
+    # As a seller
+    auctions_pending = db.Column(db.Integer, nullable=False, default=0)
+    auctions_active = db.Column(db.Integer, nullable=False, default=0)
+    auctions_completed = db.Column(db.Integer, nullable=False, default=0)
+    auctions_cancelled = db.Column(db.Integer, nullable=False, default=0)
+    bids_received = db.Column(db.Integer, nullable=False, default=0)
+    bid_amount_received = db.Column(Money, nullable=False, default=0)
+    revenue = db.Column(Money, nullable=False, default=0)
+    
+    # As a bidder; winning and outbid count live auctions only
+    bids_placed = db.Column(db.Integer, nullable=False, default=0)
+    auctions_winning = db.Column(db.Integer, nullable=False, default=0)
+    auctions_outbid = db.Column(db.Integer, nullable=False, default=0)
+    auctions_won = db.Column(db.Integer, nullable=False, default=0)
+    total_spent = db.Column(Money, nullable=False, default=0)
+    
+    # Navbar badge, maintained by outbox.process_notifications and inbox.py
+    notifications_unread = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<UserStats {self.user_id}>'
+
+    @property
+    def total_auctions(self):
+        return (self.auctions_pending + self.auctions_active + self.auctions_completed
+                + self.auctions_cancelled)
+
+    @property
+    def average_bid(self):
+        """Mean bid received on this seller's auctions, or None before the first."""
+        if not self.bids_received:
+            return None
+        return self.bid_amount_received / self.bids_received
+
 class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     message = db.Column(db.Text, nullable=False)
@@ -129,5 +293,41 @@ class Notification(db.Model):
     # Relationships
     user = db.relationship('User', backref='notifications')
 
+    __table_args__ = (
+        # inbox, newest first: user_id = ? [AND is_read = ?] ORDER BY created_at DESC, id DESC
+        db.Index('ix_notification_user_created_at', 'user_id', 'created_at', 'id'),
+        db.Index('ix_notification_user_is_read_created_at', 'user_id', 'is_read', 'created_at', 'id'),
+        # retention: is_read AND created_at < cutoff
+        db.Index('ix_notification_read_created_at', 'is_read', 'created_at'),
+    )
+
     def __repr__(self):
         return f'<Notification {self.id}>'
+
+class OutboxEvent(db.Model):
+    """A side effect recorded in the same transaction as the change that caused it.
+
+    Drained by outbox.py into ``Notification`` rows and emails.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # notification, email
+    payload = db.Column(db.JSON, nullable=False)
+    coalesce_key = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    available_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    processed_at = db.Column(db.DateTime)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    
+    # Foreign Keys
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+
+    __table_args__ = (
+        # worker: processed_at IS NULL AND kind = ? AND available_at <= now
+        db.Index('ix_outbox_event_pending', 'processed_at', 'kind', 'available_at'),
+        # coalescing: every pending event sharing a key
+        db.Index('ix_outbox_event_coalesce_key', 'coalesce_key', 'processed_at'),
+    )
+
+    def __repr__(self):
+        return f'<OutboxEvent {self.kind} {self.id}>'
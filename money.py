@@ -0,0 +1,97 @@
+"""Money stored as integer cents.
+
+:class:`Money` columns hold whole cents in a ``BIGINT`` and hand Python
+code :class:`~decimal.Decimal` values rounded to the cent, so bid
+comparisons, sums and averages are exact both in SQL and in Python.
+Floats are accepted on the way in (forms, old callers) and converted via
+their shortest ``repr`` so ``19.99`` becomes 1999 cents, not 1998.
+
+Use :func:`cents` to do integer arithmetic on a money column inside a
+query without the value being converted back and forth.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from sqlalchemy import BigInteger, case, type_coerce
+from sqlalchemy.types import TypeDecorator
+
+CENT = Decimal('0.01')
+
+# (price below, in cents; minimum raise, in cents) -- the last band is open-ended
+BID_INCREMENTS = [
+    (100, 5),
+    (500, 25),
+    (2500, 50),
+    (10000, 100),
+    (25000, 250),
+    (50000, 500),
+    (100000, 1000),
+    (250000, 2500),
+    (500000, 5000),
+    (None, 10000),
+]
+
+
+def to_decimal(value):
+    """Round ``value`` to the cent as a ``Decimal``."""
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def to_cents(value):
+    return int(to_decimal(value) * 100)
+
+
+def from_cents(value):
+    return (Decimal(int(value)) / 100).quantize(CENT)
+
+
+def as_json(value):
+    """A money value as a JSON number (``None`` stays ``None``)."""
+    return None if value is None else float(value)
+
+
+class Money(TypeDecorator):
+    """A ``Decimal`` amount persisted as integer cents."""
+
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else to_cents(value)
+
+    def process_result_value(self, value, dialect):
+        # int() also accepts the REAL values SQLite returns for columns
+        # declared FLOAT before the cents migration
+        return None if value is None else from_cents(value)
+
+    @property
+    def python_type(self):
+        return Decimal
+
+
+def cents(expression):
+    """Treat a money column or expression as plain integer cents in SQL."""
+    return type_coerce(expression, BigInteger)
+
+
+def increment_cents(amount_cents):
+    """Minimum raise in cents over a bid of ``amount_cents``."""
+    for below, step in BID_INCREMENTS:
+        if below is None or amount_cents < below:
+            return step
+
+
+def increment_case(amount_cents):
+    """SQL expression for :func:`increment_cents` over an integer-cents expression."""
+    return case(
+        *[(amount_cents < below, step) for below, step in BID_INCREMENTS if below is not None],
+        else_=BID_INCREMENTS[-1][1],
+    )
+
+
+def minimum_bid(starting_bid, highest_bid):
+    """Smallest acceptable next bid: the starting bid, then the top bid plus its band's increment."""
+    if highest_bid is None:
+        return to_decimal(starting_bid)
+    return from_cents(to_cents(highest_bid) + increment_cents(to_cents(highest_bid)))
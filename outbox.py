@@ -0,0 +1,300 @@
+"""Transactional outbox for notifications and email.
+
+Request handlers call :func:`enqueue` inside their own transaction, so a
+notification exists exactly when the business change that caused it
+commits, and the request never waits on the mail server.  A worker then
+drains the outbox in two stages:
+
+1. :func:`process_notifications` turns ``notification`` events into
+   ``Notification`` rows.  Events sharing a ``coalesce_key`` for the same
+   user are folded into one row ("12 new bids on ...") and each row adds
+   one to the recipient's unread count (see :mod:`inbox`).  When mail is
+   enabled each resulting row also queues one ``email`` event.
+2. :func:`send_emails` delivers ``email`` events over a single SMTP
+   connection per batch and retries failures with exponential backoff.
+
+Every web process runs the worker in a thread (``OUTBOX_WORKER_ENABLED``,
+on by default).  Deployments that run ``flask outbox-worker`` on its own
+can set ``OUTBOX_WORKER_ENABLED=false``; several workers can drain at
+once.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from flask_mail import Message
+from sqlalchemy import select, update
+
+from app import db, mail
+from identity import identity_cache
+from models import OutboxEvent, Notification, User
+import dashboards
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(user_id, message, subject=None, coalesce_key=None, summary=None):
+    """Queue a notification for ``user_id`` in the current transaction.
+
+    ``summary`` is used instead of ``message`` when several events with the
+    same ``coalesce_key`` are delivered together; ``{count}`` is replaced by
+    the number of events folded in.  Coalescable events are held back for
+    ``OUTBOX_COALESCE_SECONDS`` so bursts land in the same batch.
+    """
+    now = datetime.now(timezone.utc)
+    available_at = now
+    if coalesce_key:
+        available_at += timedelta(seconds=current_app.config['OUTBOX_COALESCE_SECONDS'])
+    event = OutboxEvent(
+        kind='notification',
+        user_id=user_id,
+        payload={'message': message, 'subject': subject, 'summary': summary},
+        coalesce_key=coalesce_key,
+        created_at=now,
+        available_at=available_at,
+    )
+    db.session.add(event)
+    return event
+
+
+def _claim(kind, batch_size, now):
+    return db.session.execute(
+        select(OutboxEvent)
+        .where(OutboxEvent.processed_at.is_(None),
+               OutboxEvent.kind == kind,
+               OutboxEvent.available_at <= now)
+        .order_by(OutboxEvent.available_at, OutboxEvent.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+
+
+def _mark_processed(events, now):
+    # Guarded on processed_at so a concurrent worker cannot deliver twice
+    return db.session.execute(
+        update(OutboxEvent)
+        .where(OutboxEvent.id.in_([e.id for e in events]),
+               OutboxEvent.processed_at.is_(None))
+        .values(processed_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def process_notifications(batch_size=500, now=None):
+    """Turn one batch of notification events into ``Notification`` rows.
+
+    Returns ``(events, notifications)`` processed.  ``events`` can exceed
+    ``batch_size`` because the remainder of every burst in the batch is
+    folded in as well.
+    """
+    now = now or datetime.now(timezone.utc)
+    try:
+        events = _claim('notification', batch_size, now)
+        if not events:
+            db.session.rollback()
+            return 0, 0
+        # Pull in the rest of each burst so it becomes one notification
+        keys = {e.coalesce_key for e in events if e.coalesce_key}
+        if keys:
+            events += db.session.execute(
+                select(OutboxEvent)
+                .where(OutboxEvent.coalesce_key.in_(keys),
+                       OutboxEvent.processed_at.is_(None),
+                       OutboxEvent.kind == 'notification',
+                       OutboxEvent.available_at <= now,
+                       OutboxEvent.id.notin_([e.id for e in events]))
+                .order_by(OutboxEvent.id)
+                .with_for_update(skip_locked=True)
+            ).scalars().all()
+            events.sort(key=lambda e: e.id)
+        if _mark_processed(events, now) != len(events):
+            # Another worker got here first; leave the batch to it
+            db.session.rollback()
+            return 0, 0
+
+        groups = OrderedDict()
+        for event in events:
+            key = (event.user_id, event.coalesce_key or f'event:{event.id}')
+            groups.setdefault(key, []).append(event)
+
+        send_email = current_app.config['MAIL_ENABLED']
+        notifications = []
+        for (user_id, _), group in groups.items():
+            last = group[-1]
+            message = last.payload['message']
+            if len(group) > 1 and last.payload.get('summary'):
+                message = last.payload['summary'].format(count=len(group))
+            notifications.append(Notification(user_id=user_id, message=message,
+                                              created_at=last.created_at))
+            if send_email:
+                db.session.add(OutboxEvent(
+                    kind='email',
+                    user_id=user_id,
+                    payload={'subject': last.payload.get('subject') or 'Bid Blitzkrieg notification',
+                             'body': message},
+                    created_at=now,
+                    available_at=now,
+                ))
+        db.session.add_all(notifications)
+        recipients = {n.user_id for n in notifications}
+        for notification in notifications:
+            dashboards.add(notification.user_id, notifications_unread=1)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    # Their navbar badges are part of the cached snapshot
+    identity_cache.invalidate(*recipients)
+    return len(events), len(notifications)
+
+
+def _backoff(attempts):
+    base = current_app.config['OUTBOX_RETRY_BASE_SECONDS']
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 3600))
+
+
+def send_emails(batch_size=100, now=None):
+    """Deliver one batch of email events over a single SMTP connection.
+
+    Events are leased (``available_at`` pushed forward) and committed before
+    any mail is sent, so no transaction is held open while talking to the
+    SMTP server and a concurrent worker cannot send the same event.  Returns
+    ``(sent, failed)``.  Failed events are retried with exponential backoff
+    until ``OUTBOX_MAX_ATTEMPTS`` is reached, then left processed with
+    ``last_error`` set.
+    """
+    now = now or datetime.now(timezone.utc)
+    config = current_app.config
+    try:
+        claimed = _claim('email', batch_size, now)
+        if not claimed:
+            db.session.rollback()
+            return 0, 0
+        leased = set(db.session.execute(
+            update(OutboxEvent)
+            .where(OutboxEvent.id.in_([e.id for e in claimed]),
+                   OutboxEvent.processed_at.is_(None),
+                   OutboxEvent.available_at <= now)
+            .values(available_at=now + timedelta(seconds=config['OUTBOX_LEASE_SECONDS']))
+            .returning(OutboxEvent.id)
+            .execution_options(synchronize_session=False)
+        ).scalars())
+        events = [(e.id, e.user_id, e.payload, e.attempts) for e in claimed if e.id in leased]
+        recipients = dict(db.session.execute(
+            select(User.id, User.email).where(User.id.in_({e[1] for e in events}))
+        ).all()) if events else {}
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    results = []
+    with ExitStack() as stack:
+        try:
+            connection, connect_error = stack.enter_context(mail.connect()), None
+        except Exception as exc:
+            connection, connect_error = None, exc
+
+        for event_id, user_id, payload, attempts in events:
+            attempts += 1
+            try:
+                if connect_error is not None:
+                    raise connect_error
+                connection.send(Message(
+                    subject=payload['subject'],
+                    recipients=[recipients[user_id]],
+                    body=payload['body'],
+                ))
+            except Exception as exc:
+                if attempts >= config['OUTBOX_MAX_ATTEMPTS']:
+                    logger.error('Giving up on email event %s: %s', event_id, exc)
+                    results.append({'id': event_id, 'attempts': attempts,
+                                    'last_error': str(exc), 'processed_at': now})
+                else:
+                    results.append({'id': event_id, 'attempts': attempts, 'last_error': str(exc),
+                                    'available_at': now + _backoff(attempts)})
+            else:
+                results.append({'id': event_id, 'attempts': attempts, 'processed_at': now})
+
+    sent = sum(1 for r in results if 'last_error' not in r)
+    if results:
+        try:
+            # ORM bulk UPDATE by primary key
+            db.session.execute(update(OutboxEvent), results)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    return sent, len(results) - sent
+
+
+def drain(batch_size=500, now=None):
+    """Process every pending event once and return a summary dict."""
+    totals = {'events': 0, 'notifications': 0, 'emails_sent': 0, 'emails_failed': 0}
+    while True:
+        events, notifications = process_notifications(batch_size, now)
+        totals['events'] += events
+        totals['notifications'] += notifications
+        if not events:
+            break
+    while True:
+        sent, failed = send_emails(batch_size, now)
+        totals['emails_sent'] += sent
+        totals['emails_failed'] += failed
+        if sent + failed < batch_size:
+            break
+    return totals
+
+
+class OutboxWorker:
+    """Background thread that drains the outbox every ``interval`` seconds.
+
+    Every ``NOTIFICATION_PURGE_INTERVAL`` seconds (0 turns it off) it also
+    purges old read notifications (see :func:`inbox.purge`).
+    """
+
+    def __init__(self, app=None, batch_size=500, interval=1.0):
+        self.app = app
+        self.batch_size = batch_size
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._next_purge = 0.0
+
+    def start(self, app=None):
+        self.app = app or self.app
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self.run, name='outbox-worker', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run_once(self):
+        with self.app.app_context():
+            totals = drain(self.batch_size)
+            purge_interval = current_app.config['NOTIFICATION_PURGE_INTERVAL']
+            if purge_interval and time.monotonic() >= self._next_purge:
+                import inbox
+                totals['notifications_purged'] = inbox.purge()
+                self._next_purge = time.monotonic() + purge_interval
+            return totals
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception('Outbox drain failed')
+            self._stop.wait(self.interval)
+
+
+outbox_worker = OutboxWorker()
@@ -0,0 +1,295 @@
+"""Token-bucket rate limits in front of bidding, login and registration.
+
+A *rule* is named ``<action>_<scope>`` and set in ``RATE_LIMITS`` as
+``"N/S"``: a bucket of N tokens that refills at N per S seconds, so bursts
+of N pass and anything faster settles at N per S.  The scope says what
+each bucket is keyed by: ``user`` (the session's user id), ``ip`` (the
+client address, after ``ProxyFix``) or ``auction`` (the posted
+``auction_id``, charged for signed-in users only).  :meth:`RateLimiter.limit` wraps a view so its POSTs take
+one token from every bucket its rules name, all or none, and get a plain
+``429`` with ``Retry-After`` when any bucket is empty.
+
+The check runs before ``login_required`` and reads only the session
+cookie and the form, so a throttled request costs no SQL and no template;
+an allowed one pays a dictionary lookup per rule.  A bucket is stored as
+the single time at which it will be full again (the GCRA form of a token
+bucket), and buckets that have refilled are the same as absent ones, so
+they are swept once the map grows past ``RATE_LIMIT_MAX_KEYS``.
+
+The backend decides where buckets live:
+
+* ``local`` (default) keeps them in this process; each worker allows the
+  full rate on its own.
+* ``redis`` shares them between workers with one script call per check.
+  Requires the ``redis`` package.  If Redis is unreachable requests are
+  let through and counted as errors.
+* ``null`` turns rate limiting off.
+
+Checks and throttled requests are counted per rule and served on
+``/admin/metrics``.
+"""
+import functools
+import logging
+import math
+import threading
+import time
+from collections import Counter
+
+from flask import request, session, Response
+
+logger = logging.getLogger(__name__)
+
+# What each scope keys its buckets by; a missing value skips the rule.  An
+# auction's bucket is shared by all its bidders, so only signed-in requests
+# draw on it: anonymous posts would otherwise lock real bidders out.
+SCOPES = {
+    'user': lambda: session.get('_user_id'),
+    'ip': lambda: request.remote_addr,
+    'auction': lambda: request.form.get('auction_id') if session.get('_user_id') else None,
+}
+
+
+def parse_limit(value):
+    """``"N/S"`` as ``(seconds per token, seconds a full bucket lasts)``, or None when unset."""
+    if not value:
+        return None
+    count, seconds = value.split('/')
+    count, seconds = int(count), float(seconds)
+    if count <= 0 or seconds <= 0:
+        raise ValueError(f'Bad rate limit {value!r}')
+    return seconds / count, seconds
+
+
+class LocalBackend:
+    """Buckets in a dict of key -> the time the bucket is full again."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._full_at = {}
+        self.evictions = 0
+
+    def acquire(self, checks):
+        """Take a token from each ``(key, interval, window)`` bucket, all or none.
+
+        Returns None when every bucket had one, else ``(index, retry_after)``
+        for the first empty bucket.
+        """
+        now = time.monotonic()
+        with self._lock:
+            full_at = self._full_at
+            stamps = []
+            for index, (key, interval, window) in enumerate(checks):
+                stamp = max(full_at.get(key, now), now) + interval
+                if stamp - now > window:
+                    return index, stamp - now - window
+                stamps.append(stamp)
+            for (key, _, _), stamp in zip(checks, stamps):
+                full_at[key] = stamp
+            if len(full_at) > self.max_keys:
+                self._sweep(now)
+        return None
+
+    def _sweep(self, now):
+        full_at = self._full_at
+        for key in [key for key, stamp in full_at.items() if stamp <= now]:
+            del full_at[key]
+        # Still full of live buckets: forget the oldest, leaving room so the
+        # next sweep is a while off
+        target = self.max_keys * 9 // 10
+        while len(full_at) > target:
+            del full_at[next(iter(full_at))]
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._full_at.clear()
+
+    def __len__(self):
+        return len(self._full_at)
+
+
+class RedisBackend:
+    """Share buckets between workers; one script call checks every bucket."""
+
+    prefix = 'bidblitz:ratelimit:'
+
+    # Same arithmetic as LocalBackend.acquire, on the Redis server's clock
+    SCRIPT = """
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local stamps = {}
+    for i, key in ipairs(KEYS) do
+        local interval = tonumber(ARGV[2 * i - 1])
+        local window = tonumber(ARGV[2 * i])
+        local stamp = math.max(tonumber(redis.call('GET', key) or 0), now) + interval
+        if stamp - now > window then
+            return {i, tostring(stamp - now - window)}
+        end
+        stamps[i] = stamp
+    end
+    for i, key in ipairs(KEYS) do
+        redis.call('SET', key, tostring(stamps[i]), 'PX', math.ceil((stamps[i] - now) * 1000))
+    end
+    return false
+    """
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError('RATE_LIMIT_BACKEND=redis requires the redis package') from exc
+        self.client = redis.Redis.from_url(url)
+        self._script = self.client.register_script(self.SCRIPT)
+        self.evictions = 0
+
+    def acquire(self, checks):
+        args = []
+        for _, interval, window in checks:
+            args += [interval, window]
+        result = self._script(keys=[self.prefix + key for key, _, _ in checks], args=args)
+        if result is None:
+            return None
+        return int(result[0]) - 1, float(result[1])
+
+    def clear(self):
+        for key in self.client.scan_iter(f'{self.prefix}*'):
+            self.client.delete(key)
+
+    def __len__(self):
+        return 0
+
+
+class NullBackend:
+    """Allow everything."""
+
+    evictions = 0
+
+    def acquire(self, checks):
+        return None
+
+    def clear(self):
+        pass
+
+    def __len__(self):
+        return 0
+
+
+class RateLimiter:
+    """Per-rule token buckets checked by a view decorator."""
+
+    def __init__(self, app=None):
+        self.backend = NullBackend()
+        self.limits = {}
+        self._lock = threading.Lock()
+        self.checks = Counter()
+        self.throttled = Counter()
+        self.errors = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        name = app.config.setdefault('RATE_LIMIT_BACKEND', 'local')
+        limits = app.config.setdefault('RATE_LIMITS', {})
+        self.limits = {rule: parse_limit(value) for rule, value in limits.items()}
+        if name == 'local':
+            backend = LocalBackend(app.config.setdefault('RATE_LIMIT_MAX_KEYS', 100000))
+        elif name == 'redis':
+            backend = RedisBackend(app.config['RATE_LIMIT_REDIS_URL'])
+        elif name == 'null':
+            backend = NullBackend()
+        else:
+            raise ValueError(f'Unknown RATE_LIMIT_BACKEND {name!r}')
+        self.use(backend)
+        app.extensions['rate_limiter'] = self
+
+    def use(self, backend):
+        self.backend = backend
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.checks.clear()
+            self.throttled.clear()
+            self.errors = 0
+
+    def check(self, rules):
+        """Take a token for this request from each of ``rules``' buckets.
+
+        Returns None when the request may go ahead, else the seconds until
+        it could.
+        """
+        checks = []
+        names = []
+        for rule in rules:
+            limit = self.limits.get(rule)
+            if limit is None:
+                continue
+            value = SCOPES[rule.rsplit('_', 1)[1]]()
+            if value:
+                checks.append((f'{rule}:{value}', *limit))
+                names.append(rule)
+        if not checks:
+            return None
+        try:
+            refused = self.backend.acquire(checks)
+        except Exception:
+            logger.exception('Rate limit check failed')
+            with self._lock:
+                self.errors += 1
+            return None
+        with self._lock:
+            for rule in names:
+                self.checks[rule] += 1
+            if refused is not None:
+                self.throttled[names[refused[0]]] += 1
+        return refused[1] if refused is not None else None
+
+    def limit(self, *rules, methods=('POST',)):
+        """Throttle a view's ``methods`` requests by ``rules``; apply above ``login_required``."""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*view_args, **view_kwargs):
+                if request.method in methods:
+                    retry_after = self.check(rules)
+                    if retry_after is not None:
+                        seconds = max(math.ceil(retry_after), 1)
+                        response = Response(f'Too many requests. Try again in {seconds} s.\n',
+                                            429, mimetype='text/plain')
+                        response.headers['Retry-After'] = str(seconds)
+                        return response
+                return view(*view_args, **view_kwargs)
+            return wrapper
+        return decorator
+
+    def stats(self):
+        return {
+            'backend': type(self.backend).__name__,
+            'buckets': len(self.backend),
+            'checks': dict(self.checks),
+            'throttled': dict(self.throttled),
+            'errors': self.errors,
+            'evictions': self.backend.evictions,
+        }
+
+    def render_metrics(self):
+        """Checks and throttled requests per rule in the Prometheus text format."""
+        with self._lock:
+            checks = dict(self.checks)
+            throttled = dict(self.throttled)
+            errors = self.errors
+        lines = []
+        for metric, help_text, values in (
+            ('rate_limit_checks_total', 'Requests checked against a rate limit rule.', checks),
+            ('rate_limit_throttled_total', 'Requests refused with 429, by the rule that refused them.',
+             throttled),
+        ):
+            lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+            for rule in sorted(self.limits):
+                lines.append(f'{metric}{{rule="{rule}"}} {values.get(rule, 0)}')
+        lines += ['# HELP rate_limit_errors_total Checks let through because the backend failed.',
+                  '# TYPE rate_limit_errors_total counter', f'rate_limit_errors_total {errors}']
+        return '\n'.join(lines) + '\n'
+
+
+rate_limiter = RateLimiter()
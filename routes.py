@@ -1,19 +1,57 @@
-import os
+import base64
+import hashlib
 from datetime import datetime, timezone
-from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
-from flask import render_template, redirect, url_for, flash, request, current_app
+from flask import render_template, redirect, url_for, flash, request, current_app, abort, Response, jsonify, send_file
 from flask_login import login_user, logout_user, login_required, current_user
 from sqlalchemy import or_, desc
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 
 from app import app, db
-from models import User, Auction, Bid, Category, Notification
-from forms import LoginForm, RegisterForm, AuctionForm, BidForm, CategoryForm, UserForm
+from models import User, Auction, BidPosition, ProxyBid, Category
+from forms import LoginForm, RegisterForm, AuctionForm, AuctionImportForm, BidForm, ProxyBidForm, CategoryForm, UserForm
+import bidding
+import closer
+import images
+from money import as_json
+import search as auction_search
+from events import broker, auction_channel, format_sse
+from cache import cache
+from instrumentation import instrumentation
+from identity import identity_cache
+from ratelimit import rate_limiter
+from catalog import category_catalog
+import admin
+import archive
+import catalog
+import dashboards
+import importer
+import inbox
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg', 'gif'}
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+
+def utc_isoformat(dt):
+    # SQLite hands back naive datetimes; they are stored as UTC
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.isoformat()
+
+def encode_cursor(timestamp, bid_id):
+    raw = f'{timestamp.replace(tzinfo=None).isoformat()}|{bid_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, bid_id = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(bid_id)
+    except ValueError:
+        abort(400)
 
 @app.route('/')
+@cache.cached(['auctions', 'categories'])
 def index():
     # Get active auctions
     now = datetime.now(timezone.utc)
@@ -23,12 +61,13 @@ def index():
         Auction.end_time > now
     ).order_by(Auction.end_time.asc()).limit(6).all()
     
-    # Get featured categories
-    categories = Category.query.limit(4).all()
+    # Feature the categories with the most live auctions
+    categories = category_catalog.busiest(4)
     
     return render_template('index.html', auctions=active_auctions, categories=categories)
 
 @app.route('/login', methods=['GET', 'POST'])
+@rate_limiter.limit('login_ip')
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('index'))
@@ -60,6 +99,7 @@ def login():
     return render_template('auth/login.html', form=form)
 
 @app.route('/register', methods=['GET', 'POST'])
+@rate_limiter.limit('register_ip')
 def register():
     if current_user.is_authenticated:
         return redirect(url_for('index'))
@@ -88,19 +128,14 @@ def logout():
     return redirect(url_for('index'))
 
 @app.route('/auctions')
+@cache.cached(['auctions', 'categories'], args=('page', 'search', 'category', 'status'))
 def auction_list():
     page = request.args.get('page', 1, type=int)
     search = request.args.get('search', '')
     category = request.args.get('category', '')
     status = request.args.get('status', 'active')
     
-    query = Auction.query
-    
-    if search:
-        query = query.filter(or_(
-            Auction.title.contains(search),
-            Auction.description.contains(search)
-        ))
+    query = Auction.query.options(joinedload(Auction.seller), joinedload(Auction.category))
     
     if category:
         query = query.filter(Auction.category_id == category)
@@ -119,11 +154,12 @@ def auction_list():
             Auction.status == 'completed'
         ))
     
-    auctions = query.order_by(Auction.end_time.asc()).paginate(
+    # Ranked full-text match when searching, soonest-ending first otherwise
+    auctions = auction_search.apply(query, search).paginate(
         page=page, per_page=12, error_out=False
     )
     
-    categories = Category.query.all()
+    categories = category_catalog.all()
     
     return render_template('auctions/list.html', 
                          auctions=auctions, 
@@ -134,13 +170,130 @@ def auction_list():
 
 @app.route('/auction/<int:id>')
 def auction_detail(id):
-    auction = Auction.query.get_or_404(id)
-    bids = Bid.query.filter_by(auction_id=id).order_by(desc(Bid.timestamp)).limit(10).all()
+    auction = Auction.query.options(
+        joinedload(Auction.seller), joinedload(Auction.category), joinedload(Auction.highest_bidder)
+    ).get_or_404(id)
+    # Live or archived, newest first
+    bids = archive.bid_history(id, 10)
     
     form = BidForm()
     form.auction_id.data = id
+    proxy_form = ProxyBidForm()
+    proxy_form.auction_id.data = id
+    proxy = None
+    if current_user.is_authenticated:
+        proxy = ProxyBid.query.filter_by(auction_id=id, bidder_id=current_user.id).first()
     
-    return render_template('auctions/detail.html', auction=auction, bids=bids, form=form)
+    return render_template('auctions/detail.html', auction=auction, bids=bids, form=form,
+                           proxy_form=proxy_form, proxy=proxy)
+
+@app.route('/auction/<int:id>/stream')
+def auction_stream(id):
+    # Subscribe before reading the snapshot so no bid can slip in between
+    subscription = broker.subscribe(auction_channel(id))
+    auction = db.session.get(Auction, id)
+    if auction is None:
+        subscription.close()
+        abort(404)
+    
+    snapshot = {
+        'status': auction.status,
+        'current_bid': as_json(auction.highest_bid_amount),
+        'minimum_bid': as_json(auction.minimum_bid),
+        'bid_count': auction.get_bid_count(),
+        'end_time': utc_isoformat(auction.end_time),
+    }
+    heartbeat = current_app.config.get('EVENTS_HEARTBEAT', 15)
+    
+    def stream():
+        try:
+            yield format_sse('snapshot', snapshot)
+            while True:
+                message = subscription.get(timeout=heartbeat)
+                if subscription.overflowed:
+                    # Events were dropped; tell the client to refetch
+                    subscription.overflowed = False
+                    yield format_sse('resync', {})
+                if message is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield format_sse(message['event'], message['data'], message['id'])
+        finally:
+            subscription.close()
+    
+    response = Response(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(subscription.close)
+    return response
+
+@app.route('/auction/<int:id>/bids')
+def auction_bids(id):
+    """Bid history as JSON, newest first.
+
+    ``before=<cursor>`` pages back through older bids and ``since=<cursor>``
+    returns only bids newer than the cursor.  Responses carry a strong ETag
+    derived from the auction's bid count and end time, so an unchanged poll
+    is answered with 304 after a single primary-key lookup.
+    """
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+    before = request.args.get('before')
+    since = request.args.get('since')
+    
+    auction = Auction.query.options(joinedload(Auction.highest_bidder)).get_or_404(id)
+    
+    version = f'{id}:{auction.bid_count}:{auction.status}:{auction.end_time.isoformat()}:{limit}:{before}:{since}'
+    etag = hashlib.sha1(version.encode()).hexdigest()[:20]
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    
+    rows = archive.bid_history(id, limit + 1,
+                               before=decode_cursor(before) if before else None,
+                               since=decode_cursor(since) if since else None)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    current_bid = None
+    if auction.bid_count:
+        current_bid = {
+            'amount': as_json(auction.highest_bid_amount),
+            'bidder_name': auction.highest_bidder.username if auction.highest_bidder else None,
+        }
+    
+    response = jsonify({
+        'auction_id': id,
+        'status': auction.status,
+        'bid_count': auction.get_bid_count(),
+        'end_time': utc_isoformat(auction.end_time),
+        'current_bid': current_bid,
+        'minimum_bid': as_json(auction.minimum_bid),
+        'bids': [{
+            'id': row.id,
+            'amount': as_json(row.amount),
+            'bidder_name': row.username,
+            'timestamp': utc_isoformat(row.timestamp),
+        } for row in rows],
+        'has_more': has_more,
+        'next_cursor': encode_cursor(rows[-1].timestamp, rows[-1].id) if has_more else None,
+        'latest_cursor': encode_cursor(rows[0].timestamp, rows[0].id) if rows else since,
+    })
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/media/<digest>/<size>.webp')
+def media(digest, size):
+    path = images.variant_path(digest, size)
+    if path is None:
+        abort(404)
+    # The URL changes whenever the image does, so browsers may keep it for good
+    response = send_file(path, mimetype='image/webp', max_age=365 * 24 * 3600)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 @app.route('/create_auction', methods=['GET', 'POST'])
 @login_required
@@ -156,16 +309,12 @@ def create_auction():
         if form.image.data:
             file = form.image.data
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                # Add timestamp to avoid conflicts
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
-                filename = timestamp + filename
-                
-                # Ensure upload directory exists
-                upload_path = os.path.join('static', 'uploads')
-                os.makedirs(upload_path, exist_ok=True)
-                
-                file.save(os.path.join(upload_path, filename))
+                # Stored by content hash; resized variants are rendered after the commit
+                try:
+                    filename = images.store(file.stream)
+                except ValueError as e:
+                    flash(str(e), 'danger')
+                    return render_template('auctions/create.html', form=form)
         
         auction = Auction(
             title=form.title.data,
@@ -180,7 +329,11 @@ def create_auction():
         )
         
         db.session.add(auction)
+        dashboards.record_created(current_user.id, auction.status)
+        catalog.record_status_change([auction.category_id], None, auction.status)
         db.session.commit()
+        cache.invalidate('auctions')
+        images.process_async(filename)
         
         if auction.status == 'pending':
             flash('Your auction has been submitted for admin approval.', 'info')
@@ -191,44 +344,54 @@ def create_auction():
     
     return render_template('auctions/create.html', form=form)
 
+@app.route('/auctions/import', methods=['GET', 'POST'])
+@login_required
+def import_auctions():
+    if not current_user.can_sell():
+        flash('You need seller privileges to create auctions.', 'danger')
+        return redirect(url_for('index'))
+    
+    form = AuctionImportForm()
+    report = None
+    if form.validate_on_submit():
+        upload = form.file.data
+        try:
+            report = importer.import_auctions(
+                upload.stream, current_user.id, importer.format_for(upload.filename),
+                status='pending' if current_user.role != 'admin' else 'active'
+            )
+        except ValueError as e:
+            flash(str(e), 'danger')
+        else:
+            flash(f'Imported {report.imported} of {report.rows} listings.',
+                  'success' if not report.rejected and not report.stopped else 'warning')
+    
+    return render_template('auctions/import.html', form=form, report=report)
+
 @app.route('/bid', methods=['POST'])
+@rate_limiter.limit('bid_user', 'bid_ip', 'bid_auction')
 @login_required
 def place_bid():
     form = BidForm()
     if form.validate_on_submit():
-        auction = Auction.query.get_or_404(form.auction_id.data)
-        
-        # Additional server-side validation
-        if not auction.is_active:
-            flash('This auction is no longer active.', 'danger')
-            return redirect(url_for('auction_detail', id=auction.id))
-        
-        if auction.seller_id == current_user.id:
-            flash('You cannot bid on your own auction.', 'danger')
-            return redirect(url_for('auction_detail', id=auction.id))
+        result = bidding.place_bid(int(form.auction_id.data), current_user.id, form.amount.data)
+        flash(result.message, 'success' if result.accepted else 'danger')
         
-        # Create bid
-        bid = Bid(
-            amount=form.amount.data,
-            auction_id=auction.id,
-            bidder_id=current_user.id
-        )
-        
-        # Update auction current bid
-        auction.current_bid = form.amount.data
-        
-        db.session.add(bid)
-        db.session.commit()
-        
-        flash(f'Bid of ${form.amount.data:.2f} placed successfully!', 'success')
-        
-        # Create notification for seller
-        notification = Notification(
-            user_id=auction.seller_id,
-            message=f'New bid of ${form.amount.data:.2f} on your auction "{auction.title}"'
-        )
-        db.session.add(notification)
-        db.session.commit()
+    else:
+        for field, errors in form.errors.items():
+            for error in errors:
+                flash(error, 'danger')
+    
+    return redirect(url_for('auction_detail', id=form.auction_id.data))
+
+@app.route('/bid/max', methods=['POST'])
+@rate_limiter.limit('bid_user', 'bid_ip', 'bid_auction')
+@login_required
+def place_max_bid():
+    form = ProxyBidForm()
+    if form.validate_on_submit():
+        result = bidding.set_max_bid(int(form.auction_id.data), current_user.id, form.max_amount.data)
+        flash(result.message, 'success' if result.accepted else 'danger')
         
     else:
         for field, errors in form.errors.items():
@@ -245,17 +408,17 @@ def admin_dashboard():
         flash('Admin access required.', 'danger')
         return redirect(url_for('index'))
     
-    # Statistics
-    total_users = User.query.count()
-    total_auctions = Auction.query.count()
-    active_auctions = Auction.query.filter_by(status='active').count()
-    pending_auctions = Auction.query.filter_by(status='pending').all()
+    # Counters are cached; the pending list is one page of the queue
+    counters = admin.counters.get()
+    pending_auctions, next_key = admin.list_auctions('pending', limit=current_app.config['ADMIN_PAGE_SIZE'])
     
     return render_template('dashboard/admin.html',
-                         total_users=total_users,
-                         total_auctions=total_auctions,
-                         active_auctions=active_auctions,
-                         pending_auctions=pending_auctions)
+                         total_users=counters['total_users'],
+                         total_auctions=counters['total_auctions'],
+                         active_auctions=counters['active_auctions'],
+                         pending_count=counters['pending_auctions'],
+                         pending_auctions=pending_auctions,
+                         more_pending=next_key is not None)
 
 @app.route('/dashboard/seller')
 @login_required
@@ -264,21 +427,58 @@ def seller_dashboard():
         flash('Seller access required.', 'danger')
         return redirect(url_for('index'))
     
-    # Get seller's auctions
-    my_auctions = Auction.query.filter_by(seller_id=current_user.id).order_by(desc(Auction.created_at)).all()
-    
-    return render_template('dashboard/seller.html', auctions=my_auctions)
+    # Totals come from the seller's stats row; the list is one page of
+    # ix_auction_seller_created_at, however many auctions they have run
+    stats = dashboards.stats_for(current_user.id)
+    after = request.args.get('after')
+    my_auctions, next_key = admin.keyset_page(
+        db.select(Auction).options(joinedload(Auction.winner))
+        .where(Auction.seller_id == current_user.id),
+        Auction, decode_cursor(after) if after else None,
+        current_app.config['DASHBOARD_PAGE_SIZE'])
+    
+    return render_template('dashboard/seller.html', auctions=my_auctions, stats=stats,
+                           next_cursor=encode_cursor(*next_key) if next_key else None)
 
 @app.route('/dashboard/buyer')
 @login_required
 def buyer_dashboard():
-    # Get user's bids
-    my_bids = Bid.query.filter_by(bidder_id=current_user.id).order_by(desc(Bid.timestamp)).limit(10).all()
-    
-    # Get auctions user won
-    won_auctions = Auction.query.filter_by(winner_id=current_user.id).all()
-    
-    return render_template('dashboard/buyer.html', bids=my_bids, won_auctions=won_auctions)
+    # Counters from the stats row, then one position per auction bid on
+    # and the latest wins, each a bounded index range
+    stats = dashboards.stats_for(current_user.id)
+    positions = BidPosition.query.options(
+        joinedload(BidPosition.auction).joinedload(Auction.seller)
+    ).filter_by(user_id=current_user.id).order_by(desc(BidPosition.last_bid_at)).limit(10).all()
+    won_auctions = Auction.query.options(joinedload(Auction.seller)).filter_by(
+        winner_id=current_user.id
+    ).order_by(desc(Auction.end_time)).limit(6).all()
+    
+    return render_template('dashboard/buyer.html', stats=stats, positions=positions,
+                           won_auctions=won_auctions)
+
+# Notification inbox
+@app.route('/notifications')
+@login_required
+def notifications():
+    unread_only = request.args.get('filter') == 'unread'
+    after = request.args.get('after')
+    items, next_key = inbox.list_notifications(
+        current_user.id, unread_only, decode_cursor(after) if after else None,
+        current_app.config['NOTIFICATION_PAGE_SIZE'])
+    return render_template('notifications/inbox.html', notifications=items,
+                           unread_only=unread_only,
+                           next_cursor=encode_cursor(*next_key) if next_key else None)
+
+@app.route('/notifications/read', methods=['POST'])
+@login_required
+def mark_notifications_read():
+    if request.form.get('all'):
+        changed = inbox.mark_read(current_user.id)
+    else:
+        changed = inbox.mark_read(current_user.id, request.form.getlist('notification_ids', type=int))
+    flash(f'Marked {changed} notification{"s" if changed != 1 else ""} as read.',
+          'success' if changed else 'info')
+    return redirect(_return_url('notifications'))
 
 # Admin management routes
 @app.route('/admin/approve_auction/<int:id>')
@@ -288,20 +488,50 @@ def approve_auction(id):
         flash('Admin access required.', 'danger')
         return redirect(url_for('index'))
     
-    auction = Auction.query.get_or_404(id)
-    auction.status = 'active'
-    db.session.commit()
+    if admin.update_auctions([id], 'approve'):
+        flash('Auction approved successfully!', 'success')
+    elif db.session.get(Auction, id) is None:
+        abort(404)
+    else:
+        flash('That auction is no longer pending.', 'info')
+    return redirect(url_for('admin_dashboard'))
+
+@app.route('/admin/auctions')
+@login_required
+def admin_auctions():
+    if not current_user.can_admin():
+        flash('Admin access required.', 'danger')
+        return redirect(url_for('index'))
     
-    # Notify seller
-    notification = Notification(
-        user_id=auction.seller_id,
-        message=f'Your auction "{auction.title}" has been approved and is now live!'
-    )
-    db.session.add(notification)
-    db.session.commit()
+    status = request.args.get('status', 'pending')
+    if status not in ('pending', 'active', 'completed', 'cancelled', 'all'):
+        status = 'pending'
+    after = request.args.get('after')
+    auctions, next_key = admin.list_auctions(
+        status, after=decode_cursor(after) if after else None,
+        limit=current_app.config['ADMIN_PAGE_SIZE'])
+    return render_template('dashboard/admin_auctions.html', auctions=auctions, status=status,
+                           next_cursor=encode_cursor(*next_key) if next_key else None)
+
+@app.route('/admin/auctions/bulk', methods=['POST'])
+@login_required
+def bulk_auctions():
+    if not current_user.can_admin():
+        flash('Admin access required.', 'danger')
+        return redirect(url_for('index'))
     
-    flash('Auction approved successfully!', 'success')
-    return redirect(url_for('admin_dashboard'))
+    action = request.form.get('action')
+    if action not in admin.AUCTION_ACTIONS:
+        abort(400)
+    ids = request.form.getlist('auction_ids', type=int)
+    changed = admin.update_auctions(ids, action)
+    skipped = len(set(ids)) - len(changed)
+    done = {'approve': 'approved', 'reject': 'rejected', 'cancel': 'cancelled'}[action]
+    message = f'{done.title()} {len(changed)} auction{"s" if len(changed) != 1 else ""}.'
+    if skipped:
+        message += f' {skipped} could not be {done} from their current status.'
+    flash(message, 'success' if changed else 'info')
+    return redirect(_return_url('admin_auctions'))
 
 @app.route('/admin/users')
 @login_required
@@ -310,8 +540,85 @@ def manage_users():
         flash('Admin access required.', 'danger')
         return redirect(url_for('index'))
     
-    users = User.query.order_by(User.created_at.desc()).all()
-    return render_template('dashboard/manage_users.html', users=users)
+    role = request.args.get('role') or None
+    status = request.args.get('status') or None
+    search = request.args.get('q', '').strip() or None
+    after = request.args.get('after')
+    users, next_key = admin.list_users(role=role, status=status, search=search,
+                                       after=decode_cursor(after) if after else None,
+                                       limit=current_app.config['ADMIN_PAGE_SIZE'])
+    return render_template('dashboard/manage_users.html', users=users,
+                           counters=admin.counters.get(), role=role, status=status, search=search,
+                           next_cursor=encode_cursor(*next_key) if next_key else None)
+
+@app.route('/admin/users/bulk', methods=['POST'])
+@login_required
+def bulk_users():
+    if not current_user.can_admin():
+        flash('Admin access required.', 'danger')
+        return redirect(url_for('index'))
+    
+    action = request.form.get('action')
+    if action not in ('activate', 'deactivate'):
+        abort(400)
+    changed = admin.set_users_active(request.form.getlist('user_ids', type=int),
+                                     action == 'activate', current_user.id)
+    flash(f'{action.title()}d {len(changed)} user{"s" if len(changed) != 1 else ""}.',
+          'success' if changed else 'info')
+    return redirect(_return_url('manage_users'))
+
+def _return_url(endpoint):
+    # Back to the filtered page the form was on, but never off-site
+    next_url = request.form.get('next', '')
+    if next_url.startswith('/') and not next_url.startswith('//'):
+        return next_url
+    return url_for(endpoint)
+
+@app.route('/admin/users/<int:user_id>/edit', methods=['POST'])
+@login_required
+def edit_user(user_id):
+    if not current_user.can_admin():
+        flash('Admin access required.', 'danger')
+        return redirect(url_for('index'))
+    
+    user = User.query.get_or_404(user_id)
+    form = UserForm()
+    if user.id == current_user.id:
+        flash('You cannot edit your own account here.', 'warning')
+    elif form.validate_on_submit():
+        user.username = form.username.data
+        user.email = form.email.data
+        user.role = form.role.data
+        user.is_active = form.is_active.data == 'True'
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            flash('That username or email is already taken.', 'danger')
+        else:
+            # The user's open sessions pick up the new role (or lose access)
+            identity_cache.invalidate(user.id)
+            admin.counters.refresh()
+            flash(f'User {user.username} updated.', 'success')
+    else:
+        flash('Invalid user details.', 'danger')
+    return redirect(url_for('manage_users'))
+
+@app.route('/admin/users/<int:user_id>/status', methods=['POST'])
+@login_required
+def set_user_status(user_id):
+    if not current_user.can_admin():
+        flash('Admin access required.', 'danger')
+        return redirect(url_for('index'))
+    
+    if user_id == current_user.id:
+        flash('You cannot deactivate your own account.', 'warning')
+        return redirect(url_for('manage_users'))
+    active = request.form.get('active') == 'true'
+    if not admin.set_users_active([user_id], active, current_user.id) and db.session.get(User, user_id) is None:
+        abort(404)
+    flash('User activated.' if active else 'User deactivated.', 'success')
+    return redirect(_return_url('manage_users'))
 
 @app.route('/admin/categories', methods=['GET', 'POST'])
 @login_required
@@ -328,6 +635,8 @@ def manage_categories():
         )
         db.session.add(category)
         db.session.commit()
+        category_catalog.invalidate()
+        cache.invalidate('categories')
         flash('Category created successfully!', 'success')
         return redirect(url_for('manage_categories'))
     
@@ -342,38 +651,20 @@ def close_ended_auctions():
         flash('Admin access required.', 'danger')
         return redirect(url_for('index'))
     
-    now = datetime.now(timezone.utc)
-    ended_auctions = Auction.query.filter(
-        Auction.status == 'active',
-        Auction.end_time <= now
-    ).all()
-    
-    for auction in ended_auctions:
-        highest_bid = auction.highest_bid
-        if highest_bid:
-            auction.winner_id = highest_bid.bidder_id
-            auction.current_bid = highest_bid.amount
-            
-            # Notify winner
-            winner_notification = Notification(
-                user_id=highest_bid.bidder_id,
-                message=f'Congratulations! You won the auction for "{auction.title}" with a bid of ${highest_bid.amount:.2f}'
-            )
-            db.session.add(winner_notification)
-            
-            # Notify seller
-            seller_notification = Notification(
-                user_id=auction.seller_id,
-                message=f'Your auction "{auction.title}" has ended. Winner: {highest_bid.bidder.username} - ${highest_bid.amount:.2f}'
-            )
-            db.session.add(seller_notification)
-        
-        auction.status = 'completed'
-    
-    db.session.commit()
-    flash(f'Closed {len(ended_auctions)} ended auctions.', 'success')
+    closed, _ = closer.close_all_due(current_app.config['AUCTION_CLOSER_BATCH_SIZE'])
+    flash(f'Closed {closed} ended auctions.', 'success')
     return redirect(url_for('admin_dashboard'))
 
+@app.route('/admin/metrics')
+@login_required
+def metrics():
+    if not current_user.can_admin():
+        abort(403)
+    # Only request timings need INSTRUMENTATION_ENABLED
+    body = instrumentation.render_metrics() if instrumentation.enabled else ''
+    return Response(body + identity_cache.render_metrics() + rate_limiter.render_metrics(),
+                    mimetype='text/plain; version=0.0.4')
+
 # Error handlers
 @app.errorhandler(404)
 def not_found_error(error):
@@ -0,0 +1,158 @@
+"""Full-text search over auction titles and descriptions.
+
+The index lives in the database and is kept in sync there, so every write
+path -- the create form, admin edits, bulk imports -- is covered without
+application hooks:
+
+* SQLite: an external-content FTS5 table ``auction_fts`` maintained by
+  insert/update/delete triggers on ``auction``.
+* PostgreSQL: a generated ``search_vector`` tsvector column (title weighted
+  above description) with a GIN index.
+
+:func:`apply` narrows an ``Auction`` query to matches ordered by rank.
+Every word of the search is matched as a prefix, so "vint cam" finds
+"Vintage camera".  Other filters on the query (category, status) combine
+as usual.  Databases without FTS5 fall back to ``LIKE``.
+"""
+import re
+
+from sqlalchemy import or_, select, text, literal_column, func, table, column
+
+from app import db
+from models import Auction
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS auction_fts USING fts5("
+    "title, description, content='auction', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS auction_fts_ai AFTER INSERT ON auction BEGIN "
+    "INSERT INTO auction_fts(rowid, title, description) "
+    "VALUES (new.id, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS auction_fts_ad AFTER DELETE ON auction BEGIN "
+    "INSERT INTO auction_fts(auction_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); END",
+    # Only re-index when the searchable text changes, not on every bid
+    "CREATE TRIGGER IF NOT EXISTS auction_fts_au AFTER UPDATE OF title, description ON auction BEGIN "
+    "INSERT INTO auction_fts(auction_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO auction_fts(rowid, title, description) "
+    "VALUES (new.id, new.title, new.description); END",
+    "INSERT INTO auction_fts(auction_fts) VALUES ('rebuild')",
+]
+
+SQLITE_OBJECTS = ('auction_fts', 'auction_fts_ai', 'auction_fts_ad', 'auction_fts_au')
+
+POSTGRES_DDL = [
+    "ALTER TABLE auction ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')) STORED",
+    "CREATE INDEX ix_auction_search_vector ON auction USING gin (search_vector)",
+]
+
+fts = table('auction_fts', column('rowid'))
+
+_available = None
+
+
+def _dialect():
+    return db.engine.dialect.name
+
+
+def terms(search):
+    """Split a search string into lower-cased word tokens."""
+    return re.findall(r'\w+', search.lower())
+
+
+def install():
+    """Create the search index if it is missing and return what was created."""
+    global _available
+    dialect = _dialect()
+    if dialect == 'sqlite':
+        # Rebuilding the auction table (see migrations) drops the triggers
+        # but not the index, so check for all of them
+        found = db.session.execute(text(
+            "SELECT count(*) FROM sqlite_master WHERE name IN (%s)"
+            % ', '.join(f"'{name}'" for name in SQLITE_OBJECTS)
+        )).scalar()
+        if found < len(SQLITE_OBJECTS):
+            try:
+                for statement in SQLITE_DDL:
+                    db.session.execute(text(statement))
+            except Exception:
+                # SQLite built without FTS5: search falls back to LIKE
+                db.session.rollback()
+                _available = False
+                return []
+            db.session.commit()
+            _available = True
+            return ['auction_fts']
+        _available = True
+    elif dialect == 'postgresql':
+        exists = db.session.execute(text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'auction' AND column_name = 'search_vector'"
+        )).scalar()
+        _available = True
+        if not exists:
+            for statement in POSTGRES_DDL:
+                db.session.execute(text(statement))
+            db.session.commit()
+            return ['auction.search_vector', 'ix_auction_search_vector']
+    else:
+        _available = False
+    return []
+
+
+def available():
+    """Whether the SQLite FTS5 index exists, checked once per process.
+
+    Workers no longer run :func:`install` at startup (``flask bootstrap``
+    does), so the first search looks the table up instead.
+    """
+    global _available
+    if _available is None:
+        _available = bool(db.session.execute(text(
+            "SELECT count(*) FROM sqlite_master WHERE name = 'auction_fts'"
+        )).scalar())
+    return _available
+
+
+def rebuild():
+    """Re-index every auction (SQLite only; PostgreSQL computes the column itself)."""
+    if _dialect() == 'sqlite':
+        db.session.execute(text("INSERT INTO auction_fts(auction_fts) VALUES ('rebuild')"))
+        db.session.commit()
+
+
+def apply(query, search):
+    """Filter ``query`` to auctions matching ``search``, best matches first."""
+    words = terms(search)
+    if not words:
+        return query.order_by(Auction.end_time.asc())
+    dialect = _dialect()
+
+    if dialect == 'sqlite' and available():
+        # Quoted so words like AND/NEAR are not read as operators
+        match = ' '.join(f'"{w}"*' for w in words)
+        # bm25 weights: title matches count ten times a description match
+        ranked = (
+            select(fts.c.rowid.label('auction_id'),
+                   literal_column('bm25(auction_fts, 10.0, 1.0)').label('rank'))
+            .select_from(fts)
+            .where(literal_column('auction_fts').op('MATCH')(match))
+            # Materialised so SQLite runs the MATCH once instead of per auction row
+            .cte('ranked').prefix_with('MATERIALIZED')
+        )
+        return (query.join(ranked, ranked.c.auction_id == Auction.id)
+                .order_by(ranked.c.rank, Auction.end_time.asc()))
+
+    if dialect == 'postgresql':
+        tsquery = func.to_tsquery('english', ' & '.join(f'{w}:*' for w in words))
+        vector = literal_column('auction.search_vector')
+        return (query.filter(vector.op('@@')(tsquery))
+                .order_by(func.ts_rank(vector, tsquery).desc(), Auction.end_time.asc()))
+
+    for word in words:
+        query = query.filter(or_(Auction.title.contains(word),
+                                 Auction.description.contains(word)))
+    return query.order_by(Auction.end_time.asc())
@@ -22,10 +22,10 @@ function initCountdownTimers() {
     const countdownElements = document.querySelectorAll('.countdown');
     
     countdownElements.forEach(element => {
-        const endTime = element.dataset.end;
-        if (endTime) {
-            updateCountdown(element, endTime);
-            setInterval(() => updateCountdown(element, endTime), 1000);
+        if (element.dataset.end) {
+            // Read data-end on every tick so live end-time changes take effect
+            updateCountdown(element, element.dataset.end);
+            setInterval(() => updateCountdown(element, element.dataset.end), 1000);
         }
     });
 }
@@ -99,7 +99,7 @@ function validateBidAmount(input, submitButton) {
     const amount = parseFloat(input.value);
     const minBid = parseFloat(input.getAttribute('data-min-bid') || 0);
     
-    if (isNaN(amount) || amount <= minBid) {
+    if (isNaN(amount) || amount < minBid) {
         input.classList.add('is-invalid');
         submitButton.disabled = true;
         return false;
@@ -152,35 +152,120 @@ function showImagePreview(src) {
     imageInput.parentNode.insertBefore(preview, imageInput.nextSibling);
 }
 
-// Auto-refresh for Active Auctions
+// Live updates for Active Auctions
+let pollTimer = null;
+
 function initAutoRefresh() {
-    // Only refresh auction detail pages with active auctions
-    const isAuctionDetail = window.location.pathname.includes('/auction/');
+    // Only auction detail pages with a running countdown get live updates
+    const live = document.getElementById('auction-live');
     const hasActiveAuction = document.querySelector('.countdown');
     
-    if (isAuctionDetail && hasActiveAuction) {
-        // Refresh bid section every 30 seconds
-        setInterval(refreshBidSection, 30000);
+    if (live && hasActiveAuction) {
+        if (window.EventSource && live.dataset.streamUrl) {
+            initBidStream(live);
+        } else {
+            startPolling();
+        }
+    }
+}
+
+function startPolling() {
+    // Fallback when the stream is unavailable: refresh bid section every 30 seconds
+    if (!pollTimer) {
+        pollTimer = setInterval(refreshBidSection, 30000);
+    }
+}
+
+function initBidStream(live) {
+    const source = new EventSource(live.dataset.streamUrl);
+    
+    source.addEventListener('snapshot', e => applyAuctionState(JSON.parse(e.data)));
+    source.addEventListener('auction', e => applyAuctionState(JSON.parse(e.data)));
+    source.addEventListener('bid', e => {
+        const bid = JSON.parse(e.data);
+        applyAuctionState(bid);
+        updateCurrentBid(bid);
+        prependBid(bid);
+        if (bid.extended) {
+            showAlert('A late bid extended this auction.', 'info');
+        }
+    });
+    // The server dropped events for this page; fetch the current state instead
+    source.addEventListener('resync', refreshBidSection);
+    
+    source.onerror = () => {
+        // EventSource reconnects by itself; poll only once it has given up
+        if (source.readyState === EventSource.CLOSED) {
+            startPolling();
+        }
+    };
+}
+
+function applyAuctionState(state) {
+    if (state.bid_count !== undefined) {
+        const bidCount = document.getElementById('bid-count');
+        if (bidCount) {
+            bidCount.textContent = state.bid_count;
+        }
+    }
+    // The server applies the bid increment bands; just show its minimum
+    if (state.minimum_bid !== undefined) {
+        const minBid = document.getElementById('min-bid');
+        if (minBid) {
+            minBid.textContent = formatCurrency(state.minimum_bid);
+        }
+        const amountInput = document.querySelector('input[name="amount"]');
+        if (amountInput) {
+            amountInput.setAttribute('data-min-bid', state.minimum_bid);
+            amountInput.min = state.minimum_bid;
+        }
+    }
+    if (state.end_time) {
+        document.querySelectorAll('#auction-live .countdown').forEach(element => {
+            element.dataset.end = state.end_time;
+        });
     }
 }
 
+// Poll state: the newest bid already shown and the last response's ETag
+let bidCursor = null;
+let bidsEtag = null;
+
 function refreshBidSection() {
-    const bidSection = document.querySelector('.bid-history');
-    if (bidSection) {
-        // Get current auction ID from URL
-        const auctionId = window.location.pathname.split('/').pop();
+    const live = document.getElementById('auction-live');
+    if (live) {
+        const url = bidCursor
+            ? `/auction/${live.dataset.auctionId}/bids?since=${encodeURIComponent(bidCursor)}`
+            : `/auction/${live.dataset.auctionId}/bids`;
+        const headers = {'X-Requested-With': 'XMLHttpRequest'};
+        if (bidsEtag) {
+            headers['If-None-Match'] = bidsEtag;
+        }
         
-        fetch(`/auction/${auctionId}/bids`, {
-            method: 'GET',
-            headers: {
-                'X-Requested-With': 'XMLHttpRequest'
+        fetch(url, {method: 'GET', headers: headers, cache: 'no-store'})
+        .then(response => {
+            // 304: nothing changed since the last poll
+            if (response.status === 304) {
+                return null;
             }
+            bidsEtag = response.headers.get('ETag');
+            return response.json();
         })
-        .then(response => response.json())
         .then(data => {
+            if (!data) {
+                return;
+            }
             if (data.bids) {
-                updateBidHistory(data.bids);
+                if (bidCursor && !data.has_more) {
+                    data.bids.slice().reverse().forEach(prependBid);
+                } else {
+                    updateBidHistory(data.bids);
+                }
+            }
+            if (data.latest_cursor) {
+                bidCursor = data.latest_cursor;
             }
+            applyAuctionState(data);
             if (data.current_bid) {
                 updateCurrentBid(data.current_bid);
             }
@@ -191,27 +276,55 @@ function refreshBidSection() {
     }
 }
 
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
+function bidRowHtml(bid) {
+    return `
+        <div class="d-flex justify-content-between align-items-center mb-2 pb-2 border-bottom">
+            <div>
+                <strong>${escapeHtml(bid.bidder_name)}</strong><br>
+                <small class="text-muted">${new Date(bid.timestamp).toLocaleString()}</small>
+            </div>
+            <div class="text-end">
+                <strong class="text-success">$${bid.amount.toFixed(2)}</strong>
+            </div>
+        </div>
+    `;
+}
+
 function updateBidHistory(bids) {
     const bidHistory = document.querySelector('.bid-history');
     if (bidHistory && bids.length > 0) {
-        bidHistory.innerHTML = bids.map(bid => `
-            <div class="d-flex justify-content-between align-items-center mb-2 pb-2 border-bottom">
-                <div>
-                    <strong>${bid.bidder_name}</strong><br>
-                    <small class="text-muted">${bid.timestamp}</small>
-                </div>
-                <div class="text-end">
-                    <strong class="text-success">$${bid.amount.toFixed(2)}</strong>
-                </div>
-            </div>
-        `).join('');
+        bidHistory.innerHTML = bids.map(bidRowHtml).join('');
+        document.getElementById('bid-history-card')?.classList.remove('d-none');
+    }
+}
+
+function prependBid(bid) {
+    const bidHistory = document.querySelector('.bid-history');
+    if (bidHistory) {
+        bidHistory.insertAdjacentHTML('afterbegin', bidRowHtml(bid));
+        document.getElementById('bid-history-card')?.classList.remove('d-none');
     }
 }
 
 function updateCurrentBid(bidData) {
-    const currentBidSection = document.querySelector('.card-body .text-success');
+    const currentBidSection = document.getElementById('current-bid-amount');
     if (currentBidSection && bidData) {
-        currentBidSection.innerHTML = `$${bidData.amount.toFixed(2)}`;
+        currentBidSection.textContent = `$${bidData.amount.toFixed(2)}`;
+        currentBidSection.classList.replace('text-primary', 'text-success');
+        const label = document.getElementById('current-bid-label');
+        if (label && bidData.bidder_name) {
+            label.textContent = `by ${bidData.bidder_name}`;
+        }
+        const time = document.getElementById('current-bid-time');
+        if (time && bidData.timestamp) {
+            time.textContent = new Date(bidData.timestamp).toLocaleString();
+        }
         // Add animation for new bid
         currentBidSection.parentElement.classList.add('new-bid');
         setTimeout(() => {